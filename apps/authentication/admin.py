@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 
-from .models import Profile, User, VerificationToken
+from .models import Profile, User, VerificationFailures, VerificationToken
 
 
 @admin.register(User)
@@ -55,10 +55,15 @@ class ProfileAdmin(admin.ModelAdmin):
 class VerificationTokenAdmin(admin.ModelAdmin):
     list_display = (
         "user",
-        "token",
         "token_type",
         "is_used",
         "expires_at",
         "used_at",
         "created_at",
     )
+    readonly_fields = ("token_hash",)
+
+
+@admin.register(VerificationFailures)
+class VerificationFailuresAdmin(admin.ModelAdmin):
+    list_display = ("user", "token_type", "count", "last_failed_at")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_verificationtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='verificationtoken',
+            index=models.Index(condition=models.Q(('is_used', True)), fields=['id'], name='verificationtoken_used_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:30
+
+from django.db import migrations, models
+from django.utils.crypto import salted_hmac
+
+
+def hash_tokens(apps, schema_editor):
+    VerificationToken = apps.get_model("authentication", "VerificationToken")
+    tokens = VerificationToken.objects.only("id", "user_id", "token_type", "token")
+    for token in tokens.iterator():
+        token.token_hash = salted_hmac(
+            "apps.authentication.VerificationToken",
+            f"{token.user_id}:{token.token_type}:{token.token}",
+            algorithm="sha256",
+        ).hexdigest()
+        token.save(update_fields=["token_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_verificationtoken_used_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='verificationtoken',
+            name='token_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='verificationtoken',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(hash_tokens, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='verificationtoken',
+            name='authenticat_user_id_8ee4d2_idx',
+        ),
+        migrations.RemoveField(
+            model_name='verificationtoken',
+            name='token',
+        ),
+        migrations.AddConstraint(
+            model_name='verificationtoken',
+            constraint=models.UniqueConstraint(fields=('user', 'token_type', 'token_hash'), name='unique_verification_token'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0009_profile_location'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='verificationtoken',
+            name='attempts',
+        ),
+        migrations.CreateModel(
+            name='VerificationFailures',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_type', models.CharField(choices=[('email_verification', 'Email Verification'), ('password_reset', 'Password Reset'), ('phone_verification', 'Phone Verification'), ('two_factor_authentication', 'Two Factor')], max_length=100)),
+                ('count', models.PositiveSmallIntegerField(default=0)),
+                ('last_failed_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'verification failures',
+                'constraints': [models.UniqueConstraint(fields=('user', 'token_type'), name='unique_verification_failures')],
+            },
+        ),
+    ]
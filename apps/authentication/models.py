@@ -1,13 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
-from django.db import models
+from django.db import connections, models, transaction
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from phonenumber_field.modelfields import PhoneNumberField
 
+from utils.geo import LocatedModel
+
 
 class UserManager(BaseUserManager):
     def _create_user_object(
@@ -74,7 +80,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         self.save(update_fields=["email_verified"])
 
 
-class Profile(models.Model):
+class Profile(LocatedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     phone_number = PhoneNumberField(blank=True, null=True)
     is_phone_number_verified = models.BooleanField(default=False)
@@ -90,34 +96,183 @@ class TOKEN_TYPES(models.TextChoices):
     TWO_FACTOR = "two_factor_authentication"
 
 
+def make_token_hash(user_id, token_type, code):
+    """Return the keyed hash a verification code is stored and looked up by."""
+    return salted_hmac(
+        "apps.authentication.VerificationToken",
+        f"{user_id}:{token_type}:{code}",
+        algorithm="sha256",
+    ).hexdigest()
+
+
+class TooManyAttempts(Exception):
+    """Raised for any code while the user is locked out of its token type."""
+
+
+class VerificationTokenManager(models.Manager):
+    def active(self, user, token_type, now=None):
+        return self.filter(
+            user=user,
+            token_type=token_type,
+            is_used=False,
+            expires_at__gt=now or timezone.now(),
+        )
+
+    @transaction.atomic
+    def consume(self, user, token_type, code):
+        """
+        Mark the unused, unexpired token matching `code` as used, or count a
+        failure against the user when none matches.
+
+        The user's failures are locked before the code is compared, so
+        concurrent attempts are checked one after the other and can't get past
+        VERIFICATION_TOKEN_MAX_ATTEMPTS together. Raises TooManyAttempts,
+        without comparing the code, while the user is locked out. Returns True
+        if a token was consumed, which also clears the user's failures.
+        """
+        failures = VerificationFailures.objects.claim(user, token_type)
+        # Read after waiting on the lock, so failures are counted in order.
+        now = timezone.now()
+        if failures.is_locked(now):
+            raise TooManyAttempts()
+        consumed = bool(
+            self.active(user, token_type, now)
+            .filter(token_hash=make_token_hash(user.pk, token_type, code))
+            .update(is_used=True, used_at=now)
+        )
+        if consumed:
+            failures.delete()
+        else:
+            failures.record(now)
+        return consumed
+
+    def purge(self, now=None, batch_size=1000):
+        """
+        Delete expired and used tokens in batches of at most `batch_size` rows.
+
+        Yields the number of rows deleted by each batch. Every batch is its own
+        short statement, so callers can pause between batches and rows are
+        never locked for longer than one batch takes.
+        """
+        now = now or timezone.now()
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        # Skip rows another transaction is using instead of waiting on them.
+        skip_locked = (
+            " FOR UPDATE SKIP LOCKED"
+            if connection.features.has_select_for_update_skip_locked
+            else ""
+        )
+        # One predicate per pass, so each batch is served by its own index.
+        for predicate, params in (
+            ("expires_at <= %s", [now]),
+            ("is_used = %s", [True]),
+        ):
+            sql = (
+                f"DELETE FROM {table} WHERE id IN ("
+                f"SELECT id FROM {table} WHERE {predicate} LIMIT %s{skip_locked})"
+            )
+            while True:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [*params, batch_size])
+                    deleted = cursor.rowcount
+                if deleted:
+                    yield deleted
+                if deleted < batch_size:
+                    break
+
+
 class VerificationToken(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="verification_tokens"
     )
-    token = models.CharField(max_length=255, unique=True)
+    token_hash = models.CharField(max_length=64)
     token_type = models.CharField(max_length=100, choices=TOKEN_TYPES.choices)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     used_at = models.DateTimeField(null=True, blank=True)
     is_used = models.BooleanField(default=False)
 
+    objects = VerificationTokenManager()
+
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "token_type", "token_hash"],
+                name="unique_verification_token",
+            ),
+        ]
         indexes = [
-            models.Index(fields=["user", "token_type"]),
             models.Index(fields=["expires_at"]),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(is_used=True),
+                name="verificationtoken_used_idx",
+            ),
         ]
 
     def is_expired(self):
         return timezone.now() > self.expires_at
 
-    def is_valid(self):
-        return not self.is_used and not self.is_expired()
+    def __str__(self):
+        return f"{self.get_token_type_display()} token for {self.user}"
+
+
+class VerificationFailuresManager(models.Manager):
+    def claim(self, user, token_type):
+        """
+        Return the user's failures for `token_type`, created if needed, locked
+        until the surrounding transaction ends.
+        """
+        failures, _ = self.select_for_update().get_or_create(
+            user=user,
+            token_type=token_type,
+            defaults={"last_failed_at": timezone.now()},
+        )
+        return failures
+
+
+class VerificationFailures(models.Model):
+    """
+    Wrong codes a user submitted for a token type, across every code they
+    requested, so requesting a new code doesn't buy more guesses.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    token_type = models.CharField(max_length=100, choices=TOKEN_TYPES.choices)
+    count = models.PositiveSmallIntegerField(default=0)
+    last_failed_at = models.DateTimeField()
 
-    def mark_as_used(self):
-        self.is_used = True
-        self.used_at = timezone.now()
-        self.save(update_fields=["is_used", "used_at"])
+    objects = VerificationFailuresManager()
+
+    class Meta:
+        verbose_name_plural = "verification failures"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "token_type"], name="unique_verification_failures"
+            ),
+        ]
+
+    def is_locked(self, now):
+        return (
+            self.count >= settings.VERIFICATION_TOKEN_MAX_ATTEMPTS
+            and now - self.last_failed_at < self.lockout()
+        )
+
+    def record(self, now):
+        """Count a failure, starting over once the lockout has passed since the last."""
+        if now - self.last_failed_at >= self.lockout():
+            self.count = 0
+        self.count += 1
+        self.last_failed_at = now
+        self.save(update_fields=["count", "last_failed_at"])
+
+    @staticmethod
+    def lockout():
+        return timedelta(minutes=settings.VERIFICATION_TOKEN_LOCKOUT_MINUTES)
 
     def __str__(self):
-        return self.token
+        return (
+            f"{self.count} failed {self.get_token_type_display()} codes of {self.user}"
+        )
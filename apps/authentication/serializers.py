@@ -1,20 +1,62 @@
 import logging
+from functools import partial
 
 from django.conf import settings
 from django.contrib.auth.password_validation import (
     validate_password as django_validate_password,
 )
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import APIException
 
 from utils.constants import TOKEN_ERRORS, USER_ERRORS
-
-from .models import TOKEN_TYPES, Profile, User, VerificationToken
+from utils.geo import validate_location
+
+from .models import (
+    TOKEN_TYPES,
+    Profile,
+    TooManyAttempts,
+    User,
+    VerificationToken,
+    make_token_hash,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def consume_verification_token(user, token_type, code):
+    """
+    Consume `user`'s token of `token_type` matching `code`, raising a
+    ValidationError that says why when it can't be consumed.
+
+    Every failure counts against the user, and requesting a code replaces the
+    earlier ones, so a numeric code can't be brute forced: after
+    VERIFICATION_TOKEN_MAX_ATTEMPTS failures no code works until
+    VERIFICATION_TOKEN_LOCKOUT_MINUTES have passed. While locked out, every
+    code gets the same error, so guesses can't be told apart.
+    """
+    try:
+        if VerificationToken.objects.consume(user, token_type, code):
+            return
+        obj = VerificationToken.objects.filter(
+            user=user,
+            token_type=token_type,
+            token_hash=make_token_hash(user.pk, token_type, code),
+        ).first()
+    except TooManyAttempts:
+        raise serializers.ValidationError(TOKEN_ERRORS.TOO_MANY_ATTEMPTS)
+    except Exception as exc:
+        logger.error(exc)
+        raise APIException()
+
+    if obj is not None and obj.is_used:
+        raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_ALREADY_USED)
+    if obj is not None and obj.is_expired():
+        raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_EXPIRED)
+    raise serializers.ValidationError(TOKEN_ERRORS.INVALID_TOKEN)
+
+
 class UserWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -41,7 +83,12 @@ class UserWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(exc.messages)
         return password
 
+    @transaction.atomic
     def create(self, validated_data):
+        """
+        Create the user. The profile and email verification token are created
+        by the `post_save` signal in the same transaction.
+        """
         user = self.Meta.model(
             email=validated_data.get("email"),
             first_name=validated_data.get("first_name"),
@@ -55,13 +102,16 @@ class UserWriteSerializer(serializers.ModelSerializer):
 class ProfileReadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
-        fields = ["phone_number", "is_phone_number_verified"]
+        fields = ["phone_number", "is_phone_number_verified", "latitude", "longitude"]
 
 
 class ProfileWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
-        fields = ["phone_number"]
+        fields = ["phone_number", "latitude", "longitude"]
+
+    def validate(self, attrs):
+        return validate_location(attrs, self.instance)
 
 
 class UserReadSerializer(serializers.ModelSerializer):
@@ -93,8 +143,8 @@ class EmailVerificationTokenSerializer(serializers.Serializer):
 
     def validate(self, attrs):
         """
-        Validate email verification token for the authenticated user.
-        Checks if token exists, belongs to user, hasn't expired, and hasn't been used.
+        Validate and consume the email verification token of the authenticated
+        user. The token must exist, be unexpired and not have been used.
         """
         token = attrs.get("token")
         request = self.context.get("request")
@@ -106,42 +156,17 @@ class EmailVerificationTokenSerializer(serializers.Serializer):
         if not token:
             raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_REQUIRED)
 
-        try:
-            obj = VerificationToken.objects.get(
-                token=token, token_type=TOKEN_TYPES.EMAIL_VERIFICATION, user=user
-            )
-        except VerificationToken.DoesNotExist:
-            raise serializers.ValidationError(TOKEN_ERRORS.INVALID_TOKEN)
-        except Exception as exc:
-            logger.error(exc)
-            raise APIException()
-
-        if obj.is_expired():
-            raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_EXPIRED)
-
-        if obj.is_used:
-            raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_ALREADY_USED)
-
-        if not obj.is_valid():
-            raise serializers.ValidationError(TOKEN_ERRORS.INVALID_TOKEN)
-
+        consume_verification_token(user, TOKEN_TYPES.EMAIL_VERIFICATION, token)
         return attrs
 
     def save(self, *args, **kwargs):
         """
-        Mark token as used and verify user's email address.
-        Returns the verification token object after successful verification.
+        Verify user's email address. The token was consumed by `validate`.
+        Returns the verified user.
         """
-        token = self.validated_data.get("token")
-        request = self.context.get("request")
-        user = request.user
-
-        obj = VerificationToken.objects.get(
-            token=token, user=user, token_type=TOKEN_TYPES.EMAIL_VERIFICATION
-        )
-        obj.mark_as_used()
-        request.user.verify_email()
-        return obj
+        user = self.context.get("request").user
+        user.verify_email()
+        return user
 
 
 class SendResetPasswordTokenSerializer(serializers.Serializer):
@@ -160,8 +185,13 @@ class SendResetPasswordTokenSerializer(serializers.Serializer):
             reset_token = create_password_reset_token(user)
             from apps.authentication.tasks import send_password_reset_email
 
-            send_password_reset_email.delay(
-                first_name=user.first_name, email=user.email, token=reset_token.token
+            transaction.on_commit(
+                partial(
+                    send_password_reset_email.delay,
+                    first_name=user.first_name,
+                    email=user.email,
+                    token=reset_token.code,
+                )
             )
         except User.DoesNotExist:
             pass
@@ -169,6 +199,7 @@ class SendResetPasswordTokenSerializer(serializers.Serializer):
 
 
 class ResetPasswordTokenSerializer(serializers.Serializer):
+    email = serializers.EmailField(allow_blank=False)
     token = serializers.CharField(allow_blank=False)
     password = serializers.CharField(allow_blank=False)
 
@@ -184,42 +215,22 @@ class ResetPasswordTokenSerializer(serializers.Serializer):
         return value
 
     def validate(self, attrs):
-        token = attrs.get("token")
-
+        """Validate and consume the password reset token of the given user."""
         try:
-            obj = VerificationToken.objects.get(
-                token=token, token_type=TOKEN_TYPES.PASSWORD_RESET
-            )
-        except VerificationToken.DoesNotExist:
-            raise serializers.ValidationError(TOKEN_ERRORS.INVALID_TOKEN)
-        except Exception as exc:
-            logger.error(exc)
-            raise APIException()
-
-        if obj.is_expired():
-            raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_EXPIRED)
-
-        if obj.is_used:
-            raise serializers.ValidationError(TOKEN_ERRORS.TOKEN_ALREADY_USED)
-
-        if not obj.is_valid():
+            user = User.objects.get(email=attrs.get("email"))
+        except User.DoesNotExist:
             raise serializers.ValidationError(TOKEN_ERRORS.INVALID_TOKEN)
 
+        consume_verification_token(user, TOKEN_TYPES.PASSWORD_RESET, attrs["token"])
+        attrs["user"] = user
         return attrs
 
     def save(self, **kwargs):
         """
-        Mark token as used and reset user's password.
-        Returns the verification token object after successful verification.
+        Reset user's password. The token was consumed by `validate`.
+        Returns the user.
         """
-        token = self.validated_data.get("token")
-        raw_password = self.validated_data.get("password")
-
-        obj = VerificationToken.objects.get(
-            token=token, token_type=TOKEN_TYPES.PASSWORD_RESET
-        )
-        user = obj.user
-        user.set_password(raw_password)
-        user.save()
-        obj.mark_as_used()
-        return obj
+        user = self.validated_data["user"]
+        user.set_password(self.validated_data.get("password"))
+        user.save(update_fields=["password"])
+        return user
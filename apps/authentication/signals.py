@@ -1,14 +1,28 @@
+from functools import partial
+
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from apps.authentication.models import Profile, User
 from apps.authentication.tasks import send_welcome_and_verification_email
+from utils.tokens import create_email_verification_token
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(instance, created, *args, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
-        send_welcome_and_verification_email.delay(
-            first_name=instance.first_name, email=instance.email
+        with transaction.atomic():
+            Profile.objects.create(user=instance)
+            verification_token = create_email_verification_token(instance)
+        # Enqueue only once the user, profile and token are committed, so the
+        # worker never sees a half-created signup.
+        transaction.on_commit(
+            partial(
+                send_welcome_and_verification_email.delay,
+                user_id=instance.pk,
+                first_name=instance.first_name,
+                email=instance.email,
+                token=verification_token.code,
+            )
         )
@@ -1,78 +1,106 @@
 import logging
+import time
 
 from celery import shared_task
 from django.conf import settings
-from django.core.mail import send_mail
 from django.utils import timezone
 
 from apps.authentication.models import VerificationToken
-from apps.listings.models import User
-from utils.tokens import create_email_verification_token
+from utils.mail import TransientEmailError, send_templated_email
 
 logger = logging.getLogger(__name__)
 
+# Retry transient SMTP failures with exponential backoff (1s, 2s, 4s, ...).
+EMAIL_TASK_OPTIONS = {
+    "autoretry_for": (TransientEmailError,),
+    "retry_backoff": True,
+    "retry_backoff_max": 600,
+    "retry_jitter": True,
+    "max_retries": 5,
+}
 
-@shared_task
-def send_welcome_and_verification_email(first_name, email):
+
+@shared_task(**EMAIL_TASK_OPTIONS)
+def send_welcome_and_verification_email(user_id, first_name, email, token):
     """
     Asynchronously send welcome email with verification token to new user.
-    """
 
-    # TODO: Use django template
-    user = User.objects.get(email=email)
-    verification_token = create_email_verification_token(user)
-    message = f"""We are excited to have you on the platform.
-    Your email verification token is {verification_token.token}.
-    This token will expire in {settings.EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES} minutes.
+    The token is created with the user, so a retried or redelivered task sends
+    the same email and the idempotency key makes sure it is sent only once.
     """
 
-    send_mail(
+    sent = send_templated_email(
         subject=f"Welcome to Chautari, {first_name}",
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[email],
+        template_name="authentication/email/welcome.txt",
+        context={
+            "first_name": first_name,
+            "token": token,
+            "expires_in_minutes": settings.EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES,
+        },
+        recipient=email,
+        idempotency_key=f"welcome:{user_id}",
     )
-    logger.info(f"Sent welcome email to {email}")
+    if sent:
+        logger.info(f"Sent welcome email to {email}")
 
 
 @shared_task
 def delete_verification_tokens():
-    tokens = VerificationToken.objects.filter(expires_at__lte=timezone.now())
-    count, _ = tokens.delete()
-    logger.info(f"deleted {count} expired verification tokens")
+    """
+    Purge expired and used verification tokens in bounded batches, pausing
+    between batches so the purge doesn't compete with signups for the table.
+    """
+    started = time.monotonic()
+    deleted = batches = 0
+    for count in VerificationToken.objects.purge(
+        now=timezone.now(), batch_size=settings.VERIFICATION_TOKEN_PURGE_BATCH_SIZE
+    ):
+        deleted += count
+        batches += 1
+        logger.debug(f"purged batch {batches} of {count} verification tokens")
+        time.sleep(settings.VERIFICATION_TOKEN_PURGE_PAUSE_SECONDS)
 
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"deleted {deleted} expired or used verification tokens "
+        f"in {batches} batches ({elapsed:.2f}s)"
+    )
+    return {"deleted": deleted, "batches": batches, "seconds": round(elapsed, 3)}
 
-@shared_task
-def send_verification_email(first_name, email, token):
+
+@shared_task(bind=True, **EMAIL_TASK_OPTIONS)
+def send_verification_email(self, first_name, email, token):
     """
     Asynchronously send email with verification token to an unverified user.
     """
 
-    # TODO: Use django template
-    message = f"""We are excited to have you on the platform.
-    Your email verification token is {token}.
-    This token will expire in {settings.EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES} minutes.
-    """
-    send_mail(
+    sent = send_templated_email(
         subject=f"Welcome to Chautari, {first_name}",
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[email],
+        template_name="authentication/email/verification.txt",
+        context={
+            "first_name": first_name,
+            "token": token,
+            "expires_in_minutes": settings.EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES,
+        },
+        recipient=email,
+        idempotency_key=f"verification:{self.request.id}",
     )
-    logger.info(f"Sent verification email to {email}")
+    if sent:
+        logger.info(f"Sent verification email to {email}")
 
 
-@shared_task
-def send_password_reset_email(first_name, email, token):
-    message = f"""
-    Hello, {first_name}. We received a password reset request for your account.
-    If this wasn't you, you can ignore this message.
-    Your password reset token is {token}.
-    This token will expire in {settings.PASSWORD_RESET_TOKEN_EXPIRES_IN_MINUTES} minutes."""
-    send_mail(
+@shared_task(bind=True, **EMAIL_TASK_OPTIONS)
+def send_password_reset_email(self, first_name, email, token):
+    sent = send_templated_email(
         subject="Password Reset Request",
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[email],
+        template_name="authentication/email/password_reset.txt",
+        context={
+            "first_name": first_name,
+            "token": token,
+            "expires_in_minutes": settings.PASSWORD_RESET_TOKEN_EXPIRES_IN_MINUTES,
+        },
+        recipient=email,
+        idempotency_key=f"password-reset:{self.request.id}",
     )
-    logger.info(f"Sent password reset email to {email}")
+    if sent:
+        logger.info(f"Sent password reset email to {email}")
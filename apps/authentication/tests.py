@@ -1,11 +1,38 @@
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from functools import partial
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from apps.authentication.models import Profile, User
+from apps.authentication.models import (
+    TOKEN_TYPES,
+    Profile,
+    User,
+    VerificationFailures,
+    VerificationToken,
+    make_token_hash,
+)
+from apps.authentication.serializers import ProfileWriteSerializer
+from apps.authentication.tasks import (
+    delete_verification_tokens,
+    send_password_reset_email,
+    send_welcome_and_verification_email,
+)
+from utils.constants import TOKEN_ERRORS
+from utils.mail import EmailDispatcher, TransientEmailError, send_templated_email
+from utils.tokens import create_email_verification_token, create_password_reset_token
 
 
 class UserModelTest(TestCase):
@@ -126,6 +153,30 @@ class SignUpViewTest(APITestCase):
         self.assertEqual(response.data["data"]["last_name"], "Doe")
         self.assertNotIn("password", response.data["data"])
 
+    def test_signup_sends_welcome_email_after_commit(self):
+        """Test the welcome email is enqueued on commit with the created token"""
+        with mock.patch(
+            "apps.authentication.signals.send_welcome_and_verification_email"
+        ) as task:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post(self.signup_url, self.valid_payload)
+            task.delay.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+
+        user = User.objects.get(email="test@swsc.edu.np")
+        token = VerificationToken.objects.get(user=user)
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        task.delay.assert_called_once_with(
+            user_id=user.pk, first_name="John", email="test@swsc.edu.np", token=mock.ANY
+        )
+        code = task.delay.call_args.kwargs["token"]
+        self.assertEqual(
+            token.token_hash,
+            make_token_hash(user.pk, TOKEN_TYPES.EMAIL_VERIFICATION, code),
+        )
+
     def test_signup_invalid_data(self):
         """Test signup with invalid data"""
         invalid_payload = {
@@ -279,3 +330,354 @@ class ProfileViewTest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertFalse(response.data["success"])
+
+
+class ProfileLocationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+
+    def test_location_sets_geohash(self):
+        """Test saving a location also stores its geohash"""
+        serializer = ProfileWriteSerializer(
+            self.user.profile,
+            data={"latitude": 27.7172, "longitude": 85.324},
+            partial=True,
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.geohash, "tuutttg03")
+
+    def test_location_needs_both_coordinates(self):
+        serializer = ProfileWriteSerializer(
+            self.user.profile, data={"latitude": 27.7172}, partial=True
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("location", serializer.errors)
+
+
+class EmailTaskTest(SimpleTestCase):
+    def test_send_password_reset_email(self):
+        """Test the password reset email is rendered from its template"""
+        send_password_reset_email(
+            first_name="John", email="test@swsc.edu.np", token="123456"
+        )
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Password Reset Request")
+        self.assertEqual(mail.outbox[0].to, ["test@swsc.edu.np"])
+        self.assertIn("Hello, John.", mail.outbox[0].body)
+        self.assertIn("Your password reset token is 123456.", mail.outbox[0].body)
+
+    def test_transient_error_is_retryable(self):
+        """Test 4xx SMTP replies raise TransientEmailError"""
+        dispatcher = mock.Mock()
+        dispatcher.send.side_effect = smtplib.SMTPResponseException(421, b"busy")
+        with mock.patch("utils.mail.get_dispatcher", return_value=dispatcher):
+            with self.assertRaises(TransientEmailError):
+                send_templated_email(
+                    "subject", "authentication/email/verification.txt", {}, "a@b.c"
+                )
+
+    def test_permanent_error_is_not_retried(self):
+        """Test 5xx SMTP replies are raised as is"""
+        dispatcher = mock.Mock()
+        dispatcher.send.side_effect = smtplib.SMTPResponseException(550, b"no")
+        with mock.patch("utils.mail.get_dispatcher", return_value=dispatcher):
+            with self.assertRaises(smtplib.SMTPResponseException):
+                send_templated_email(
+                    "subject", "authentication/email/verification.txt", {}, "a@b.c"
+                )
+
+    def test_idempotency_key_sends_once(self):
+        """Test a repeated idempotency key does not send the email again"""
+        cache.delete("email:sent:welcome:1")
+        for _ in range(2):
+            send_welcome_and_verification_email(
+                user_id=1, first_name="John", email="a@b.c", token="123456"
+            )
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_delivery_releases_idempotency_key(self):
+        """Test a failed send can be retried with the same idempotency key"""
+        cache.delete("email:sent:retry")
+        dispatcher = mock.Mock()
+        dispatcher.send.side_effect = smtplib.SMTPServerDisconnected()
+        with mock.patch("utils.mail.get_dispatcher", return_value=dispatcher):
+            with self.assertRaises(TransientEmailError):
+                send_templated_email(
+                    "subject",
+                    "authentication/email/verification.txt",
+                    {},
+                    "a@b.c",
+                    idempotency_key="retry",
+                )
+
+        self.assertTrue(
+            send_templated_email(
+                "subject",
+                "authentication/email/verification.txt",
+                {},
+                "a@b.c",
+                idempotency_key="retry",
+            )
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_TIMEOUT=10)
+    def test_stale_claim_does_not_block_the_email(self):
+        """Test a claim left by a killed worker expires and the email is sent"""
+        cache.set("email:sent:stale", "pending", 3 * 10)
+        send = partial(
+            send_templated_email,
+            "subject",
+            "authentication/email/verification.txt",
+            {},
+            "a@b.c",
+            idempotency_key="stale",
+        )
+        with self.assertRaises(TransientEmailError):
+            send()
+
+        with mock.patch(
+            "django.core.cache.backends.locmem.time.time",
+            return_value=time.time() + 31,
+        ):
+            self.assertTrue(send())
+        self.assertEqual(len(mail.outbox), 1)
+        # Sent, so it's remembered for EMAIL_IDEMPOTENCY_TIMEOUT.
+        with mock.patch(
+            "django.core.cache.backends.locmem.time.time",
+            return_value=time.time() + 60 * 60,
+        ):
+            self.assertFalse(send())
+
+
+class EmailDispatcherTest(SimpleTestCase):
+    def message(self, index):
+        return EmailMessage(subject=f"message {index}", body="body", to=["a@b.c"])
+
+    def test_reuses_connection(self):
+        """Test consecutive messages share one connection"""
+        dispatcher = EmailDispatcher()
+        with mock.patch("utils.mail.get_connection", wraps=mail.get_connection) as conn:
+            for index in range(3):
+                dispatcher.send(self.message(index))
+
+        self.assertEqual(conn.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_batches_concurrent_messages(self):
+        """Test messages sent within the batch window are flushed together"""
+        dispatcher = EmailDispatcher(batch_window=0.2)
+        with mock.patch.object(dispatcher, "flush", wraps=dispatcher.flush) as flush:
+            threads = [
+                threading.Thread(target=dispatcher.send, args=(self.message(i),))
+                for i in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(flush.call_count, 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_reconnects_when_server_disconnects(self):
+        """Test a dropped connection is reopened and the message resent"""
+        dispatcher = EmailDispatcher()
+        broken = mock.Mock()
+        broken.send_messages.side_effect = smtplib.SMTPServerDisconnected()
+        with mock.patch(
+            "utils.mail.get_connection", side_effect=[broken, mail.get_connection()]
+        ):
+            dispatcher.send(self.message(0))
+
+        broken.close.assert_called_once()
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(
+    VERIFICATION_TOKEN_PURGE_BATCH_SIZE=2, VERIFICATION_TOKEN_PURGE_PAUSE_SECONDS=0
+)
+class DeleteVerificationTokensTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="testpass123",
+        )
+        VerificationToken.objects.all().delete()
+
+    def create_token(self, token, expires_in, is_used=False):
+        return VerificationToken.objects.create(
+            user=self.user,
+            token_hash=token,
+            token_type=TOKEN_TYPES.EMAIL_VERIFICATION,
+            expires_at=timezone.now() + timedelta(minutes=expires_in),
+            is_used=is_used,
+        )
+
+    def test_purges_expired_and_used_tokens_in_batches(self):
+        """Test expired and used tokens are deleted in bounded batches"""
+        for index in range(5):
+            self.create_token(f"expired{index}", expires_in=-1)
+        self.create_token("used", expires_in=10, is_used=True)
+        valid = self.create_token("valid", expires_in=10)
+
+        result = delete_verification_tokens()
+
+        self.assertEqual(result["deleted"], 6)
+        self.assertEqual(result["batches"], 4)
+        self.assertQuerySetEqual(VerificationToken.objects.all(), [valid])
+
+
+@override_settings(VERIFICATION_TOKEN_MAX_ATTEMPTS=3)
+class VerificationTokenTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="testpass123",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.token = create_email_verification_token(self.user)
+        self.verify_url = reverse("verify_email")
+        self.reset_url = reverse("reset_password")
+
+    def wrong_code(self, code):
+        return "000000" if code != "000000" else "111111"
+
+    def test_token_is_stored_hashed(self):
+        """Test the plain code is not stored"""
+        token = VerificationToken.objects.get(pk=self.token.pk)
+        self.assertNotEqual(token.token_hash, self.token.code)
+        self.assertEqual(len(token.token_hash), 64)
+
+    def test_verify_email_consumes_token_once(self):
+        """Test a token verifies the email and can't be used again"""
+        response = self.client.post(self.verify_url, {"token": self.token.code})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.email_verified)
+
+        self.assertFalse(
+            VerificationToken.objects.consume(
+                self.user, TOKEN_TYPES.EMAIL_VERIFICATION, self.token.code
+            )
+        )
+
+    def test_verify_email_with_used_token(self):
+        """Test a used token is reported as used"""
+        VerificationToken.objects.filter(pk=self.token.pk).update(is_used=True)
+        response = self.client.post(self.verify_url, {"token": self.token.code})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn(TOKEN_ERRORS.TOKEN_ALREADY_USED, str(response.data["error"]))
+
+    def test_verify_email_with_expired_token(self):
+        """Test an expired token is reported as expired"""
+        VerificationToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        response = self.client.post(self.verify_url, {"token": self.token.code})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn(TOKEN_ERRORS.TOKEN_EXPIRED, str(response.data["error"]))
+
+    def test_too_many_attempts_locks_token(self):
+        """Test the correct code is refused after too many wrong ones"""
+        wrong = self.wrong_code(self.token.code)
+        for _ in range(3):
+            response = self.client.post(self.verify_url, {"token": wrong})
+            self.assertIn(TOKEN_ERRORS.INVALID_TOKEN, str(response.data["error"]))
+
+        response = self.client.post(self.verify_url, {"token": self.token.code})
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn(TOKEN_ERRORS.TOO_MANY_ATTEMPTS, str(response.data["error"]))
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.email_verified)
+
+    def test_new_token_replaces_earlier_ones(self):
+        """Test only the latest code works"""
+        token = create_email_verification_token(self.user)
+
+        response = self.client.post(self.verify_url, {"token": self.token.code})
+        self.assertIn(TOKEN_ERRORS.INVALID_TOKEN, str(response.data["error"]))
+        response = self.client.post(self.verify_url, {"token": token.code})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_new_token_does_not_reset_attempts(self):
+        """Test a new code is refused until the lockout has passed"""
+        wrong = self.wrong_code(self.token.code)
+        for _ in range(3):
+            self.client.post(self.verify_url, {"token": wrong})
+        token = create_email_verification_token(self.user)
+
+        response = self.client.post(self.verify_url, {"token": token.code})
+        self.assertIn(TOKEN_ERRORS.TOO_MANY_ATTEMPTS, str(response.data["error"]))
+        response = self.client.post(self.verify_url, {"token": wrong})
+        self.assertIn(TOKEN_ERRORS.TOO_MANY_ATTEMPTS, str(response.data["error"]))
+
+        VerificationFailures.objects.update(
+            last_failed_at=timezone.now() - timedelta(minutes=16)
+        )
+        response = self.client.post(self.verify_url, {"token": token.code})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(VerificationFailures.objects.exists())
+
+    def test_same_code_for_different_users(self):
+        """Test codes are scoped to their user and token type"""
+        other = User.objects.create_user(
+            email="other@swsc.edu.np",
+            first_name="Jane",
+            last_name="Doe",
+            password="testpass123",
+        )
+        with mock.patch(
+            "utils.tokens._generate_numeric_code", return_value=self.token.code
+        ):
+            create_password_reset_token(other)
+
+        response = self.client.post(
+            self.reset_url,
+            {
+                "email": "other@swsc.edu.np",
+                "token": self.token.code,
+                "password": "a-new-password",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        other.refresh_from_db()
+        self.assertTrue(other.check_password("a-new-password"))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("testpass123"))
+
+    def test_reset_password_for_wrong_email(self):
+        """Test a reset token only works for the user it was sent to"""
+        token = create_password_reset_token(self.user)
+        response = self.client.post(
+            self.reset_url,
+            {
+                "email": "nobody@swsc.edu.np",
+                "token": token.code,
+                "password": "a-new-password",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("testpass123"))
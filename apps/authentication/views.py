@@ -1,3 +1,6 @@
+from functools import partial
+
+from django.db import transaction
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
@@ -95,13 +98,14 @@ class VerifyEmailView(APIView):
         serializer = EmailVerificationTokenSerializer(
             data=request.data, context={"request": request}
         )
-        if serializer.is_valid():
-            serializer.save()
-            return Envelope.success_response("email verified")
-        else:
-            return Envelope.error_response(
-                error=serializer.errors, status_code=status.HTTP_401_UNAUTHORIZED
-            )
+        # Validation consumes the token, so it commits together with the save.
+        with transaction.atomic():
+            if serializer.is_valid():
+                serializer.save()
+                return Envelope.success_response("email verified")
+        return Envelope.error_response(
+            error=serializer.errors, status_code=status.HTTP_401_UNAUTHORIZED
+        )
 
 
 class SendEmailVerificationView(APIView):
@@ -111,10 +115,13 @@ class SendEmailVerificationView(APIView):
         if request.user.email_verified:
             return Envelope.success_response("email already verified")
         verification_token = create_email_verification_token(request.user)
-        send_verification_email.delay(
-            first_name=request.user.first_name,
-            email=request.user.email,
-            token=verification_token.token,
+        transaction.on_commit(
+            partial(
+                send_verification_email.delay,
+                first_name=request.user.first_name,
+                email=request.user.email,
+                token=verification_token.code,
+            )
         )
         return Envelope.success_response(
             data="email sent", status_code=status.HTTP_202_ACCEPTED
@@ -135,9 +142,11 @@ class SendPasswordResetView(APIView):
 class ResetPasswordView(APIView):
     def post(self, request):
         serializer = ResetPasswordTokenSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Envelope.success_response("password reset successful")
+        # Validation consumes the token, so it commits together with the save.
+        with transaction.atomic():
+            if serializer.is_valid():
+                serializer.save()
+                return Envelope.success_response("password reset successful")
         return Envelope.error_response(
             error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
         )
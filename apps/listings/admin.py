@@ -1,7 +1,18 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
 
-from apps.listings.models import Category, Listing, ListingImage, SavedListing
+from apps.listings.models import (
+    ArchivedListing,
+    Category,
+    Listing,
+    ListingImage,
+    ListingPriceChange,
+    SavedListing,
+    SavedSearch,
+)
+from apps.listings.prices import record_price_change
+from apps.listings.saved_searches import index_saved_search
 
 
 @admin.register(Category)
@@ -11,7 +22,15 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
-    list_display = ("title", "price", "seller", "is_sold", "is_active", "created_at")
+    list_display = (
+        "title",
+        "price",
+        "seller",
+        "is_sold",
+        "is_active",
+        "created_at",
+        "deleted_at",
+    )
     list_filter = ("seller", "is_sold", "is_active")
     search_fields = (
         "title",
@@ -21,6 +40,35 @@ class ListingAdmin(admin.ModelAdmin):
         "seller__last_name",
     )
 
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # The price as saved, not as the form was shown; locked until committed.
+        old_price = (
+            Listing.all_objects.select_for_update()
+            .values_list("price", flat=True)
+            .get(pk=obj.pk)
+        )
+        super().save_model(request, obj, form, change)
+        record_price_change(obj, old_price)
+
+    def get_queryset(self, request):
+        return Listing.all_objects.all()
+
+    def delete_model(self, request, obj):
+        obj.mark_deleted()
+
+    def delete_queryset(self, request, queryset):
+        for listing in queryset:
+            listing.mark_deleted()
+
+
+@admin.register(ArchivedListing)
+class ArchivedListingAdmin(admin.ModelAdmin):
+    list_display = ("title", "price", "seller_id", "deleted_at", "archived_at")
+    search_fields = ("title", "slug")
+
 
 @admin.register(ListingImage)
 class ListingImageAdmin(admin.ModelAdmin):
@@ -35,6 +83,23 @@ class ListingImageAdmin(admin.ModelAdmin):
     image_preview.short_description = "Preview"
 
 
+@admin.register(ListingPriceChange)
+class ListingPriceChangeAdmin(admin.ModelAdmin):
+    list_display = ("listing", "old_price", "new_price", "changed_at")
+    readonly_fields = ("listing", "old_price", "new_price", "changed_at")
+
+
 @admin.register(SavedListing)
 class SavedListingAdmin(admin.ModelAdmin):
     list_display = ("user", "listing")
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ("user", "keywords", "category", "is_active", "created_at")
+    list_filter = ("is_active", "category")
+    search_fields = ("keywords", "user__email")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        index_saved_search(obj)
@@ -0,0 +1,86 @@
+"""
+Archiving of deleted listings.
+
+Deleting a listing only sets its `deleted_at`: a single UPDATE, which keeps
+the listing's saves, matches and price history for analytics, and leaves the
+row out of every query through `Listing.objects`. Listings deleted more than
+LISTING_ARCHIVE_AFTER_DAYS ago are then moved, with their images, to the
+archive tables in batches by `archive_deleted()`, found through the partial
+index on `deleted_at`.
+
+What refers to an archived listing is kept: its saves, saved search matches,
+view stats and price history keep the listing's id, which is the archived
+listing's id, and its conversations are kept without a listing. Only the
+listing's precomputed neighbours are deleted along with it.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.listings.models import (
+    ArchivedListing,
+    ArchivedListingImage,
+    Listing,
+    ListingImage,
+)
+
+LISTING_FIELDS = [
+    "id",
+    "title",
+    "description",
+    "price",
+    "slug",
+    "category_id",
+    "condition",
+    "seller_id",
+    "latitude",
+    "longitude",
+    "is_active",
+    "is_sold",
+    "created_at",
+    "updated_at",
+    "deleted_at",
+]
+IMAGE_FIELDS = ["id", "listing_id", "image", "uploaded_at"]
+
+
+@transaction.atomic
+def archive_batch(before, batch_size):
+    """Archive up to `batch_size` listings deleted before `before`."""
+    ids = list(
+        Listing.all_objects.filter(deleted_at__lt=before)
+        .order_by("deleted_at")
+        # Skip listings another run is archiving instead of waiting on them.
+        .select_for_update(skip_locked=True)
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    archived_at = timezone.now()
+    ArchivedListing.objects.bulk_create(
+        [
+            ArchivedListing(**row, archived_at=archived_at)
+            for row in Listing.all_objects.filter(id__in=ids).values(*LISTING_FIELDS)
+        ],
+        ignore_conflicts=True,
+    )
+    ArchivedListingImage.objects.bulk_create(
+        [
+            ArchivedListingImage(**row)
+            for row in ListingImage.objects.filter(listing_id__in=ids).values(
+                *IMAGE_FIELDS
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    Listing.all_objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_deleted(before, batch_size=1000):
+    """
+    Archive the listings deleted before `before` in batches of at most
+    `batch_size`, each its own transaction. Yields each batch's size.
+    """
+    while count := archive_batch(before, batch_size):
+        yield count
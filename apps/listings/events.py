@@ -0,0 +1,55 @@
+"""
+Listing status and price changes pushed to the streams of the listing's
+seller and of the users who saved it; see utils.events.
+"""
+
+from apps.listings.models import Listing, SavedListing
+from utils.events import publish
+
+LISTING_SOLD = "listing.sold"
+LISTING_DEACTIVATED = "listing.deactivated"
+LISTING_REACTIVATED = "listing.reactivated"
+LISTING_DELETED = "listing.deleted"
+LISTING_PRICE_DROPPED = "listing.price_dropped"
+
+
+def status_event(listing, update_fields):
+    """Return the event a save of `update_fields` makes, if any."""
+    if update_fields is None:
+        return None
+    if "deleted_at" in update_fields and listing.deleted_at is not None:
+        return LISTING_DELETED
+    if "is_sold" in update_fields and listing.is_sold:
+        return LISTING_SOLD
+    if "is_active" in update_fields:
+        return LISTING_REACTIVATED if listing.is_active else LISTING_DEACTIVATED
+    return None
+
+
+def interested_user_ids(listing_id, seller_id):
+    return {
+        seller_id,
+        *SavedListing.objects.filter(listing_id=listing_id).values_list(
+            "user_id", flat=True
+        ),
+    }
+
+
+def event_data(listing):
+    return {
+        "id": listing.id,
+        "slug": listing.slug,
+        "is_active": listing.is_active,
+        "is_sold": listing.is_sold,
+        "price": listing.price,
+    }
+
+
+def publish_status_change(listing_id, event):
+    """Push `event` about `listing_id` to its seller and the users who saved it."""
+    listing = Listing.all_objects.filter(id=listing_id).first()
+    if listing is None:
+        return 0
+    user_ids = interested_user_ids(listing.id, listing.seller_id)
+    publish(user_ids, event, event_data(listing))
+    return len(user_ids)
@@ -1,13 +1,73 @@
+from django import forms
+from django.conf import settings
+from django.db.models import Q
 from django_filters import rest_framework as filters
 
 from apps.listings.models import Listing
+from utils.geo import bounding_box, covering_cells, distance_km_expression
+
+
+class PointField(forms.Field):
+    """A "latitude,longitude" pair."""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            latitude, longitude = (float(part) for part in value.split(","))
+        except ValueError:
+            raise forms.ValidationError("Enter a point as latitude,longitude.")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise forms.ValidationError("Point is out of range.")
+        return latitude, longitude
+
+
+class PointFilter(filters.Filter):
+    field_class = PointField
 
 
 class ListingFilter(filters.FilterSet):
     title = filters.CharFilter(lookup_expr="iexact")
     min_price = filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = filters.NumberFilter(field_name="price", lookup_expr="lte")
+    near = PointFilter(method="filter_near")
+    # Read by filter_near.
+    radius_km = filters.NumberFilter(method="filter_radius_km", min_value=0.1)
 
     class Meta:
         model = Listing
         fields = ["price", "condition"]
+
+    def filter_near(self, queryset, name, value):
+        """
+        Listings within radius_km of the point, nearest first. The geohash
+        cells covering the circle's bounding box select candidates through
+        the geohash index; the haversine distance then drops the corners.
+        """
+        latitude, longitude = value
+        radius_km = min(
+            float(
+                self.form.cleaned_data.get("radius_km")
+                or settings.LISTING_NEAR_DEFAULT_RADIUS_KM
+            ),
+            settings.LISTING_NEAR_MAX_RADIUS_KM,
+        )
+        box = bounding_box(latitude, longitude, radius_km)
+        min_lat, min_lon, max_lat, max_lon = box
+        queryset = queryset.filter(
+            latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon)
+        )
+        cells = covering_cells(box)
+        if cells:
+            prefixes = Q()
+            for cell in cells:
+                prefixes |= Q(geohash__startswith=cell)
+            queryset = queryset.filter(prefixes)
+        return (
+            queryset.alias(distance_km=distance_km_expression(latitude, longitude))
+            .filter(distance_km__lte=radius_km)
+            .order_by("distance_km", "-created_at")
+        )
+
+    def filter_radius_km(self, queryset, name, value):
+        return queryset
@@ -0,0 +1,126 @@
+"""
+Django management command to benchmark serializing and rendering listing pages.
+
+Seeds listings with seller, category and images inside a transaction that is
+rolled back afterwards. For every page size it times fetching and serializing
+the page with ListingReadSerializer and with the values-based
+ListingFeedSerializer, and rendering the Envelope with DRF's stdlib
+JSONRenderer and with the ORJSONRenderer.
+
+Usage:
+    python manage.py benchmark_listing_feed
+    python manage.py benchmark_listing_feed --sizes 10 100 1000 --iterations 50
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from apps.listings.models import Category, Listing, ListingImage, User
+from apps.listings.serializers import ListingFeedSerializer, ListingReadSerializer
+from utils.envelope import Envelope
+from utils.renderers import ORJSONRenderer
+
+
+def _time_per_call(func, iterations):
+    """Return the mean wall time of `func` in milliseconds."""
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+class Command(BaseCommand):
+    help = "Benchmark serialize + render time for a page of listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--images-per-listing", type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            listing_ids = self.seed(
+                max(options["sizes"]), options["images_per_listing"]
+            )
+            for size in options["sizes"]:
+                self.benchmark(listing_ids[:size], options["iterations"])
+            transaction.set_rollback(True)
+
+    def seed(self, count, images_per_listing):
+        """Create `count` listings with images and return their ids."""
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(
+            name=f"Benchmark {suffix}", description="benchmark"
+        )
+        seller = User.objects.create(
+            email=f"benchmark-{suffix}@example.com",
+            first_name="Bench",
+            last_name="Mark",
+        )
+        listings = Listing.objects.bulk_create(
+            Listing(
+                title=f"Benchmark listing {suffix} {index}",
+                description="A reasonably long description " * 8,
+                price=1000 + index,
+                category=category,
+                seller=seller,
+            )
+            for index in range(count)
+        )
+        ListingImage.objects.bulk_create(
+            ListingImage(listing=listing, image=f"listing_images/{suffix}-{index}.jpg")
+            for listing in listings
+            for index in range(images_per_listing)
+        )
+        return [listing.id for listing in listings]
+
+    def benchmark(self, listing_ids, iterations):
+        queryset = (
+            Listing.objects.filter(id__in=listing_ids)
+            .select_related("seller", "category")
+            .prefetch_related("images")
+            .order_by("-created_at")
+        )
+
+        def model_serializer():
+            return ListingReadSerializer(queryset.all(), many=True).data
+
+        def feed_serializer():
+            rows = ListingFeedSerializer.get_values_queryset(queryset.all())
+            return ListingFeedSerializer(rows).data
+
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        envelope = Envelope(
+            success=True, data={"results": model_serializer()}
+        ).to_dict()
+        feed_envelope = Envelope(
+            success=True, data={"results": feed_serializer()}
+        ).to_dict()
+        if fast.render(envelope) != fast.render(feed_envelope):
+            self.stderr.write(self.style.ERROR("Serializers produced different output"))
+        if stdlib.render(envelope) != fast.render(envelope):
+            self.stderr.write(self.style.ERROR("Renderers produced different output"))
+
+        model_ms = _time_per_call(model_serializer, iterations)
+        feed_ms = _time_per_call(feed_serializer, iterations)
+        stdlib_ms = _time_per_call(lambda: stdlib.render(envelope), iterations)
+        orjson_ms = _time_per_call(lambda: fast.render(envelope), iterations)
+
+        self.stdout.write(
+            f"{len(listing_ids)} listings per page, {iterations} iterations"
+        )
+        self.stdout.write(f"  fetch + ListingReadSerializer  {model_ms:9.3f} ms")
+        self.stdout.write(f"  fetch + ListingFeedSerializer  {feed_ms:9.3f} ms")
+        self.stdout.write(f"  render (json)                  {stdlib_ms:9.3f} ms")
+        self.stdout.write(f"  render (orjson)                {orjson_ms:9.3f} ms")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  total {model_ms + stdlib_ms:9.3f} ms -> {feed_ms + orjson_ms:9.3f} ms"
+                f" ({(model_ms + stdlib_ms) / (feed_ms + orjson_ms):.1f}x faster)"
+            )
+        )
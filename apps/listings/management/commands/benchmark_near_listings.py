@@ -0,0 +1,128 @@
+"""
+Django management command to benchmark radius queries on listings.
+
+Seeds listings at random points, most of them around a city and the rest
+spread over the country, inside a transaction that is rolled back afterwards.
+For every radius it times the `near` filter of ListingFilter, which narrows
+candidates with geohash prefixes and a bounding box before computing
+distances, against computing the haversine distance of every listing. Both
+must return the same listings.
+
+Usage:
+    python manage.py benchmark_near_listings
+    python manage.py benchmark_near_listings --count 200000 --radii 0.5 2 10
+    python manage.py benchmark_near_listings --explain
+"""
+
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.listings.filters import ListingFilter
+from apps.listings.models import Category, Listing, User
+from utils.geo import distance_km_expression, encode_geohash
+
+# Kathmandu, and roughly the bounding box of Nepal.
+CENTER = (27.7172, 85.3240)
+COUNTRY = ((26.35, 80.06), (30.45, 88.2))
+
+
+def _time_per_call(func, iterations):
+    """Return the mean wall time of `func` in milliseconds."""
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+class Command(BaseCommand):
+    help = "Benchmark geohash-indexed radius queries against a full scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100_000)
+        parser.add_argument(
+            "--radii", type=float, nargs="+", default=[0.5, 2.0, 10.0, 50.0]
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--explain", action="store_true", help="Print the query plans"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options["count"], random.Random(options["seed"]))
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Listing._meta.db_table}")
+            self.stdout.write(f"{options['count']} listings")
+            for radius_km in options["radii"]:
+                self.benchmark(radius_km, options["iterations"], options["explain"])
+            transaction.set_rollback(True)
+
+    def seed(self, count, rng):
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(
+            name=f"Benchmark {suffix}", description="benchmark"
+        )
+        seller = User.objects.create(
+            email=f"benchmark-{suffix}@example.com",
+            first_name="Bench",
+            last_name="Mark",
+        )
+        (min_lat, min_lon), (max_lat, max_lon) = COUNTRY
+
+        def point():
+            if rng.random() < 0.7:
+                return rng.gauss(CENTER[0], 0.1), rng.gauss(CENTER[1], 0.1)
+            return rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+
+        listings = []
+        for index in range(count):
+            latitude, longitude = point()
+            listings.append(
+                Listing(
+                    title=f"Benchmark listing {suffix} {index}",
+                    description="benchmark",
+                    price=1000,
+                    category=category,
+                    seller=seller,
+                    latitude=latitude,
+                    longitude=longitude,
+                    # bulk_create skips save(), which sets the geohash.
+                    geohash=encode_geohash(latitude, longitude),
+                )
+            )
+        Listing.objects.bulk_create(listings, batch_size=5000)
+
+    def benchmark(self, radius_km, iterations, explain):
+        near = f"{CENTER[0]},{CENTER[1]}"
+        indexed = ListingFilter(
+            {"near": near, "radius_km": radius_km}, queryset=Listing.objects.all()
+        ).qs
+        full_scan = (
+            Listing.objects.alias(distance_km=distance_km_expression(*CENTER))
+            .filter(distance_km__lte=radius_km)
+            .order_by("distance_km")
+        )
+
+        def fetch(queryset):
+            return list(queryset.values_list("id", flat=True))
+
+        found = fetch(indexed)
+        if set(found) != set(fetch(full_scan)):
+            self.stderr.write(self.style.ERROR("Queries returned different listings"))
+
+        indexed_ms = _time_per_call(lambda: fetch(indexed), iterations)
+        full_scan_ms = _time_per_call(lambda: fetch(full_scan), iterations)
+        self.stdout.write(f"radius {radius_km} km, {len(found)} listings")
+        self.stdout.write(f"  full scan           {full_scan_ms:9.3f} ms")
+        self.stdout.write(f"  geohash + bbox      {indexed_ms:9.3f} ms")
+        self.stdout.write(
+            self.style.SUCCESS(f"  {full_scan_ms / indexed_ms:.1f}x faster")
+        )
+        if explain:
+            self.stdout.write(indexed.values_list("id").explain())
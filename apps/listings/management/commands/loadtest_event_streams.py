@@ -0,0 +1,184 @@
+"""
+Django management command to load test the server-sent event streams.
+
+Opens many concurrent streams against a running ASGI server, signed in as a
+pool of load test users, and keeps them idle for a while. It reports how
+many streams were opened and stayed open, how long opening took, the server's
+resident memory per stream when given its process id, and how long one event
+published to every user took to reach all of their streams.
+
+The load test users (loadtest-<n>@example.com) are created on the first run
+and kept, since the server has to find them.
+
+Usage:
+    python manage.py loadtest_event_streams
+    python manage.py loadtest_event_streams --connections 10000 --users 1000 \
+        --hold 60 --pid $(pgrep -f "uvicorn chautari.asgi" | head -1)
+"""
+
+import asyncio
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.listings.models import User
+from utils.events import publish
+
+LOAD_TEST_EVENT = "loadtest.ping"
+
+
+def _resident_kb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+class Stream:
+    """One open event stream and when it received the load test event."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.received_at = None
+        self.closed = False
+
+
+class Command(BaseCommand):
+    help = "Hold many idle event streams open against a running ASGI server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8000/api/v1/events")
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--hold", type=float, default=30.0, help="Seconds to keep streams idle"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=200, help="Streams opening at once"
+        )
+        parser.add_argument("--pid", type=int, help="Process id of the server")
+
+    def handle(self, *args, **options):
+        # Every stream is a file descriptor on this side too.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        if options["connections"] > hard - 100:
+            self.stderr.write(
+                self.style.WARNING(f"open file limit {hard} caps the streams")
+            )
+        tokens = self.tokens(options["users"])
+        asyncio.run(self.run(tokens, options))
+
+    def tokens(self, count):
+        tokens = {}
+        for index in range(count):
+            user, _ = User.objects.get_or_create(
+                email=f"loadtest-{index}@example.com",
+                defaults={"first_name": "Load", "last_name": "Test"},
+            )
+            tokens[user.pk] = str(AccessToken.for_user(user))
+        return tokens
+
+    async def run(self, tokens, options):
+        url = urlsplit(options["url"])
+        pid = options["pid"]
+        memory_before = _resident_kb(pid) if pid else 0
+        user_ids = list(tokens)
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        streams, open_times, readers = [], [], []
+
+        async def open_stream(index):
+            user_id = user_ids[index % len(user_ids)]
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    reader, writer = await asyncio.open_connection(
+                        url.hostname, url.port or 80
+                    )
+                    writer.write(
+                        f"GET {url.path}?token={tokens[user_id]} HTTP/1.1\r\n"
+                        f"Host: {url.netloc}\r\n"
+                        "Accept: text/event-stream\r\n\r\n".encode()
+                    )
+                    await writer.drain()
+                    status = await reader.readline()
+                    if b" 200 " not in status:
+                        writer.close()
+                        return
+                    while not (await reader.readline()).startswith(b"retry:"):
+                        pass
+                except OSError:
+                    return
+                open_times.append((time.perf_counter() - start) * 1000)
+            stream = Stream(user_id)
+            streams.append(stream)
+            readers.append(asyncio.create_task(self.read(stream, reader, writer)))
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(open_stream(index) for index in range(options["connections"]))
+        )
+        self.stdout.write(
+            f"opened {len(streams)} of {options['connections']} streams "
+            f"in {time.perf_counter() - start:.1f} s, "
+            f"p50 {_percentile(open_times, 50):.1f} ms, "
+            f"p99 {_percentile(open_times, 99):.1f} ms"
+        )
+        if not streams:
+            return
+        if pid:
+            memory = _resident_kb(pid) - memory_before
+            self.stdout.write(
+                f"server memory {memory / 1024:.1f} MiB more, "
+                f"{memory / len(streams):.1f} KiB per stream"
+            )
+
+        await asyncio.sleep(options["hold"])
+        open_streams = [stream for stream in streams if not stream.closed]
+        self.stdout.write(
+            f"{len(open_streams)} streams still open after {options['hold']:.0f} s"
+        )
+
+        published_at = time.perf_counter()
+        publish(user_ids, LOAD_TEST_EVENT, {})
+        deadline = published_at + 10
+        while time.perf_counter() < deadline and any(
+            stream.received_at is None for stream in open_streams
+        ):
+            await asyncio.sleep(0.01)
+        latencies = [
+            (stream.received_at - published_at) * 1000
+            for stream in open_streams
+            if stream.received_at is not None
+        ]
+        self.stdout.write(
+            f"event reached {len(latencies)} of {len(open_streams)} streams, "
+            f"p50 {_percentile(latencies, 50):.1f} ms, "
+            f"p99 {_percentile(latencies, 99):.1f} ms, "
+            f"max {max(latencies, default=0):.1f} ms"
+        )
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    async def read(self, stream, reader, writer):
+        try:
+            while line := await reader.readline():
+                if line.startswith(f"event: {LOAD_TEST_EVENT}".encode()):
+                    stream.received_at = time.perf_counter()
+        except OSError:
+            pass
+        finally:
+            stream.closed = True
+            writer.close()
@@ -0,0 +1,29 @@
+"""
+Django management command to recompute the "more like this" neighbours of
+every available listing.
+
+Neighbours are normally kept current as listings are saved; run this once to
+backfill existing listings or after changing SIMILAR_LISTINGS_* settings.
+
+Usage:
+    python manage.py rebuild_similar_listings
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.listings.models import Listing
+from apps.listings.similarity import refresh_similar_listings
+
+
+class Command(BaseCommand):
+    help = "Recompute similar listings of every available listing"
+
+    def handle(self, *args, **options):
+        listing_ids = list(
+            Listing.objects.filter(is_active=True, is_sold=False)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        for listing_id in listing_ids:
+            refresh_similar_listings(listing_id)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(listing_ids)} listings"))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_listings', to='listings.listing')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing', '-score'], name='similarlisting_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'similar'), name='unique_similar_listing')],
+            },
+        ),
+    ]
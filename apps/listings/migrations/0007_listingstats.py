@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_similarlisting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingStats',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='listings.listing')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('unique_viewers', models.PositiveIntegerField(default=0)),
+                ('trending_score', models.FloatField(default=0.0)),
+                ('last_viewed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'listing stats',
+                'indexes': [models.Index(fields=['-trending_score'], name='listingstats_trending_idx')],
+            },
+        ),
+    ]
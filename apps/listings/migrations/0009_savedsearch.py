@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('min_price', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_price', models.PositiveIntegerField(blank=True, null=True)),
+                ('condition', models.CharField(blank=True, choices=[('brand_new', 'Brand New'), ('barely_used', 'Barely Used'), ('lightly_used', 'Lightly Used'), ('well_used', 'Well Used'), ('heavily_used', 'Heavily Used'), ('not_working', 'Not Working')], max_length=100)),
+                ('keywords', models.CharField(blank=True, max_length=255)),
+                ('term_count', models.PositiveSmallIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='listings.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'saved searches',
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='listings.listing')),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='listings.savedsearch')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('notified_at__isnull', True)), fields=['created_at'], name='savedsearchmatch_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('saved_search', 'listing'), name='unique_saved_search_match')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(blank=True, max_length=64)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='listings.category')),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='listings.savedsearch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'category'], name='savedsearchterm_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('saved_search', 'term'), name='unique_saved_search_term')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_savedsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingPriceSummary',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price_summary', serialize=False, to='listings.listing')),
+                ('initial_price', models.PositiveIntegerField()),
+                ('min_price', models.PositiveIntegerField()),
+                ('max_price', models.PositiveIntegerField()),
+                ('previous_price', models.PositiveIntegerField()),
+                ('last_price', models.PositiveIntegerField()),
+                ('change_count', models.PositiveIntegerField(default=0)),
+                ('last_changed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'listing price summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingPriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.PositiveIntegerField()),
+                ('new_price', models.PositiveIntegerField()),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_changes', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing', 'id'], name='listingpricechange_idx')],
+            },
+        ),
+    ]
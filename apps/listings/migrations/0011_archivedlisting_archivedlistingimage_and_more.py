@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:59
+
+import autoslug.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listingpricesummary_listingpricechange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedListing',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('price', models.PositiveIntegerField()),
+                ('slug', models.SlugField(db_index=False)),
+                ('category_id', models.BigIntegerField()),
+                ('condition', models.CharField(choices=[('brand_new', 'Brand New'), ('barely_used', 'Barely Used'), ('lightly_used', 'Lightly Used'), ('well_used', 'Well Used'), ('heavily_used', 'Heavily Used'), ('not_working', 'Not Working')], max_length=100)),
+                ('seller_id', models.BigIntegerField(db_index=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('is_active', models.BooleanField()),
+                ('is_sold', models.BooleanField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('deleted_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedListingImage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('image', models.ImageField(upload_to='listing_images/')),
+                ('uploaded_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='slug',
+            field=autoslug.fields.AutoSlugField(editable=False, manager_name='all_objects', populate_from='title', unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('is_active', True)), fields=['-created_at'], name='listing_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='listing_deleted_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedlistingimage',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='listings.archivedlisting'),
+        ),
+    ]
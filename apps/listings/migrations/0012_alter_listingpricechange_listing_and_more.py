@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_archivedlisting_archivedlistingimage_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingpricechange',
+            name='listing',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='price_changes', to='listings.listing'),
+        ),
+        migrations.AlterField(
+            model_name='listingpricesummary',
+            name='listing',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='price_summary', serialize=False, to='listings.listing'),
+        ),
+        migrations.AlterField(
+            model_name='listingstats',
+            name='listing',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='listings.listing'),
+        ),
+        migrations.AlterField(
+            model_name='savedlisting',
+            name='listing',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='listings.listing'),
+        ),
+        migrations.AlterField(
+            model_name='savedsearchmatch',
+            name='listing',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='listings.listing'),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from autoslug import AutoSlugField
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from utils.geo import LocatedModel
 
 User = get_user_model()
 
@@ -10,6 +14,7 @@ class Category(models.Model):
     description = models.TextField(blank=False)
     color = models.CharField(default="#FFF")
     slug = AutoSlugField(populate_from="name", unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -27,11 +32,19 @@ class LISTING_CONDITION(models.TextChoices):
     NOT_WORKING = "not_working", "Not Working"
 
 
-class Listing(models.Model):
+class ListingManager(models.Manager):
+    """Listings that haven't been deleted."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class Listing(LocatedModel):
     title = models.CharField(max_length=255, blank=False)
     description = models.TextField(blank=False)
     price = models.PositiveIntegerField()
-    slug = AutoSlugField(populate_from="title", unique=True)
+    # Unique among deleted listings too, until they're archived.
+    slug = AutoSlugField(populate_from="title", unique=True, manager_name="all_objects")
     category = models.ForeignKey(
         Category, on_delete=models.PROTECT, related_name="listings"
     )
@@ -46,21 +59,45 @@ class Listing(models.Model):
     is_sold = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Deleted listings are kept, hidden by `objects`, until they're archived;
+    # see apps.listings.archive.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ListingManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at"],
+                condition=Q(deleted_at__isnull=True, is_active=True),
+                name="listing_feed_idx",
+            ),
+            models.Index(
+                fields=["deleted_at"],
+                condition=Q(deleted_at__isnull=False),
+                name="listing_deleted_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
     def mark_sold(self):
         self.is_sold = True
-        self.save(update_fields=["is_sold"])
+        self.save(update_fields=["is_sold", "updated_at"])
 
     def mark_inactive(self):
         self.is_active = False
-        self.save(update_fields=["is_active"])
+        self.save(update_fields=["is_active", "updated_at"])
 
     def mark_active(self):
         self.is_active = True
-        self.save(update_fields=["is_active"])
+        self.save(update_fields=["is_active", "updated_at"])
+
+    def mark_deleted(self):
+        self.deleted_at = timezone.now()
+        self.save(update_fields=["deleted_at", "updated_at"])
 
 
 class ListingImage(models.Model):
@@ -75,7 +112,10 @@ class SavedListing(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="saved_listings"
     )
-    listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
+    # Kept when the listing is archived, see apps.listings.archive.
+    listing = models.ForeignKey(
+        Listing, on_delete=models.DO_NOTHING, db_constraint=False
+    )
 
     class Meta:
         constraints = [
@@ -83,3 +123,214 @@ class SavedListing(models.Model):
                 fields=["user", "listing"], name="unique_saved_listing"
             )
         ]
+
+
+class SimilarListing(models.Model):
+    """A precomputed "more like this" neighbour of a listing."""
+
+    listing = models.ForeignKey(
+        Listing, on_delete=models.CASCADE, related_name="similar_listings"
+    )
+    similar = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["listing", "similar"], name="unique_similar_listing"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["listing", "-score"], name="similarlisting_score_idx")
+        ]
+
+
+class ListingStats(models.Model):
+    """View counts of a listing, flushed periodically from Redis counters."""
+
+    # Kept when the listing is archived, see apps.listings.archive.
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name="stats",
+    )
+    views = models.PositiveBigIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+    # log2 of the listing's decayed view weight, scaled to a fixed epoch; see
+    # apps.listings.trending. Comparable across listings at any time.
+    trending_score = models.FloatField(default=0.0)
+    last_viewed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "listing stats"
+        indexes = [
+            models.Index(fields=["-trending_score"], name="listingstats_trending_idx")
+        ]
+
+
+class SavedSearch(models.Model):
+    """A user's listing filter, matched against new listings to alert them."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="saved_searches"
+    )
+    name = models.CharField(max_length=100, blank=True)
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True
+    )
+    min_price = models.PositiveIntegerField(null=True, blank=True)
+    max_price = models.PositiveIntegerField(null=True, blank=True)
+    condition = models.CharField(
+        max_length=100, choices=LISTING_CONDITION.choices, blank=True
+    )
+    keywords = models.CharField(max_length=255, blank=True)
+    # Rows in the search's SavedSearchTerm index, see
+    # apps.listings.saved_searches.
+    term_count = models.PositiveSmallIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "saved searches"
+
+    def __str__(self):
+        return self.name or self.keywords or f"Saved search {self.pk}"
+
+
+class SavedSearchTerm(models.Model):
+    """Inverted index of saved searches by keyword and category."""
+
+    saved_search = models.ForeignKey(
+        SavedSearch, on_delete=models.CASCADE, related_name="terms"
+    )
+    # A keyword, or "" for searches without keywords.
+    term = models.CharField(max_length=64, blank=True)
+    # Copied from the search so lookups don't join it.
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["saved_search", "term"], name="unique_saved_search_term"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["term", "category"], name="savedsearchterm_lookup_idx")
+        ]
+
+
+class SavedSearchMatch(models.Model):
+    """A listing that matched a saved search, pending or sent in an alert."""
+
+    saved_search = models.ForeignKey(
+        SavedSearch, on_delete=models.CASCADE, related_name="matches"
+    )
+    # Kept when the listing is archived, see apps.listings.archive.
+    listing = models.ForeignKey(
+        Listing, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["saved_search", "listing"], name="unique_saved_search_match"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                name="savedsearchmatch_pending_idx",
+                condition=models.Q(notified_at__isnull=True),
+            )
+        ]
+
+
+class ListingPriceChange(models.Model):
+    """A change of a listing's price. Changes are only ever appended."""
+
+    # Covered by the (listing, id) index. Kept when the listing is archived.
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="price_changes",
+        db_index=False,
+    )
+    old_price = models.PositiveIntegerField()
+    new_price = models.PositiveIntegerField()
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing", "id"], name="listingpricechange_idx")
+        ]
+
+
+class ListingPriceSummary(models.Model):
+    """A listing's price history summed up, kept current by each change."""
+
+    # Kept when the listing is archived, see apps.listings.archive.
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name="price_summary",
+    )
+    initial_price = models.PositiveIntegerField()
+    min_price = models.PositiveIntegerField()
+    max_price = models.PositiveIntegerField()
+    previous_price = models.PositiveIntegerField()
+    last_price = models.PositiveIntegerField()
+    change_count = models.PositiveIntegerField(default=0)
+    last_changed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "listing price summaries"
+
+
+class ArchivedListing(models.Model):
+    """
+    A deleted listing moved out of the listings table, kept for analytics.
+    Keeps the listing's id; its seller and category are plain ids, so they
+    can be deleted without touching the archive.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    price = models.PositiveIntegerField()
+    slug = models.SlugField(max_length=50, db_index=False)
+    category_id = models.BigIntegerField()
+    condition = models.CharField(max_length=100, choices=LISTING_CONDITION.choices)
+    seller_id = models.BigIntegerField(db_index=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    is_active = models.BooleanField()
+    is_sold = models.BooleanField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedListingImage(models.Model):
+    """An image of an archived listing; the file itself is kept as it was."""
+
+    id = models.BigIntegerField(primary_key=True)
+    listing = models.ForeignKey(
+        ArchivedListing, on_delete=models.CASCADE, related_name="images"
+    )
+    image = models.ImageField(upload_to="listing_images/")
+    uploaded_at = models.DateTimeField()
@@ -0,0 +1,87 @@
+"""
+Listing price history.
+
+Every change of a listing's price appends a ListingPriceChange row, and
+updates the listing's ListingPriceSummary: its first, lowest, highest,
+previous and current price, so showing "price dropped" or a price range
+never scans the history. Listings whose price never changed have neither.
+
+Callers hold a lock on the listing row while they read its old price and
+save the new one, so concurrent changes of a listing are recorded one after
+the other. A change also sends `price_changed`, with the listing, its old price and the
+ListingPriceChange, once the change is committed.
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from apps.listings.models import ListingPriceChange, ListingPriceSummary
+
+price_changed = Signal()
+
+
+@transaction.atomic
+def record_price_change(listing, old_price):
+    """Log that `listing`'s price changed from `old_price` to its price now."""
+    new_price = listing.price
+    if new_price == old_price:
+        return None
+    change = ListingPriceChange.objects.create(
+        listing=listing, old_price=old_price, new_price=new_price
+    )
+    summary, created = ListingPriceSummary.objects.get_or_create(
+        listing=listing,
+        defaults={
+            "initial_price": old_price,
+            "min_price": min(old_price, new_price),
+            "max_price": max(old_price, new_price),
+            "previous_price": old_price,
+            "last_price": new_price,
+            "change_count": 1,
+            "last_changed_at": change.changed_at,
+        },
+    )
+    if not created:
+        summary.min_price = min(summary.min_price, new_price)
+        summary.max_price = max(summary.max_price, new_price)
+        summary.previous_price = old_price
+        summary.last_price = new_price
+        summary.change_count += 1
+        summary.last_changed_at = change.changed_at
+        summary.save()
+    transaction.on_commit(
+        partial(
+            price_changed.send,
+            sender=type(listing),
+            listing=listing,
+            old_price=old_price,
+            change=change,
+        )
+    )
+    return change
+
+
+def price_summary(listing):
+    """Return the price summary of `listing` as a dict."""
+    summary = ListingPriceSummary.objects.filter(listing=listing).first()
+    if summary is None:
+        return {
+            "initial_price": listing.price,
+            "min_price": listing.price,
+            "max_price": listing.price,
+            "previous_price": None,
+            "last_price": listing.price,
+            "change_count": 0,
+            "last_changed_at": None,
+        }
+    return {
+        "initial_price": summary.initial_price,
+        "min_price": summary.min_price,
+        "max_price": summary.max_price,
+        "previous_price": summary.previous_price,
+        "last_price": summary.last_price,
+        "change_count": summary.change_count,
+        "last_changed_at": summary.last_changed_at,
+    }
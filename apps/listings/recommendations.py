@@ -0,0 +1,235 @@
+"""
+Precomputed "recommended for you" listings.
+
+`compute_recommendations()` runs periodically (see the
+compute_listing_recommendations task) and builds, from saved listings:
+
+- a sparse user x listing matrix of saves,
+- item-to-item similarity, the cosine-normalized co-occurrence of saves
+  (listings often saved by the same users are similar),
+- each user's category affinity, the share of their saves per category.
+
+Each user's recommendations are the available listings most similar to the
+ones they saved, topped up with popular listings from their favourite
+categories, excluding listings they saved or sell. Users without saves get
+the most saved listings overall. Results are stored in Redis, shared by the
+worker computing them and the web processes serving them, so serving them is
+a single lookup.
+"""
+
+import itertools
+import logging
+
+import numpy as np
+import orjson
+import redis
+from django.conf import settings
+from scipy import sparse
+
+from apps.listings.models import Listing, SavedListing
+from utils.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_KEY = "recommendations:similar:{}"
+USER_KEY = "recommendations:user:{}"
+AFFINITY_KEY = "recommendations:affinity:{}"
+POPULAR_KEY = "recommendations:popular"
+
+_CHUNK_SIZE = 10_000
+
+
+def _fetch_array(queryset, fields):
+    """Stream integer `fields` of `queryset` into an (n, len(fields)) array."""
+    rows = queryset.values_list(*fields).iterator(chunk_size=_CHUNK_SIZE)
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64)
+    return flat.reshape(-1, len(fields))
+
+
+def top_n(matrix, n):
+    """Return the column indices of the `n` largest entries of each CSR row."""
+    result = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        data, indices = matrix.data[start:end], matrix.indices[start:end]
+        if len(data) > n:
+            keep = np.argpartition(-data, n)[:n]
+            data, indices = data[keep], indices[keep]
+        result.append(indices[np.argsort(-data, kind="stable")])
+    return result
+
+
+class RecommendationData:
+    """Saves and listing attributes as arrays indexed by matrix position."""
+
+    def __init__(self):
+        listings = _fetch_array(
+            Listing.objects.order_by("id"),
+            ("id", "seller_id", "category_id", "is_active", "is_sold"),
+        )
+        self.listing_ids = listings[:, 0]
+        self.sellers = listings[:, 1]
+        self.categories, category_index = np.unique(listings[:, 2], return_inverse=True)
+        self.available = (listings[:, 3] == 1) & (listings[:, 4] == 0)
+
+        saves = _fetch_array(
+            SavedListing.objects.filter(listing__deleted_at__isnull=True),
+            ("user_id", "listing_id"),
+        )
+        item_index = np.searchsorted(self.listing_ids, saves[:, 1])
+        # Listings created after they were read aren't in the matrices, and
+        # their saves wait for the next run.
+        known = item_index < len(self.listing_ids)
+        known[known] = self.listing_ids[item_index[known]] == saves[known, 1]
+        saves, item_index = saves[known], item_index[known]
+        self.user_ids, user_index = np.unique(saves[:, 0], return_inverse=True)
+
+        shape = (len(self.user_ids), len(self.listing_ids))
+        self.saves = sparse.csr_matrix(
+            (np.ones(len(saves), dtype=np.float32), (user_index, item_index)),
+            shape=shape,
+        )
+        self.saves.sum_duplicates()
+        self.item_categories = sparse.csr_matrix(
+            (
+                np.ones(len(self.listing_ids), dtype=np.float32),
+                (np.arange(len(self.listing_ids)), category_index),
+            ),
+            shape=(len(self.listing_ids), len(self.categories)),
+        )
+
+        # Listings each user sells, among the users who saved something.
+        seller_rows = np.searchsorted(self.user_ids, self.sellers)
+        is_user = seller_rows < len(self.user_ids)
+        is_user[is_user] = self.user_ids[seller_rows[is_user]] == self.sellers[is_user]
+        self.owned = sparse.csr_matrix(
+            (
+                np.ones(is_user.sum(), dtype=np.float32),
+                (seller_rows[is_user], np.flatnonzero(is_user)),
+            ),
+            shape=shape,
+        )
+
+    def item_similarity(self):
+        """Cosine-normalized co-occurrence, only towards available listings."""
+        co_occurrence = (self.saves.T @ self.saves).tocsr()
+        co_occurrence -= sparse.diags(co_occurrence.diagonal())
+        counts = np.asarray(self.saves.sum(axis=0)).ravel()
+        norms = np.sqrt(counts)
+        norms[norms == 0] = 1
+        scale = sparse.diags(1 / norms)
+        similarity = (
+            scale
+            @ co_occurrence
+            @ scale
+            @ sparse.diags(self.available.astype(np.float32))
+        )
+        similarity = similarity.tocsr()
+        similarity.eliminate_zeros()
+        return similarity
+
+    def popularity(self):
+        """Save counts of available listings, zero for the others."""
+        return np.asarray(self.saves.sum(axis=0)).ravel() * self.available
+
+
+def compute_recommendations():
+    """Compute and store recommendations; returns counts of what was stored."""
+    n = settings.RECOMMENDATIONS_PER_USER
+    data = RecommendationData()
+    if not data.saves.nnz:
+        _set_many([(POPULAR_KEY, [])])
+        return {"users": 0, "listings": len(data.listing_ids), "saves": 0}
+
+    similarity = data.item_similarity()
+    popularity = data.popularity()
+    ids = data.listing_ids
+
+    popular = [
+        int(ids[i]) for i in np.argsort(-popularity, kind="stable")[:n] if popularity[i]
+    ]
+    _set_many([(POPULAR_KEY, popular)])
+
+    # Most saved available listings of each category, for topping up.
+    category_popularity = (data.item_categories.T @ sparse.diags(popularity)).tocsr()
+    category_popularity.eliminate_zeros()
+    category_popular = top_n(category_popularity, n)
+
+    similar = top_n(similarity, settings.RECOMMENDATIONS_SIMILAR_PER_LISTING)
+    _set_many(
+        (SIMILAR_KEY.format(ids[item]), [int(ids[i]) for i in others])
+        for item, others in enumerate(similar)
+        if len(others)
+    )
+
+    affinity = sparse.csr_matrix(data.saves @ data.item_categories)
+    for start in range(0, len(data.user_ids), settings.RECOMMENDATIONS_BATCH_SIZE):
+        rows = slice(start, start + settings.RECOMMENDATIONS_BATCH_SIZE)
+        seen = (data.saves[rows] + data.owned[rows]).tocsr()
+        scores = (data.saves[rows] @ similarity).tocsr()
+        # Drop listings the user already saved or sells.
+        scores = (scores - scores.multiply(seen > 0)).tocsr()
+        scores.eliminate_zeros()
+
+        entries = []
+        for offset, candidates in enumerate(top_n(scores, n)):
+            row = start + offset
+            user_affinity = affinity[row]
+            weights = user_affinity.data / user_affinity.data.sum()
+            excluded = set(seen[offset].indices) | set(candidates)
+            picks = list(candidates)
+            for category in user_affinity.indices[np.argsort(-weights)]:
+                if len(picks) >= n:
+                    break
+                for item in category_popular[category]:
+                    if item not in excluded:
+                        picks.append(item)
+                        excluded.add(item)
+                        if len(picks) >= n:
+                            break
+
+            user_id = data.user_ids[row]
+            entries.append((USER_KEY.format(user_id), [int(ids[i]) for i in picks]))
+            entries.append(
+                (
+                    AFFINITY_KEY.format(user_id),
+                    {
+                        int(data.categories[category]): round(float(weight), 4)
+                        for category, weight in zip(user_affinity.indices, weights)
+                    },
+                )
+            )
+        _set_many(entries)
+
+    return {
+        "users": len(data.user_ids),
+        "listings": len(ids),
+        "saves": int(data.saves.nnz),
+    }
+
+
+def _set_many(entries):
+    timeout = settings.RECOMMENDATIONS_CACHE_TIMEOUT
+    client = get_redis()
+    for batch in itertools.batched(entries, 1000):
+        pipe = client.pipeline(transaction=False)
+        for key, value in batch:
+            pipe.set(
+                key, orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS), ex=timeout
+            )
+        pipe.execute()
+
+
+def get_recommended_ids(user):
+    """Return the precomputed listing ids to recommend to `user`."""
+    try:
+        found = get_redis().mget(USER_KEY.format(user.pk), POPULAR_KEY)
+    except redis.RedisError:
+        # The view falls back to the newest listings.
+        logger.warning("could not read recommendations", exc_info=True)
+        return []
+    for value in found:
+        ids = orjson.loads(value) if value else []
+        if ids:
+            return ids
+    return []
@@ -0,0 +1,152 @@
+"""
+Saved-search alerts.
+
+A saved search is indexed by its keywords in SavedSearchTerm, one row per
+keyword (or a single "" row when it has none), each carrying the search's
+category. When a listing is created or reactivated, `match_listing()` looks
+up the rows whose term is one of the listing's words, or "", and whose
+category is the listing's or none. A search matches when all of its rows are
+found, i.e. the listing contains every keyword, and its price range and
+condition fit. That is one indexed query however many searches there are,
+instead of running every search against the listing.
+
+Matches are stored as SavedSearchMatch rows and `send_alerts()` emails each
+user one digest of their pending matches. New matches also send
+`listing_matched`, with the listing and the users whose searches it matched.
+"""
+
+import logging
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.listings.models import Listing, SavedSearch, SavedSearchMatch, SavedSearchTerm
+from utils.mail import TransientEmailError, send_templated_email
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[^\W_]{2,}")
+
+listing_matched = Signal()
+
+
+def words(text):
+    """Return the distinct lowercase words of `text` that can be keywords."""
+    return set(_WORD.findall(text.lower()))
+
+
+@transaction.atomic
+def index_saved_search(search):
+    """Replace the index rows of `search` after it was created or changed."""
+    terms = sorted(words(search.keywords)) or [""]
+    SavedSearchTerm.objects.filter(saved_search=search).delete()
+    SavedSearchTerm.objects.bulk_create(
+        SavedSearchTerm(saved_search=search, term=term, category_id=search.category_id)
+        for term in terms
+    )
+    if search.term_count != len(terms):
+        search.term_count = len(terms)
+        search.save(update_fields=["term_count"])
+
+
+def matching_searches(listing):
+    """Return the active saved searches of other users matching `listing`."""
+    terms = words(f"{listing.title} {listing.description}") | {""}
+    candidates = (
+        SavedSearchTerm.objects.filter(term__in=terms)
+        .filter(Q(category__isnull=True) | Q(category_id=listing.category_id))
+        .values("saved_search_id")
+        .annotate(found=Count("id"))
+        .filter(found=F("saved_search__term_count"))
+        .values("saved_search_id")
+    )
+    return (
+        SavedSearch.objects.filter(id__in=candidates, is_active=True)
+        .exclude(user_id=listing.seller_id)
+        .filter(Q(min_price__isnull=True) | Q(min_price__lte=listing.price))
+        .filter(Q(max_price__isnull=True) | Q(max_price__gte=listing.price))
+        .filter(Q(condition="") | Q(condition=listing.condition))
+    )
+
+
+def match_listing(listing_id):
+    """Record the saved searches `listing_id` newly matches; returns how many."""
+    listing = Listing.objects.filter(
+        id=listing_id, is_active=True, is_sold=False
+    ).first()
+    if listing is None:
+        return 0
+    users = dict(matching_searches(listing).values_list("id", "user_id"))
+    # A listing reactivated after it was matched isn't alerted twice.
+    for search_id in SavedSearchMatch.objects.filter(
+        listing=listing, saved_search_id__in=users
+    ).values_list("saved_search_id", flat=True):
+        del users[search_id]
+    SavedSearchMatch.objects.bulk_create(
+        [
+            SavedSearchMatch(saved_search_id=search_id, listing=listing)
+            for search_id in users
+        ],
+        ignore_conflicts=True,
+    )
+    if users:
+        listing_matched.send(
+            sender=Listing, listing=listing, user_ids=set(users.values())
+        )
+    return len(users)
+
+
+def send_alerts():
+    """Email every user with pending matches one digest of them."""
+    pending = (
+        SavedSearchMatch.objects.filter(notified_at__isnull=True)
+        .select_related("saved_search__user", "listing")
+        .order_by("saved_search__user_id", "id")[
+            : settings.SAVED_SEARCH_ALERT_BATCH_SIZE
+        ]
+    )
+    by_user = defaultdict(list)
+    for match in pending:
+        by_user[match.saved_search.user].append(match)
+
+    sent = 0
+    for user, matches in by_user.items():
+        # Listings sold, hidden or deleted since they matched are dropped
+        # silently.
+        listings = {}
+        for match in matches:
+            if (
+                match.saved_search.is_active
+                and match.listing.is_active
+                and not match.listing.is_sold
+                and match.listing.deleted_at is None
+            ):
+                listings.setdefault(
+                    match.listing_id, (match.listing, match.saved_search)
+                )
+        if listings:
+            try:
+                send_templated_email(
+                    subject=f"{len(listings)} new listings match your saved searches",
+                    template_name="listings/email/saved_search_alert.txt",
+                    context={
+                        "first_name": user.first_name,
+                        "matches": listings.values(),
+                    },
+                    recipient=user.email,
+                    idempotency_key=f"saved-search-alert:{user.pk}:{matches[-1].pk}",
+                )
+            except TransientEmailError:
+                # Left pending for the next run.
+                logger.warning(f"could not send saved search alert to {user.email}")
+                continue
+            sent += 1
+        SavedSearchMatch.objects.filter(id__in=[match.id for match in matches]).update(
+            notified_at=timezone.now()
+        )
+    return sent
@@ -1,7 +1,21 @@
 from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
-from .models import Category, Listing, ListingImage, SavedListing, User
+from apps.listings.prices import record_price_change
+from apps.listings.saved_searches import index_saved_search, words
+from utils.geo import validate_location
+
+from .models import (
+    LISTING_CONDITION,
+    Category,
+    Listing,
+    ListingImage,
+    ListingPriceChange,
+    SavedListing,
+    SavedSearch,
+    SavedSearchTerm,
+    User,
+)
 
 
 class CategoryReadSerializer(serializers.ModelSerializer):
@@ -55,6 +69,8 @@ class ListingReadSerializer(serializers.ModelSerializer):
             "is_sold",
             "is_active",
             "category",
+            "latitude",
+            "longitude",
             "created_at",
             "updated_at",
         )
@@ -63,6 +79,106 @@ class ListingReadSerializer(serializers.ModelSerializer):
         return condition.get_condition_display()
 
 
+class ListingFeedSerializer:
+    """
+    Values-based drop-in for `ListingReadSerializer(many=True)` on feed pages.
+
+    Rows come from `get_values_queryset()` and images are fetched with one
+    extra query, so no model instances or per-field serializers are created.
+    The output is identical to ListingReadSerializer's.
+    """
+
+    value_fields = (
+        "id",
+        "slug",
+        "title",
+        "description",
+        "price",
+        "seller_id",
+        "seller__email",
+        "seller__first_name",
+        "seller__last_name",
+        "condition",
+        "is_sold",
+        "is_active",
+        "category_id",
+        "category__name",
+        "category__slug",
+        "latitude",
+        "longitude",
+        "created_at",
+        "updated_at",
+    )
+    condition_labels = dict(LISTING_CONDITION.choices)
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def get_values_queryset(cls, queryset):
+        """Turn a Listing queryset into one yielding the rows this class expects."""
+        return (
+            queryset.select_related(None)
+            .prefetch_related(None)
+            .values(*cls.value_fields)
+        )
+
+    def get_images(self, listing_ids):
+        """Return serialized images grouped by listing id."""
+        storage = ListingImage._meta.get_field("image").storage
+        request = self.context.get("request")
+        images = {}
+        for listing_id, image_id, name in (
+            ListingImage.objects.filter(listing_id__in=listing_ids)
+            .order_by("id")
+            .values_list("listing_id", "id", "image")
+        ):
+            url = None
+            if name:
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+            images.setdefault(listing_id, []).append({"id": image_id, "image": url})
+        return images
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        images = self.get_images([row["id"] for row in rows]) if rows else {}
+        labels = self.condition_labels
+        datetime_field = serializers.DateTimeField()
+        return [
+            {
+                "id": row["id"],
+                "slug": row["slug"],
+                "title": row["title"],
+                "description": row["description"],
+                "price": row["price"],
+                "seller": {
+                    "id": row["seller_id"],
+                    "email": row["seller__email"],
+                    "first_name": row["seller__first_name"],
+                    "last_name": row["seller__last_name"],
+                },
+                "images": images.get(row["id"], []),
+                "condition": labels.get(row["condition"], row["condition"]),
+                "is_sold": row["is_sold"],
+                "is_active": row["is_active"],
+                "category": {
+                    "id": row["category_id"],
+                    "name": row["category__name"],
+                    "slug": row["category__slug"],
+                },
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+                "created_at": datetime_field.to_representation(row["created_at"]),
+                "updated_at": datetime_field.to_representation(row["updated_at"]),
+            }
+            for row in rows
+        ]
+
+
 class ListingWriteSerializer(serializers.ModelSerializer):
     images = serializers.ListField(child=serializers.ImageField(), required=False)
 
@@ -76,27 +192,47 @@ class ListingWriteSerializer(serializers.ModelSerializer):
             "images",
             "condition",
             "seller",
+            "latitude",
+            "longitude",
         )
         read_only_fields = ["seller"]
 
+    def validate(self, attrs):
+        return validate_location(attrs, self.instance)
+
     @transaction.atomic
     def create(self, validated_data):
         images_data = validated_data.pop("images", [])
+        seller = validated_data["seller"]
+        if validated_data.get("latitude") is None and hasattr(seller, "profile"):
+            # Listings are where their seller is unless placed elsewhere.
+            validated_data["latitude"] = seller.profile.latitude
+            validated_data["longitude"] = seller.profile.longitude
         listing = Listing.objects.create(**validated_data)
         for image_data in images_data:
             ListingImage.objects.create(listing=listing, image=image_data)
         return listing
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         images_data = validated_data.pop("images", [])
+        old_price = instance.price
         for image_data in images_data:
             ListingImage.objects.create(listing=instance, image=image_data)
-        return super().update(instance, validated_data)
+        listing = super().update(instance, validated_data)
+        record_price_change(listing, old_price)
+        return listing
 
     def to_representation(self, instance):
         return ListingReadSerializer(instance, context=self.context).data
 
 
+class ListingPriceChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ListingPriceChange
+        fields = ("old_price", "new_price", "changed_at")
+
+
 class SavedListingReadSerializer(serializers.ModelSerializer):
     listing = ListingReadSerializer()
 
@@ -124,3 +260,51 @@ class SavedListingWriteSerializer(serializers.ModelSerializer):
         except IntegrityError:
             SavedListing.objects.filter(user=user, listing=listing).delete()
             return None
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    max_keywords = 10
+    max_keyword_length = SavedSearchTerm._meta.get_field("term").max_length
+
+    class Meta:
+        model = SavedSearch
+        fields = (
+            "id",
+            "name",
+            "category",
+            "min_price",
+            "max_price",
+            "condition",
+            "keywords",
+            "is_active",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = ("id", "created_at", "updated_at")
+
+    def validate_keywords(self, value):
+        keywords = words(value)
+        if len(keywords) > self.max_keywords:
+            raise serializers.ValidationError(
+                f"Use at most {self.max_keywords} keywords."
+            )
+        if any(len(keyword) > self.max_keyword_length for keyword in keywords):
+            raise serializers.ValidationError(
+                f"Keywords can be at most {self.max_keyword_length} characters long."
+            )
+        return value
+
+    def validate(self, attrs):
+        min_price = attrs.get("min_price", getattr(self.instance, "min_price", None))
+        max_price = attrs.get("max_price", getattr(self.instance, "max_price", None))
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError(
+                {"max_price": "Must be greater than or equal to min_price."}
+            )
+        return attrs
+
+    @transaction.atomic
+    def save(self, **kwargs):
+        search = super().save(**kwargs)
+        index_saved_search(search)
+        return search
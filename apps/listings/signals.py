@@ -0,0 +1,56 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.listings.events import LISTING_PRICE_DROPPED, status_event
+from apps.listings.models import Listing
+from apps.listings.prices import price_changed
+from apps.listings.tasks import (
+    match_saved_searches,
+    publish_listing_event,
+    refresh_similar_listings,
+)
+
+SIMILARITY_FIELDS = {
+    "title",
+    "description",
+    "price",
+    "category",
+    "is_active",
+    "is_sold",
+    "deleted_at",
+}
+
+
+@receiver(post_save, sender=Listing)
+def refresh_listing_neighbours(instance, update_fields=None, *args, **kwargs):
+    if update_fields is not None and not SIMILARITY_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(partial(refresh_similar_listings.delay, instance.pk))
+
+
+@receiver(post_save, sender=Listing)
+def match_new_listing(instance, created, update_fields=None, *args, **kwargs):
+    reactivated = (
+        update_fields is not None
+        and "is_active" in update_fields
+        and instance.is_active
+    )
+    if created or reactivated:
+        transaction.on_commit(partial(match_saved_searches.delay, instance.pk))
+
+
+@receiver(post_save, sender=Listing)
+def push_status_change(instance, update_fields=None, *args, **kwargs):
+    event = status_event(instance, update_fields)
+    if event is not None:
+        transaction.on_commit(partial(publish_listing_event.delay, instance.pk, event))
+
+
+@receiver(price_changed)
+def push_price_drop(listing, old_price, *args, **kwargs):
+    # Sent once the change is committed.
+    if listing.price < old_price:
+        publish_listing_event.delay(listing.pk, LISTING_PRICE_DROPPED)
@@ -0,0 +1,234 @@
+"""
+Precomputed "more like this" neighbours of listings.
+
+`refresh_similar_listings()` runs whenever a listing is saved (see the
+refresh_similar_listings task). It scores the listing against every other
+available listing of its category by
+
+- text similarity, the cosine of TF-IDF vectors over title and description,
+- price proximity, 1 - |a - b| / max(a, b),
+
+weighted by SIMILAR_LISTINGS_PRICE_WEIGHT, and stores the top
+SIMILAR_LISTINGS_COUNT as SimilarListing rows. Since similarity is
+symmetric, the listing is also added to the neighbours of listings it now
+outscores one of, so neighbour lists stay current without recomputing the
+whole category. Listings that lose this one as a neighbour and are left
+with fewer than they could have are refreshed in turn, which backfills the
+slot. Serving them is one indexed query.
+"""
+
+import re
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Window
+from django.db.models.functions import RowNumber
+from scipy import sparse
+
+from apps.listings.models import Listing, SimilarListing
+
+_TOKEN = re.compile(r"[^\W_]{2,}")
+
+
+def tokenize(title, description):
+    # Titles are short and descriptive, so their words count twice.
+    title_tokens = _TOKEN.findall(title.lower())
+    return title_tokens * 2 + _TOKEN.findall(description.lower())
+
+
+def tfidf_matrix(documents, batch_size):
+    """
+    Return the L2-normalized TF-IDF matrix of tokenized `documents`, one row
+    per document, built `batch_size` documents at a time.
+    """
+    vocabulary = {}
+    batches = []
+    for start in range(0, len(documents), batch_size):
+        rows, columns = [], []
+        for row, tokens in enumerate(documents[start : start + batch_size]):
+            for token in tokens:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(token, len(vocabulary)))
+        batches.append((rows, columns, min(batch_size, len(documents) - start)))
+    if not vocabulary:
+        return sparse.csr_matrix((len(documents), 0), dtype=np.float32)
+
+    counts = sparse.vstack(
+        [
+            sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                shape=(size, len(vocabulary)),
+            )
+            for rows, columns, size in batches
+        ],
+        format="csr",
+    )
+    counts.sum_duplicates()
+    frequencies = np.bincount(counts.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(documents)) / (1 + frequencies)) + 1
+    weights = counts @ sparse.diags(idf.astype(np.float32))
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ weights
+
+
+def price_proximity(price, prices):
+    largest = np.maximum(prices, price).astype(np.float64)
+    largest[largest == 0] = 1
+    return 1 - np.abs(prices - price) / largest
+
+
+def score_candidates(listing, candidates):
+    """Return the similarity of `listing` to each of `candidates`."""
+    documents = [tokenize(listing.title, listing.description)]
+    documents.extend(
+        tokenize(title, description) for _, title, description, _ in candidates
+    )
+    vectors = tfidf_matrix(documents, settings.SIMILAR_LISTINGS_BATCH_SIZE)
+    text = np.asarray((vectors[1:] @ vectors[0].T).todense()).ravel()
+    prices = np.fromiter((price for *_, price in candidates), dtype=np.int64)
+    weight = settings.SIMILAR_LISTINGS_PRICE_WEIGHT
+    return (1 - weight) * text + weight * price_proximity(listing.price, prices)
+
+
+def refresh_similar_listings(listing_id):
+    """
+    Recompute the neighbours of a listing and its place in theirs. Returns
+    the number of neighbours, and the ids of listings that lost this one and
+    are left short of neighbours, to be refreshed themselves.
+    """
+    listing = Listing.all_objects.filter(id=listing_id).first()
+    if listing is None:
+        return 0, []
+    with transaction.atomic():
+        lost = list(
+            SimilarListing.objects.filter(similar=listing).values_list(
+                "listing_id", flat=True
+            )
+        )
+        count = _refresh(listing)
+        return count, _short_of_neighbours(lost, settings.SIMILAR_LISTINGS_COUNT)
+
+
+def _refresh(listing):
+    """Replace the neighbours of `listing` and its place in theirs."""
+    SimilarListing.objects.filter(listing=listing).delete()
+    SimilarListing.objects.filter(similar=listing).delete()
+    if not listing.is_active or listing.is_sold or listing.deleted_at:
+        return 0
+
+    candidates = list(
+        Listing.objects.filter(
+            category_id=listing.category_id, is_active=True, is_sold=False
+        )
+        .exclude(id=listing.id)
+        .values_list("id", "title", "description", "price")
+    )
+    if not candidates:
+        return 0
+    scores = score_candidates(listing, candidates)
+    ids = np.fromiter((row[0] for row in candidates), dtype=np.int64)
+
+    count = settings.SIMILAR_LISTINGS_COUNT
+    top = np.argsort(-scores, kind="stable")[:count]
+    SimilarListing.objects.bulk_create(
+        [
+            SimilarListing(
+                listing=listing, similar_id=int(ids[i]), score=float(scores[i])
+            )
+            for i in top
+        ],
+        ignore_conflicts=True,
+    )
+    _add_as_neighbour(listing, dict(zip(ids.tolist(), scores.tolist())), count)
+    return len(top)
+
+
+def _short_of_neighbours(listing_ids, count):
+    """
+    Return those of `listing_ids` with fewer than `count` neighbours while
+    their category has more available listings to pick from.
+    """
+    listings = dict(
+        Listing.objects.filter(
+            id__in=listing_ids, is_active=True, is_sold=False
+        ).values_list("id", "category_id")
+    )
+    if not listings:
+        return []
+    sizes = dict(
+        SimilarListing.objects.filter(listing_id__in=listings)
+        .values("listing_id")
+        .annotate(size=Count("id"))
+        .values_list("listing_id", "size")
+    )
+    available = dict(
+        Listing.objects.filter(
+            category_id__in=set(listings.values()), is_active=True, is_sold=False
+        )
+        .values("category_id")
+        .annotate(size=Count("id"))
+        .values_list("category_id", "size")
+    )
+    return [
+        listing_id
+        for listing_id, category_id in listings.items()
+        if sizes.get(listing_id, 0) < min(count, available[category_id] - 1)
+    ]
+
+
+def _add_as_neighbour(listing, scores, count):
+    """Insert `listing` into the neighbours of listings it now ranks in."""
+    current = {
+        row["listing_id"]: (row["size"], row["lowest"])
+        for row in SimilarListing.objects.filter(listing_id__in=scores)
+        .values("listing_id")
+        .annotate(size=Count("id"), lowest=Min("score"))
+    }
+    # Candidates without neighbours are missing from `current`, e.g. listings
+    # created before this one was; they get this listing as their first.
+    accepted = [
+        candidate
+        for candidate, score in scores.items()
+        if candidate not in current
+        or current[candidate][0] < count
+        or score > current[candidate][1]
+    ]
+    SimilarListing.objects.bulk_create(
+        [
+            SimilarListing(
+                listing_id=candidate, similar=listing, score=scores[candidate]
+            )
+            for candidate in accepted
+        ],
+        ignore_conflicts=True,
+    )
+    full = [
+        candidate
+        for candidate in accepted
+        if candidate in current and current[candidate][0] >= count
+    ]
+    if full:
+        overflow = (
+            SimilarListing.objects.filter(listing_id__in=full)
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("listing_id"),
+                    order_by=[F("score").desc(), F("id")],
+                )
+            )
+            .filter(position__gt=count)
+            .values_list("id", flat=True)
+        )
+        SimilarListing.objects.filter(id__in=list(overflow)).delete()
+
+
+def get_similar_ids(listing):
+    """Return the ids of `listing`'s precomputed neighbours, best first."""
+    return list(
+        SimilarListing.objects.filter(listing=listing)
+        .order_by("-score")
+        .values_list("similar_id", flat=True)[: settings.SIMILAR_LISTINGS_COUNT]
+    )
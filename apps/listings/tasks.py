@@ -0,0 +1,87 @@
+import logging
+import time
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from apps.listings.archive import archive_deleted
+from apps.listings.events import publish_status_change
+from apps.listings.recommendations import compute_recommendations
+from apps.listings.saved_searches import match_listing, send_alerts
+from apps.listings.similarity import refresh_similar_listings as refresh_neighbours
+from apps.listings.trending import flush_views
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def compute_listing_recommendations():
+    """Recompute the cached listing recommendations of every user."""
+    stats = compute_recommendations()
+    logger.info(
+        f"computed recommendations for {stats['users']} users "
+        f"from {stats['saves']} saves of {stats['listings']} listings"
+    )
+    return stats
+
+
+@shared_task
+def refresh_similar_listings(listing_id):
+    """
+    Recompute the "more like this" neighbours of a saved listing, then of the
+    listings it left short of neighbours.
+    """
+    count, short = refresh_neighbours(listing_id)
+    for neighbour_id in short:
+        refresh_similar_listings.delay(neighbour_id)
+    return count
+
+
+@shared_task
+def flush_listing_views():
+    """Apply view counts buffered in Redis and refresh the trending feed."""
+    return flush_views()
+
+
+@shared_task
+def match_saved_searches(listing_id):
+    """Record the saved searches a new or reactivated listing matches."""
+    return match_listing(listing_id)
+
+
+@shared_task
+def send_saved_search_alerts():
+    """Email users a digest of listings that matched their saved searches."""
+    sent = send_alerts()
+    logger.info(f"sent {sent} saved search alerts")
+    return sent
+
+
+@shared_task
+def publish_listing_event(listing_id, event):
+    """Push a listing's status change to its seller and the users who saved it."""
+    return publish_status_change(listing_id, event)
+
+
+@shared_task
+def archive_deleted_listings():
+    """
+    Move listings deleted more than LISTING_ARCHIVE_AFTER_DAYS ago to the
+    archive in bounded batches, pausing between batches.
+    """
+    started = time.monotonic()
+    before = timezone.now() - timedelta(days=settings.LISTING_ARCHIVE_AFTER_DAYS)
+    archived = batches = 0
+    for count in archive_deleted(before, settings.LISTING_ARCHIVE_BATCH_SIZE):
+        archived += count
+        batches += 1
+        logger.debug(f"archived batch {batches} of {count} deleted listings")
+        time.sleep(settings.LISTING_ARCHIVE_PAUSE_SECONDS)
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"archived {archived} deleted listings in {batches} batches ({elapsed:.2f}s)"
+    )
+    return {"archived": archived, "batches": batches, "seconds": round(elapsed, 3)}
@@ -1,3 +1,1167 @@
-from django.test import TestCase
+import math
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import orjson
+import redis
+from django.contrib.admin.sites import site
+from django.core import mail
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from apps.authentication.models import User
+from apps.listings.admin import ListingAdmin
+from apps.listings.archive import archive_deleted
+from apps.listings.models import (
+    LISTING_CONDITION,
+    ArchivedListing,
+    ArchivedListingImage,
+    Category,
+    Listing,
+    ListingImage,
+    ListingPriceChange,
+    ListingPriceSummary,
+    ListingStats,
+    SavedListing,
+    SavedSearch,
+    SavedSearchMatch,
+    SimilarListing,
+)
+from apps.listings import recommendations
+from apps.listings.prices import record_price_change
+from apps.listings.recommendations import (
+    AFFINITY_KEY,
+    POPULAR_KEY,
+    compute_recommendations,
+    get_recommended_ids,
+)
+from apps.listings.saved_searches import (
+    index_saved_search,
+    matching_searches,
+    send_alerts,
+)
+from apps.listings.serializers import ListingFeedSerializer, ListingReadSerializer
+from apps.listings.similarity import get_similar_ids
+from apps.listings.trending import (
+    PENDING_KEY,
+    TRENDING_KEY,
+    add_views,
+    flush_views,
+    record_view,
+)
+from apps.messaging.conversations import get_or_start_conversation, send_message
+from utils.events import user_channel
+from utils.geo import encode_geohash
+from utils.renderers import ORJSONRenderer
+from utils.testing import use_fake_redis
+
+
+class ListingFeedSerializerTest(APITestCase):
+    def setUp(self):
+        # Detail views are counted in Redis.
+        use_fake_redis(self)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.category = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        for index, condition in enumerate(LISTING_CONDITION.values):
+            listing = Listing.objects.create(
+                title=f"Calculus {index}",
+                description="Thomas' Calculus, 14th edition",
+                price=1500 + index,
+                category=self.category,
+                condition=condition,
+                seller=self.seller,
+                latitude=27.7 + index / 100 if index % 2 else None,
+                longitude=85.3 + index / 100 if index % 2 else None,
+            )
+            for image in range(index % 3):
+                ListingImage.objects.create(
+                    listing=listing, image=f"listing_images/{index}-{image}.jpg"
+                )
+        self.request = APIRequestFactory().get("/api/v1/listings/")
+
+    def get_queryset(self):
+        return (
+            Listing.objects.select_related("seller", "category")
+            .prefetch_related("images")
+            .order_by("-created_at", "id")
+        )
+
+    def test_output_matches_listing_read_serializer(self):
+        """Test the values-based path renders byte-identical JSON"""
+        context = {"request": self.request}
+        expected = ListingReadSerializer(
+            self.get_queryset(), many=True, context=context
+        ).data
+        actual = ListingFeedSerializer(
+            ListingFeedSerializer.get_values_queryset(self.get_queryset()),
+            context=context,
+        ).data
+
+        renderer = ORJSONRenderer()
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+
+    def test_fetches_page_in_two_queries(self):
+        """Test one query for the rows and one for the images"""
+        rows = ListingFeedSerializer.get_values_queryset(self.get_queryset())
+        with self.assertNumQueries(2):
+            ListingFeedSerializer(rows).data
+
+    def test_empty_page(self):
+        """Test an empty page does not query images"""
+        rows = ListingFeedSerializer.get_values_queryset(Listing.objects.none())
+        with self.assertNumQueries(0):
+            self.assertEqual(ListingFeedSerializer(rows).data, [])
+
+    def test_listings_endpoint_uses_feed_output(self):
+        """Test the feed endpoint returns the same listings as the detail serializer"""
+        response = self.client.get(reverse("listings"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()["data"]["results"]
+        self.assertEqual(len(results), len(LISTING_CONDITION.values))
+        detail = self.client.get(
+            reverse("listings-detail", kwargs={"slug": results[0]["slug"]})
+        )
+        self.assertEqual(results[0], detail.json()["data"])
+
+
+class ConditionalRequestTest(APITestCase):
+    def setUp(self):
+        use_fake_redis(self)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.category = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        self.listing = Listing.objects.create(
+            title="Calculus",
+            description="Thomas' Calculus, 14th edition",
+            price=1500,
+            category=self.category,
+            seller=self.seller,
+        )
+        self.detail_url = reverse("listings-detail", kwargs={"slug": self.listing.slug})
+
+    def test_listing_detail_not_modified(self):
+        """Test a matching If-None-Match returns 304 without a body"""
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", response.headers)
+        self.assertIn("Last-Modified", response.headers)
+
+        response = self.client.get(
+            self.detail_url, HTTP_IF_NONE_MATCH=response.headers["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+    def test_listing_detail_if_modified_since(self):
+        """Test If-Modified-Since is honoured"""
+        response = self.client.get(self.detail_url)
+        response = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=response.headers["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_listing_detail_changes_after_update(self):
+        """Test the ETag changes when the listing changes"""
+        etag = self.client.get(self.detail_url).headers["ETag"]
+        self.listing.mark_sold()
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertTrue(response.json()["data"]["is_sold"])
+
+    def test_missing_listing_returns_404(self):
+        """Test unknown listings are not answered with validators"""
+        response = self.client.get(
+            reverse("listings-detail", kwargs={"slug": "missing"}),
+            HTTP_IF_NONE_MATCH='"anything"',
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn("ETag", response.headers)
+
+    def test_categories_not_modified_until_listing_added(self):
+        """Test the category list ETag follows listing counts"""
+        url = reverse("categories")
+        etag = self.client.get(url).headers["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Listing.objects.create(
+            title="Linear Algebra",
+            description="Strang",
+            price=900,
+            category=self.category,
+            seller=self.seller,
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["categories"][0]["listings_count"], 2)
+
+
+class RecommendationTest(APITestCase):
+    def setUp(self):
+        self.redis = use_fake_redis(self)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.users = [
+            User.objects.create_user(
+                email=f"student{index}@swsc.edu.np",
+                first_name="Student",
+                last_name=str(index),
+                password="password123",
+            )
+            for index in range(3)
+        ]
+        self.textbooks = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        self.electronics = Category.objects.create(
+            name="Electronics", description="Calculators and laptops"
+        )
+        self.listings = [
+            Listing.objects.create(
+                title=f"Listing {index}",
+                description="For sale",
+                price=1000 + index,
+                category=self.textbooks if index < 4 else self.electronics,
+                seller=self.seller,
+            )
+            for index in range(5)
+        ]
+        self.url = reverse("recommended-listings")
+
+    def save(self, user, *indexes):
+        for index in indexes:
+            SavedListing.objects.create(user=user, listing=self.listings[index])
+
+    def ids(self, *indexes):
+        return [self.listings[index].id for index in indexes]
+
+    def test_recommends_listings_saved_together(self):
+        """Test listings co-saved with the user's saves rank by similarity"""
+        first, second, third = self.users
+        self.save(first, 0, 1)
+        self.save(second, 0, 1, 2)
+        self.save(third, 0)
+
+        stats = compute_recommendations()
+
+        self.assertEqual(stats, {"users": 3, "listings": 5, "saves": 6})
+        self.assertEqual(get_recommended_ids(third), self.ids(1, 2))
+        self.assertEqual(get_recommended_ids(first), self.ids(2))
+        self.assertEqual(orjson.loads(self.redis.get(POPULAR_KEY)), self.ids(0, 1, 2))
+        self.assertEqual(
+            orjson.loads(self.redis.get(AFFINITY_KEY.format(third.id))),
+            {str(self.textbooks.id): 1.0},
+        )
+
+    def test_excludes_unavailable_and_own_listings(self):
+        """Test sold listings and the user's own listings are not recommended"""
+        first, second, _ = self.users
+        self.listings[2].mark_sold()
+        self.listings[3].seller = first
+        self.listings[3].save()
+        self.save(second, 0, 1, 2, 3)
+        self.save(first, 0)
+
+        compute_recommendations()
+
+        self.assertEqual(get_recommended_ids(first), self.ids(1))
+
+    def test_users_without_saves_get_popular_listings(self):
+        """Test users with no saves fall back to the most saved listings"""
+        first, second, third = self.users
+        self.save(first, 4, 0)
+        self.save(second, 4)
+
+        compute_recommendations()
+
+        self.assertEqual(get_recommended_ids(third), self.ids(4, 0))
+
+    def test_endpoint_returns_recommendations_in_order(self):
+        """Test the endpoint serves cached ids in order, skipping sold listings"""
+        first, second, third = self.users
+        self.save(first, 0, 3, 1)
+        self.save(second, 0, 3)
+        self.save(third, 0)
+        compute_recommendations()
+        self.listings[1].mark_sold()
+
+        self.client.force_authenticate(third)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        listings = response.json()["data"]["listings"]
+        self.assertEqual([listing["id"] for listing in listings], self.ids(3))
+
+    def test_endpoint_falls_back_to_newest_listings(self):
+        """Test the endpoint lists the newest listings before the first run"""
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        listings = response.json()["data"]["listings"]
+        self.assertEqual(
+            [listing["id"] for listing in listings], self.ids(4, 3, 2, 1, 0)
+        )
+
+    def test_endpoint_falls_back_when_redis_is_down(self):
+        self.save(self.users[1], 0)
+        compute_recommendations()
+
+        self.client.force_authenticate(self.users[0])
+        with mock.patch.object(self.redis, "mget", side_effect=redis.ConnectionError):
+            response = self.client.get(self.url)
+
+        listings = response.json()["data"]["listings"]
+        self.assertEqual(
+            [listing["id"] for listing in listings], self.ids(4, 3, 2, 1, 0)
+        )
+
+    def test_endpoint_requires_authentication(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ignores_saves_of_listings_created_meanwhile(self):
+        """Test listings created and saved between the two reads wait a run"""
+        first, second, _ = self.users
+        self.save(first, 0, 1)
+        self.save(second, 0)
+        fetch_array = recommendations._fetch_array
+
+        def create_between_reads(queryset, fields):
+            array = fetch_array(queryset, fields)
+            if queryset.model is Listing:
+                listing = Listing.objects.create(
+                    title="Listing 5",
+                    description="For sale",
+                    price=1005,
+                    category=self.textbooks,
+                    seller=self.seller,
+                )
+                SavedListing.objects.create(user=second, listing=listing)
+            return array
+
+        with mock.patch.object(
+            recommendations, "_fetch_array", side_effect=create_between_reads
+        ):
+            stats = compute_recommendations()
+
+        self.assertEqual(stats, {"users": 2, "listings": 5, "saves": 3})
+        self.assertEqual(get_recommended_ids(second), self.ids(1))
+
+    def test_compute_without_saves(self):
+        stats = compute_recommendations()
+        self.assertEqual(stats, {"users": 0, "listings": 5, "saves": 0})
+        self.assertEqual(get_recommended_ids(self.users[0]), [])
+
+
+class SimilarListingTest(APITestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.textbooks = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        self.electronics = Category.objects.create(
+            name="Electronics", description="Calculators and laptops"
+        )
+
+    def create_listing(self, title, price, category=None):
+        # Neighbours are refreshed once the listing is committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            return Listing.objects.create(
+                title=title,
+                description=f"{title}, barely used",
+                price=price,
+                category=category or self.textbooks,
+                seller=self.seller,
+            )
+
+    def test_ranks_same_category_listings_by_text_and_price(self):
+        """Test neighbours are same-category listings, closest text first"""
+        calculus = self.create_listing("Calculus early transcendentals", 1500)
+        chemistry = self.create_listing("Organic chemistry", 1500)
+        thomas = self.create_listing("Thomas calculus", 1400)
+        calculator = self.create_listing("Calculus calculator", 1500, self.electronics)
+
+        self.assertEqual(get_similar_ids(calculus), [thomas.id, chemistry.id])
+        # Listings created earlier pick up later ones as neighbours.
+        self.assertEqual(get_similar_ids(chemistry), [calculus.id, thomas.id])
+        self.assertEqual(get_similar_ids(calculator), [])
+
+    @override_settings(SIMILAR_LISTINGS_COUNT=1)
+    def test_new_listing_replaces_weaker_neighbours(self):
+        """Test a closer new listing evicts the weakest neighbour"""
+        calculus = self.create_listing("Calculus early transcendentals", 1500)
+        chemistry = self.create_listing("Organic chemistry", 1500)
+        self.assertEqual(get_similar_ids(calculus), [chemistry.id])
+
+        thomas = self.create_listing("Thomas calculus", 1500)
+
+        self.assertEqual(get_similar_ids(calculus), [thomas.id])
+        self.assertEqual(SimilarListing.objects.filter(listing=calculus).count(), 1)
+
+    def test_sold_listing_leaves_neighbour_lists(self):
+        calculus = self.create_listing("Calculus early transcendentals", 1500)
+        thomas = self.create_listing("Thomas calculus", 1400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            thomas.mark_sold()
+
+        self.assertEqual(get_similar_ids(calculus), [])
+        self.assertEqual(get_similar_ids(thomas), [])
+
+    @override_settings(SIMILAR_LISTINGS_COUNT=1)
+    def test_sold_neighbour_is_replaced(self):
+        """Test a listing that loses its neighbour gets the next best one"""
+        calculus = self.create_listing("Calculus early transcendentals", 1500)
+        chemistry = self.create_listing("Organic chemistry", 1500)
+        thomas = self.create_listing("Thomas calculus", 1500)
+        self.assertEqual(get_similar_ids(calculus), [thomas.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            thomas.mark_sold()
+
+        self.assertEqual(get_similar_ids(calculus), [chemistry.id])
+        self.assertEqual(get_similar_ids(chemistry), [calculus.id])
+
+    def test_similar_endpoint(self):
+        """Test the endpoint serves neighbours in order"""
+        calculus = self.create_listing("Calculus early transcendentals", 1500)
+        chemistry = self.create_listing("Organic chemistry", 1500)
+        thomas = self.create_listing("Thomas calculus", 1400)
+
+        response = self.client.get(
+            reverse("similar-listings", kwargs={"slug": calculus.slug})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        listings = response.json()["data"]["listings"]
+        self.assertEqual(
+            [listing["id"] for listing in listings], [thomas.id, chemistry.id]
+        )
+
+    def test_similar_endpoint_unknown_listing(self):
+        response = self.client.get(
+            reverse("similar-listings", kwargs={"slug": "no-such-listing"})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TrendingListingTest(APITestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = use_fake_redis(self, self.server)
+
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.category = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        self.listings = [
+            Listing.objects.create(
+                title=f"Listing {index}",
+                description="For sale",
+                price=1000,
+                category=self.category,
+                seller=self.seller,
+            )
+            for index in range(3)
+        ]
+
+    def view(self, listing, *viewers):
+        for viewer in viewers:
+            record_view(listing.id, viewer)
+
+    def test_retrieve_counts_views_except_the_sellers(self):
+        """Test listing detail views are buffered in Redis, not the database"""
+        listing = self.listings[0]
+        url = reverse("listings-detail", kwargs={"slug": listing.slug})
+
+        self.client.get(url)
+        self.client.force_authenticate(self.seller)
+        self.client.get(url)
+
+        self.assertEqual(self.redis.hget(PENDING_KEY, listing.id), b"1")
+        self.assertFalse(ListingStats.objects.exists())
+
+    def test_views_answered_with_not_modified_are_counted(self):
+        listing = self.listings[0]
+        url = reverse("listings-detail", kwargs={"slug": listing.slug})
+
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.redis.hget(PENDING_KEY, listing.id), b"2")
+
+    def test_first_flush_scores_only_the_views(self):
+        self.view(self.listings[0], "user:1")
+        flush_views()
+
+        stats = ListingStats.objects.get(listing=self.listings[0])
+        self.assertAlmostEqual(
+            stats.trending_score, add_views(-math.inf, 1, stats.last_viewed_at)
+        )
+
+    def test_flush_applies_counts_in_bulk(self):
+        """Test a flush stores views and unique viewers and clears the buffer"""
+        self.view(self.listings[0], "user:1", "user:1", "user:2")
+        self.view(self.listings[1], "user:1")
+
+        self.assertEqual(flush_views(), 2)
+        self.view(self.listings[0], "user:2", "user:3")
+        self.assertEqual(flush_views(), 1)
+
+        stats = ListingStats.objects.get(listing=self.listings[0])
+        self.assertEqual((stats.views, stats.unique_viewers), (5, 3))
+        self.assertEqual(ListingStats.objects.get(listing=self.listings[1]).views, 1)
+        self.assertFalse(self.redis.exists(PENDING_KEY))
+
+    def test_trending_ranks_by_unique_viewers(self):
+        """Test repeat views count less and sold listings drop out"""
+        first, second, third = self.listings
+        self.view(first, "user:1", "user:1", "user:1", "user:1")
+        self.view(second, "user:1", "user:2")
+        self.view(third, "user:1", "user:2", "user:3")
+        third.mark_sold()
+
+        flush_views()
+
+        ranked = [int(i) for i in self.redis.zrevrange(TRENDING_KEY, 0, -1)]
+        self.assertEqual(ranked, [second.id, first.id])
+
+    def test_older_views_decay(self):
+        """Test a view now outweighs three views two half-lives ago"""
+        with self.settings(TRENDING_HALF_LIFE_HOURS=24):
+            now = timezone.now()
+            old = add_views(0.0, 3, now - timedelta(hours=48))
+            recent = add_views(0.0, 1, now)
+            self.assertGreater(recent, old)
+            self.assertAlmostEqual(add_views(old, 1, now), add_views(recent, 0.75, now))
+
+    def test_trending_endpoint(self):
+        """Test the endpoint serves the sorted set, or the database without it"""
+        first, second, _ = self.listings
+        self.view(first, "user:1")
+        self.view(second, "user:1", "user:2")
+        flush_views()
+        url = reverse("trending-listings")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        listings = response.json()["data"]["listings"]
+        self.assertEqual([listing["id"] for listing in listings], [second.id, first.id])
+
+        self.server.connected = False
+        with self.assertLogs("apps.listings.trending", "WARNING"):
+            response = self.client.get(url)
+        listings = response.json()["data"]["listings"]
+        self.assertEqual([listing["id"] for listing in listings], [second.id, first.id])
+
+    def test_views_are_dropped_when_redis_is_down(self):
+        self.server.connected = False
+        url = reverse("listings-detail", kwargs={"slug": self.listings[0].slug})
+        with self.assertLogs("apps.listings.trending", "WARNING"):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class NearListingsTest(APITestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.category = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        # Distances from Thamel: about 1.3 km, 4.2 km, 12.6 km and 141 km.
+        self.places = {
+            "durbar-square": (27.7044, 85.3074),
+            "patan": (27.6796, 85.3247),
+            "bhaktapur": (27.6710, 85.4298),
+            "pokhara": (28.2096, 83.9856),
+        }
+        self.listings = {
+            name: self.create_listing(name, latitude, longitude)
+            for name, (latitude, longitude) in self.places.items()
+        }
+        self.create_listing("nowhere", None, None)
+        self.url = reverse("listings")
+
+    def create_listing(self, title, latitude, longitude):
+        return Listing.objects.create(
+            title=title,
+            description="For sale",
+            price=1000,
+            category=self.category,
+            seller=self.seller,
+            latitude=latitude,
+            longitude=longitude,
+        )
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [listing["title"] for listing in response.json()["data"]["results"]]
+
+    def test_near_filters_by_radius_nearest_first(self):
+        """Test listings within radius_km are returned by distance"""
+        near = "27.7154,85.3123"
+        self.assertEqual(
+            self.titles(self.client.get(self.url, {"near": near, "radius_km": 5})),
+            ["durbar-square", "patan"],
+        )
+        self.assertEqual(
+            self.titles(self.client.get(self.url, {"near": near, "radius_km": 15})),
+            ["durbar-square", "patan", "bhaktapur"],
+        )
+        # Without radius_km, LISTING_NEAR_DEFAULT_RADIUS_KM applies.
+        self.assertEqual(
+            self.titles(self.client.get(self.url, {"near": near})),
+            ["durbar-square"],
+        )
+
+    def test_near_validates_the_point(self):
+        for near in ("27.7", "north,east", "95,85"):
+            response = self.client.get(self.url, {"near": near})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_listing_location_defaults_to_the_sellers(self):
+        """Test new listings without a location take the seller's profile's"""
+        self.seller.email_verified = True
+        self.seller.save()
+        self.seller.profile.latitude, self.seller.profile.longitude = 27.7, 85.3
+        self.seller.profile.save()
+        self.client.force_authenticate(self.seller)
+
+        response = self.client.post(
+            self.url,
+            {
+                "title": "Calculus",
+                "description": "For sale",
+                "price": 1000,
+                "category": self.category.id,
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (response.json()["data"]["latitude"], response.json()["data"]["longitude"]),
+            (27.7, 85.3),
+        )
+        listing = Listing.objects.get(title="Calculus")
+        self.assertEqual(listing.geohash, encode_geohash(27.7, 85.3))
+
+        response = self.client.post(
+            self.url,
+            {
+                "title": "Physics",
+                "description": "For sale",
+                "price": 1000,
+                "category": self.category.id,
+                "latitude": 27.7,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SavedSearchTest(APITestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.buyer = User.objects.create_user(
+            email="buyer@swsc.edu.np",
+            first_name="Jane",
+            last_name="Doe",
+            password="password123",
+            email_verified=True,
+        )
+        self.textbooks = Category.objects.create(
+            name="Textbooks", description="Books for class"
+        )
+        self.electronics = Category.objects.create(
+            name="Electronics", description="Calculators and laptops"
+        )
+
+    def create_search(self, user=None, **fields):
+        search = SavedSearch.objects.create(user=user or self.buyer, **fields)
+        index_saved_search(search)
+        return search
+
+    def create_listing(self, title, price=1500, category=None, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Listing.objects.create(
+                title=title,
+                description="Barely used",
+                price=price,
+                category=category or self.textbooks,
+                seller=self.seller,
+                **fields,
+            )
+
+    def test_matches_keywords_category_price_and_condition(self):
+        """Test a listing matches searches whose every criterion it meets"""
+        keywords = self.create_search(keywords="Calculus textbook", max_price=2000)
+        category = self.create_search(category=self.textbooks)
+        condition = self.create_search(condition=LISTING_CONDITION.BRAND_NEW)
+        self.create_search(keywords="calculus", category=self.electronics)
+        self.create_search(keywords="physics")
+        self.create_search(min_price=2000)
+        self.create_search(user=self.seller)
+
+        listing = Listing(
+            title="Thomas' Calculus",
+            description="The textbook for MATH 101",
+            price=1500,
+            category=self.textbooks,
+            seller=self.seller,
+        )
+
+        self.assertCountEqual(matching_searches(listing), [keywords, category])
+        listing.condition = LISTING_CONDITION.BRAND_NEW
+        self.assertCountEqual(
+            matching_searches(listing), [keywords, category, condition]
+        )
+
+    def test_new_and_reactivated_listings_are_matched_once(self):
+        """Test matching runs on create and reactivation without duplicates"""
+        search = self.create_search(keywords="calculus")
+
+        listing = self.create_listing("Calculus")
+        self.create_listing("Chemistry")
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.mark_inactive()
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.mark_active()
+
+        self.assertQuerySetEqual(
+            SavedSearchMatch.objects.values_list("saved_search", "listing"),
+            [(search.id, listing.id)],
+        )
+
+    def test_alerts_are_batched_per_user(self):
+        """Test each user gets one email of their pending matches"""
+        self.create_search(keywords="calculus")
+        self.create_search(keywords="textbook")
+        self.create_listing("Calculus textbook")
+        self.create_listing("Physics textbook")
+        sold = self.create_listing("Chemistry textbook")
+        sold.mark_sold()
+
+        self.assertEqual(send_alerts(), 1)
+        self.assertEqual(send_alerts(), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.buyer.email])
+        self.assertEqual(
+            mail.outbox[0].subject, "2 new listings match your saved searches"
+        )
+        self.assertIn("Calculus textbook", mail.outbox[0].body)
+        self.assertNotIn("Chemistry", mail.outbox[0].body)
+        self.assertFalse(SavedSearchMatch.objects.filter(notified_at=None).exists())
+
+    def test_saved_search_endpoints(self):
+        """Test creating, updating and deleting saved searches"""
+        self.client.force_authenticate(self.buyer)
+        url = reverse("saved-searches")
+
+        response = self.client.post(
+            url, {"keywords": "Calculus, textbook", "max_price": 2000}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        search = SavedSearch.objects.get(id=response.json()["data"]["id"])
+        self.assertCountEqual(
+            search.terms.values_list("term", flat=True), ["calculus", "textbook"]
+        )
+
+        detail_url = reverse("saved-searches-detail", kwargs={"pk": search.id})
+        response = self.client.patch(detail_url, {"keywords": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(search.terms.values_list("term", flat=True)), [""])
+
+        response = self.client.patch(detail_url, {"min_price": 3000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Would be left without a keyword and match every listing.
+        response = self.client.patch(detail_url, {"keywords": "a" * 65})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(search.terms.values_list("term", flat=True)), [""])
+
+        self.assertEqual(len(self.client.get(url).json()["data"]["saved_searches"]), 1)
+        response = self.client.delete(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(SavedSearch.objects.exists())
+
+    @override_settings(SAVED_SEARCH_MAX_PER_USER=1)
+    def test_saved_search_limit(self):
+        self.create_search(keywords="calculus")
+        self.client.force_authenticate(self.buyer)
+        response = self.client.post(reverse("saved-searches"), {"keywords": "physics"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListingEventsTest(APITestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        use_fake_redis(self, self.server)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.saver = User.objects.create_user(
+            email="saver@swsc.edu.np", first_name="Jane", last_name="Doe"
+        )
+        self.stranger = User.objects.create_user(
+            email="stranger@swsc.edu.np", first_name="Jim", last_name="Doe"
+        )
+        category = Category.objects.create(name="Books", description="Books")
+        self.listing = Listing.objects.create(
+            title="Calculus",
+            description="Barely used",
+            price=1500,
+            category=category,
+            seller=self.seller,
+        )
+        SavedListing.objects.create(user=self.saver, listing=self.listing)
+        self.pubsub = fakeredis.FakeRedis(server=self.server).pubsub()
+        self.pubsub.subscribe(
+            *(
+                user_channel(user.pk)
+                for user in (self.seller, self.saver, self.stranger)
+            )
+        )
+
+    def received(self):
+        """Return the (channel, listing event) pairs published since the last call."""
+        events = []
+        while message := self.pubsub.get_message(timeout=0.01):
+            if message["type"] == "message":
+                payload = orjson.loads(message["data"])
+                if payload["event"].startswith("listing."):
+                    events.append((message["channel"].decode(), payload["event"]))
+        return events
+
+    def test_pushes_status_changes_to_the_seller_and_savers(self):
+        """Test sold and deactivated listings are pushed to who saved or owns them"""
+        expected = [self.seller, self.saver]
+        for change, event in (
+            (self.listing.mark_inactive, "listing.deactivated"),
+            (self.listing.mark_active, "listing.reactivated"),
+            (self.listing.mark_sold, "listing.sold"),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertCountEqual(
+                self.received(), [(user_channel(user.pk), event) for user in expected]
+            )
+
+    def test_pushes_deletions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.mark_deleted()
+
+        self.assertCountEqual(
+            self.received(),
+            [
+                (user_channel(self.seller.pk), "listing.deleted"),
+                (user_channel(self.saver.pk), "listing.deleted"),
+            ],
+        )
+
+    def test_other_changes_are_not_pushed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.title = "Calculus, 10th edition"
+            self.listing.save(update_fields=["title", "updated_at"])
+
+        self.assertEqual(self.received(), [])
+
+    def test_pushes_price_drops(self):
+        for price, expected in ((1200, [self.seller, self.saver]), (1300, [])):
+            with self.captureOnCommitCallbacks(execute=True):
+                old_price, self.listing.price = self.listing.price, price
+                self.listing.save(update_fields=["price", "updated_at"])
+                record_price_change(self.listing, old_price)
+
+            self.assertCountEqual(
+                self.received(),
+                [(user_channel(user.pk), "listing.price_dropped") for user in expected],
+            )
+
+
+class ListingPriceHistoryTest(APITestCase):
+    def setUp(self):
+        use_fake_redis(self)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            email_verified=True,
+        )
+        category = Category.objects.create(name="Books", description="Books")
+        self.listing = Listing.objects.create(
+            title="Calculus",
+            description="Barely used",
+            price=1500,
+            category=category,
+            seller=self.seller,
+        )
+        self.detail_url = reverse("listings-detail", kwargs={"slug": self.listing.slug})
+        self.prices_url = reverse("listing-prices", kwargs={"slug": self.listing.slug})
+
+    def update(self, data):
+        self.client.force_authenticate(self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(self.detail_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logs_only_actual_price_changes(self):
+        self.update({"title": "Thomas' Calculus"})
+        self.update({"price": 1500})
+        self.assertFalse(ListingPriceChange.objects.exists())
+
+        self.update({"price": 1200})
+        self.update({"price": 1800})
+        self.update({"price": 1400, "title": "Calculus"})
+
+        self.assertEqual(
+            list(
+                ListingPriceChange.objects.order_by("id").values_list(
+                    "old_price", "new_price"
+                )
+            ),
+            [(1500, 1200), (1200, 1800), (1800, 1400)],
+        )
+        summary = ListingPriceSummary.objects.get(listing=self.listing)
+        self.assertEqual(
+            (
+                summary.initial_price,
+                summary.min_price,
+                summary.max_price,
+                summary.previous_price,
+                summary.last_price,
+                summary.change_count,
+            ),
+            (1500, 1200, 1800, 1800, 1400, 3),
+        )
+
+    def test_admin_logs_the_price_it_replaces(self):
+        listing = Listing.objects.get(pk=self.listing.pk)
+        # Changed by someone else after the admin form was opened.
+        self.update({"price": 1200})
+        listing.price = 1000
+
+        ListingAdmin(Listing, site).save_model(None, listing, None, change=True)
+
+        change = ListingPriceChange.objects.latest("id")
+        self.assertEqual((change.old_price, change.new_price), (1200, 1000))
+        summary = ListingPriceSummary.objects.get(listing=self.listing)
+        self.assertEqual(
+            (summary.initial_price, summary.max_price, summary.change_count),
+            (1500, 1500, 2),
+        )
+
+    def test_price_history(self):
+        response = self.client.get(self.prices_url)
+        data = response.json()["data"]
+        self.assertEqual(
+            (data["min_price"], data["max_price"], data["change_count"]),
+            (1500, 1500, 0),
+        )
+        self.assertEqual(data["changes"], [])
+
+        self.update({"price": 1200})
+        self.update({"price": 1000})
+
+        # The summary and the latest changes, without scanning the history.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.prices_url)
+        data = response.json()["data"]
+        self.assertEqual(
+            (data["initial_price"], data["previous_price"], data["last_price"]),
+            (1500, 1200, 1000),
+        )
+        self.assertEqual(
+            [(change["old_price"], change["new_price"]) for change in data["changes"]],
+            [(1200, 1000), (1500, 1200)],
+        )
+
+
+class ListingSoftDeleteTest(APITestCase):
+    def setUp(self):
+        use_fake_redis(self)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            email_verified=True,
+        )
+        self.saver = User.objects.create_user(
+            email="saver@swsc.edu.np",
+            first_name="Jane",
+            last_name="Doe",
+            email_verified=True,
+        )
+        category = Category.objects.create(name="Books", description="Books")
+        self.listing = Listing.objects.create(
+            title="Calculus",
+            description="Barely used",
+            price=1500,
+            category=category,
+            seller=self.seller,
+        )
+        ListingImage.objects.create(
+            listing=self.listing, image="listing_images/calculus.jpg"
+        )
+        SavedListing.objects.create(user=self.saver, listing=self.listing)
+
+    def delete_listing(self):
+        self.client.force_authenticate(self.seller)
+        url = reverse("listings-detail", kwargs={"slug": self.listing.slug})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_deleted_listings_are_hidden_but_kept(self):
+        self.delete_listing()
+
+        self.assertFalse(Listing.objects.exists())
+        listing = Listing.all_objects.get(id=self.listing.id)
+        self.assertIsNotNone(listing.deleted_at)
+        self.assertEqual(listing.images.count(), 1)
+        self.assertTrue(SavedListing.objects.filter(listing=listing).exists())
+
+        detail_url = reverse("listings-detail", kwargs={"slug": listing.slug})
+        self.assertEqual(
+            self.client.get(detail_url).status_code, status.HTTP_404_NOT_FOUND
+        )
+        self.client.force_authenticate(self.saver)
+        response = self.client.get(reverse("saved-listings"))
+        self.assertEqual(response.json()["data"]["saved_listings"], [])
+
+    def test_slugs_of_deleted_listings_are_not_reused(self):
+        self.delete_listing()
+
+        listing = Listing.objects.create(
+            title="Calculus",
+            description="Barely used",
+            price=1500,
+            category=self.listing.category,
+            seller=self.seller,
+        )
+        self.assertNotEqual(listing.slug, self.listing.slug)
+
+    def test_archives_listings_deleted_long_enough_ago(self):
+        self.delete_listing()
+        recent = Listing.objects.create(
+            title="Physics",
+            description="Barely used",
+            price=1500,
+            category=self.listing.category,
+            seller=self.seller,
+        )
+        recent.mark_deleted()
+        Listing.all_objects.filter(id=self.listing.id).update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        )
+
+        counts = list(archive_deleted(timezone.now() - timedelta(days=30)))
+
+        self.assertEqual(counts, [1])
+        self.assertEqual(
+            list(Listing.all_objects.values_list("id", flat=True)), [recent.id]
+        )
+        archived = ArchivedListing.objects.get()
+        self.assertEqual(
+            (archived.id, archived.slug, archived.seller_id),
+            (self.listing.id, self.listing.slug, self.seller.id),
+        )
+        self.assertEqual(
+            ArchivedListingImage.objects.get().image.name,
+            "listing_images/calculus.jpg",
+        )
+
+    def test_archiving_keeps_history_and_conversations(self):
+        conversation = get_or_start_conversation(self.listing, self.saver)
+        send_message(conversation, self.saver, "Is it still available?")
+        old_price, self.listing.price = self.listing.price, 1200
+        self.listing.save(update_fields=["price", "updated_at"])
+        record_price_change(self.listing, old_price)
+        ListingStats.objects.create(listing=self.listing, views=3)
+        self.delete_listing()
+
+        self.assertEqual(list(archive_deleted(timezone.now())), [1])
+
+        listing_id = self.listing.id
+        self.assertTrue(ArchivedListing.objects.filter(id=listing_id).exists())
+        self.assertTrue(SavedListing.objects.filter(listing_id=listing_id).exists())
+        self.assertTrue(ListingStats.objects.filter(listing_id=listing_id).exists())
+        self.assertTrue(
+            ListingPriceChange.objects.filter(listing_id=listing_id).exists()
+        )
+        self.assertTrue(
+            ListingPriceSummary.objects.filter(listing_id=listing_id).exists()
+        )
+        conversation.refresh_from_db()
+        self.assertIsNone(conversation.listing_id)
+        self.assertEqual(conversation.messages.count(), 1)
+
+        # Their saved listings and inbox skip what was archived.
+        self.client.force_authenticate(self.saver)
+        response = self.client.get(reverse("saved-listings"))
+        self.assertEqual(response.json()["data"]["saved_listings"], [])
+        response = self.client.get(reverse("conversations"))
+        self.assertIsNone(response.json()["data"]["conversations"][0]["listing"])
+
+    def test_archives_in_batches(self):
+        for index in range(4):
+            Listing.objects.create(
+                title=f"Calculus {index}",
+                description="Barely used",
+                price=1500,
+                category=self.listing.category,
+                seller=self.seller,
+            ).mark_deleted()
+
+        counts = list(archive_deleted(timezone.now(), batch_size=2))
+
+        self.assertEqual(counts, [2, 2])
+        self.assertEqual(ArchivedListing.objects.count(), 4)
+        self.assertEqual(Listing.all_objects.count(), 1)
@@ -0,0 +1,181 @@
+"""
+Listing view counts and the trending feed.
+
+Views are counted in Redis rather than the database, so a popular listing
+doesn't turn into a hot row: `record_view()` increments the listing's count
+in a hash of pending views and adds the viewer to the listing's HyperLogLog
+of unique viewers. `flush_views()` runs every minute and applies the pending
+counts to ListingStats in bulk.
+
+A listing's trending score adds up its views, each weighted
+2 ** (-age / half-life). Stored as is it would have to be decayed
+continuously; instead the score stores the log2 of the weights scaled to a
+fixed epoch, log2(sum(weight * 2 ** ((viewed_at - EPOCH) / half-life))).
+That ranks listings exactly like the decayed sum at any point in time, never
+changes without new views, and grows by about one per half-life since the
+epoch, so it stays small. The top listings are copied into a sorted set
+after every flush, so serving the trending feed is one ZREVRANGE.
+"""
+
+import logging
+import math
+import uuid
+
+import numpy as np
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.listings.models import Listing, ListingStats
+from utils.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "listings:views:pending"
+FLUSHING_KEY = "listings:views:flushing"
+FLUSH_LOCK_KEY = "listings:views:flush-lock"
+VIEWERS_KEY = "listings:viewers:{}"
+TRENDING_KEY = "listings:trending"
+
+# 2026-01-01T00:00:00Z
+EPOCH = 1_767_225_600
+_FLUSH_LOCK_TIMEOUT = 5 * 60
+_BATCH_SIZE = 1000
+
+
+def viewer_id(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def record_view(listing_id, viewer):
+    """Count a view of `listing_id`; never fails the request on Redis errors."""
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(PENDING_KEY, listing_id, 1)
+        pipe.pfadd(VIEWERS_KEY.format(listing_id), viewer)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning(
+            f"could not record a view of listing {listing_id}", exc_info=True
+        )
+
+
+def add_views(score, weight, viewed_at):
+    """Return trending `score` with `weight` views at `viewed_at` added."""
+    if weight <= 0:
+        return score
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 60 * 60
+    exponent = (viewed_at.timestamp() - EPOCH) / half_life
+    return float(np.logaddexp2(score, math.log2(weight) + exponent))
+
+
+def flush_views():
+    """Apply pending view counts to ListingStats; returns listings updated."""
+    client = get_redis()
+    token = uuid.uuid4().hex
+    if not client.set(FLUSH_LOCK_KEY, token, nx=True, ex=_FLUSH_LOCK_TIMEOUT):
+        logger.info("another flush of listing views is running")
+        return 0
+    try:
+        # A leftover FLUSHING_KEY is a flush that failed; apply it first.
+        if not client.exists(FLUSHING_KEY):
+            try:
+                client.rename(PENDING_KEY, FLUSHING_KEY)
+            except redis.ResponseError:
+                pass  # no views since the last flush
+        counts = {
+            int(listing_id): int(views)
+            for listing_id, views in client.hgetall(FLUSHING_KEY).items()
+        }
+        if counts:
+            pipe = client.pipeline(transaction=False)
+            for listing_id in counts:
+                pipe.pfcount(VIEWERS_KEY.format(listing_id))
+            unique_viewers = dict(zip(counts, pipe.execute()))
+            _apply_views(counts, unique_viewers)
+            client.delete(FLUSHING_KEY)
+        refresh_trending()
+    finally:
+        if client.get(FLUSH_LOCK_KEY) == token.encode():
+            client.delete(FLUSH_LOCK_KEY)
+    return len(counts)
+
+
+def _apply_views(counts, unique_viewers):
+    now = timezone.now()
+    repeat_weight = settings.TRENDING_REPEAT_VIEW_WEIGHT
+    with transaction.atomic():
+        existing = ListingStats.objects.select_for_update().in_bulk(list(counts))
+        # Skip listings deleted since they were viewed.
+        listing_ids = Listing.objects.filter(id__in=counts).values_list("id", flat=True)
+        created, updated = [], []
+        for listing_id in listing_ids:
+            stats = existing.get(listing_id)
+            if stats is None:
+                # No views yet: the log of an empty sum.
+                stats = ListingStats(listing_id=listing_id, trending_score=-math.inf)
+                created.append(stats)
+            else:
+                updated.append(stats)
+            views = counts[listing_id]
+            new_viewers = max(unique_viewers[listing_id] - stats.unique_viewers, 0)
+            repeat_views = max(views - new_viewers, 0)
+            stats.trending_score = add_views(
+                stats.trending_score, new_viewers + repeat_weight * repeat_views, now
+            )
+            stats.views += views
+            stats.unique_viewers += new_viewers
+            stats.last_viewed_at = now
+            stats.updated_at = now
+
+        ListingStats.objects.bulk_create(created, batch_size=_BATCH_SIZE)
+        ListingStats.objects.bulk_update(
+            updated,
+            [
+                "views",
+                "unique_viewers",
+                "trending_score",
+                "last_viewed_at",
+                "updated_at",
+            ],
+            batch_size=_BATCH_SIZE,
+        )
+
+
+def trending_queryset():
+    return ListingStats.objects.filter(
+        listing__is_active=True,
+        listing__is_sold=False,
+        listing__deleted_at__isnull=True,
+    ).order_by("-trending_score")
+
+
+def refresh_trending():
+    """Replace the trending sorted set with the current top listings."""
+    rows = list(
+        trending_queryset().values_list("listing_id", "trending_score")[
+            : settings.TRENDING_SIZE
+        ]
+    )
+    # MULTI/EXEC, so readers never see the set empty.
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.delete(TRENDING_KEY)
+    if rows:
+        pipe.zadd(TRENDING_KEY, dict(rows))
+    pipe.execute()
+
+
+def get_trending_ids(limit):
+    """Return the ids of the top `limit` trending listings, best first."""
+    try:
+        ids = [int(i) for i in get_redis().zrevrange(TRENDING_KEY, 0, limit - 1)]
+    except redis.RedisError:
+        logger.warning("could not read trending listings", exc_info=True)
+        ids = []
+    if ids:
+        return ids
+    # Redis is down or was emptied; the same ranking comes from the index.
+    return list(trending_queryset().values_list("listing_id", flat=True)[:limit])
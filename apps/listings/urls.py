@@ -4,7 +4,10 @@ from apps.listings.views import (
     CategoryView,
     ListingView,
     MyListingsView,
+    RecommendedListingsView,
+    TrendingListingsView,
     SavedListingsView,
+    SavedSearchView,
 )
 
 urlpatterns = [
@@ -26,6 +29,34 @@ urlpatterns = [
         SavedListingsView.as_view({"get": "list", "post": "create"}),
         name="saved-listings",
     ),
+    path(
+        "recommended/",
+        RecommendedListingsView.as_view(),
+        name="recommended-listings",
+    ),
+    path(
+        "@me/searches/",
+        SavedSearchView.as_view({"get": "list", "post": "create"}),
+        name="saved-searches",
+    ),
+    path(
+        "@me/searches/<int:pk>/",
+        SavedSearchView.as_view(
+            {"get": "retrieve", "patch": "update", "delete": "destroy"}
+        ),
+        name="saved-searches-detail",
+    ),
+    path("trending/", TrendingListingsView.as_view(), name="trending-listings"),
+    path(
+        "<slug:slug>/similar/",
+        ListingView.as_view({"get": "similar"}),
+        name="similar-listings",
+    ),
+    path(
+        "<slug:slug>/prices/",
+        ListingView.as_view({"get": "prices"}),
+        name="listing-prices",
+    ),
     path(
         "<slug:slug>/",
         ListingView.as_view({"get": "retrieve", "delete": "destroy", "put": "update"}),
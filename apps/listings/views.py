@@ -1,30 +1,86 @@
-from django.db.models import Count, Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.shortcuts import get_object_or_404
 from django_filters import rest_framework as filters
 from rest_framework import permissions, status
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import GenericAPIView
-from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.viewsets import ViewSet
 
 from apps.listings.filters import ListingFilter
-from apps.listings.models import Category, Listing, SavedListing
+from apps.listings.models import Category, Listing, SavedListing, SavedSearch
 from apps.listings.paginations import ListingPageNumberPagination
+from apps.listings.prices import price_summary
+from apps.listings.recommendations import get_recommended_ids
+from apps.listings.similarity import get_similar_ids
+from apps.listings.trending import get_trending_ids, record_view, viewer_id
 from apps.listings.serializers import (
     CategoryReadSerializer,
+    ListingFeedSerializer,
+    ListingPriceChangeSerializer,
     ListingReadSerializer,
     ListingWriteSerializer,
     SavedListingReadSerializer,
     SavedListingWriteSerializer,
+    SavedSearchSerializer,
 )
 from apps.permissions import IsEmailVerified, IsListingOwner
+from utils.conditional import conditional, make_etag, memoize_on_request
 from utils.envelope import Envelope
+from utils.parsers import ORJSONParser
+
+
+def categories_etag(request):
+    """Categories change when a category or any listing's category/count changes."""
+    categories = Category.objects.aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    listings = Listing.objects.aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    return make_etag(categories, listings)
+
+
+@memoize_on_request
+def listing_version(request, slug):
+    """Return the row of an active listing its validators are built from."""
+    return (
+        Listing.objects.filter(slug=slug, is_active=True)
+        .annotate(images_count=Count("images"), last_image_id=Max("images__id"))
+        .values_list(
+            "id",
+            "seller_id",
+            "updated_at",
+            "images_count",
+            "last_image_id",
+            "seller__email",
+            "seller__first_name",
+            "seller__last_name",
+            "category__updated_at",
+        )
+        .first()
+    )
+
+
+def listing_etag(request, slug):
+    row = listing_version(request, slug)
+    return None if row is None else make_etag(request.get_host(), row)
+
+
+def listing_last_modified(request, slug):
+    row = listing_version(request, slug)
+    return None if row is None else max(row[2], row[-1])
 
 
 class CategoryView(GenericAPIView):
+    @conditional(etag_func=categories_etag)
     def get(self, request):
         categories = Category.objects.annotate(
-            listings_count=Count("listings")
+            listings_count=Count(
+                "listings", filter=Q(listings__deleted_at__isnull=True)
+            )
         ).order_by("name")
         serializer = CategoryReadSerializer(categories, many=True)
         return Envelope.success_response(
@@ -34,7 +90,7 @@ class CategoryView(GenericAPIView):
 
 class ListingView(ViewSet):
     lookup_field = "slug"
-    parser_classes = [JSONParser, FormParser, MultiPartParser]
+    parser_classes = [ORJSONParser, FormParser, MultiPartParser]
     filterset_class = ListingFilter
     filter_backends = [filters.DjangoFilterBackend, OrderingFilter]
     ordering_fields = ["price", "created_at"]
@@ -53,10 +109,11 @@ class ListingView(ViewSet):
             queryset = backend().filter_queryset(self.request, queryset, self)
         return queryset
 
-    def get_object(self):
-        obj = get_object_or_404(
-            self.get_queryset(), slug=self.kwargs.get("slug"), is_active=True
-        )
+    def get_object(self, lock=False):
+        queryset = self.get_queryset()
+        if lock:
+            queryset = queryset.select_for_update(of=("self",))
+        obj = get_object_or_404(queryset, slug=self.kwargs.get("slug"), is_active=True)
         self.check_object_permissions(self.request, obj)
         return obj
 
@@ -77,17 +134,57 @@ class ListingView(ViewSet):
 
     def list(self, request):
         queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginator.paginate_queryset(queryset, self.request, self)
-        serializer = ListingReadSerializer(
-            page, many=True, context={"request": request}
+        page = self.paginator.paginate_queryset(
+            ListingFeedSerializer.get_values_queryset(queryset), self.request, self
         )
+        serializer = ListingFeedSerializer(page, context={"request": request})
         return self.paginator.get_paginated_response(serializer.data)
 
     def retrieve(self, request, slug):
+        # Counted before the conditional check, so views answered with a 304
+        # count too. The row is reused by the validators.
+        row = listing_version(request, slug)
+        if row is not None and row[1] != request.user.pk:
+            record_view(row[0], viewer_id(request))
+        return self.retrieve_listing(request, slug)
+
+    @conditional(etag_func=listing_etag, last_modified_func=listing_last_modified)
+    def retrieve_listing(self, request, slug):
         listing = get_object_or_404(self.get_queryset(), slug=slug, is_active=True)
         serializer = ListingReadSerializer(listing, context={"request": request})
         return Envelope.success_response(data=serializer.data)
 
+    def similar(self, request, slug):
+        """Precomputed listings like this one, most similar first"""
+        listing = get_object_or_404(
+            Listing.objects.filter(is_active=True).only("id"), slug=slug
+        )
+        ids = get_similar_ids(listing)
+        rows = ListingFeedSerializer.get_values_queryset(
+            Listing.objects.filter(id__in=ids, is_active=True, is_sold=False)
+        )
+        position = {listing_id: index for index, listing_id in enumerate(ids)}
+        rows = sorted(rows, key=lambda row: position[row["id"]])
+        listings = ListingFeedSerializer(rows, context={"request": request}).data
+        return Envelope.success_response(
+            data={"count": len(listings), "listings": listings}
+        )
+
+    def prices(self, request, slug):
+        """The listing's price summary and its latest price changes"""
+        listing = get_object_or_404(
+            Listing.objects.filter(is_active=True).only("id", "price"), slug=slug
+        )
+        changes = listing.price_changes.order_by("-id")[
+            : settings.LISTING_PRICE_HISTORY_SIZE
+        ]
+        return Envelope.success_response(
+            data={
+                **price_summary(listing),
+                "changes": ListingPriceChangeSerializer(changes, many=True).data,
+            }
+        )
+
     def create(self, request):
         serializer = ListingWriteSerializer(
             data=request.data, context={"request": request}
@@ -101,13 +198,15 @@ class ListingView(ViewSet):
 
     def destroy(self, request, slug):
         obj = self.get_object()
-        obj.delete()
+        obj.mark_deleted()
         return Envelope.success_response(
             data=None, status_code=status.HTTP_204_NO_CONTENT
         )
 
+    @transaction.atomic
     def update(self, request, slug):
-        listing = self.get_object()
+        # Locked until committed, so the price the update replaces is current.
+        listing = self.get_object(lock=True)
         serializer = ListingWriteSerializer(
             listing, data=request.data, partial=True, context={"request": request}
         )
@@ -162,11 +261,60 @@ class MyListingsView(ListingView):
         return Envelope.success_response(data=stats)
 
 
+class RecommendedListingsView(GenericAPIView):
+    """Listings recommended to the user, precomputed from saved listings."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        limit = settings.RECOMMENDATIONS_PER_USER
+        queryset = Listing.objects.filter(is_active=True, is_sold=False).exclude(
+            seller=request.user
+        )
+        ids = get_recommended_ids(request.user)
+        if ids:
+            rows = ListingFeedSerializer.get_values_queryset(
+                queryset.filter(id__in=ids)
+            )
+            # Listings sold or deactivated since the last run drop out here.
+            position = {listing_id: index for index, listing_id in enumerate(ids)}
+            rows = sorted(rows, key=lambda row: position[row["id"]])
+        else:
+            # Nothing computed yet: fall back to the newest listings.
+            rows = ListingFeedSerializer.get_values_queryset(
+                queryset.order_by("-created_at")[:limit]
+            )
+        listings = ListingFeedSerializer(rows, context={"request": request}).data
+        return Envelope.success_response(
+            data={"count": len(listings), "listings": listings}
+        )
+
+
+class TrendingListingsView(GenericAPIView):
+    """Listings ranked by time-decayed views, see apps.listings.trending."""
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        ids = get_trending_ids(settings.TRENDING_SIZE)
+        rows = ListingFeedSerializer.get_values_queryset(
+            Listing.objects.filter(id__in=ids, is_active=True, is_sold=False)
+        )
+        position = {listing_id: index for index, listing_id in enumerate(ids)}
+        rows = sorted(rows, key=lambda row: position[row["id"]])
+        listings = ListingFeedSerializer(rows, context={"request": request}).data
+        return Envelope.success_response(
+            data={"count": len(listings), "listings": listings}
+        )
+
+
 class SavedListingsView(ViewSet):
     permission_classes = [permissions.IsAuthenticated, IsEmailVerified]
 
     def get_queryset(self):
-        return SavedListing.objects.filter(user=self.request.user)
+        return SavedListing.objects.filter(
+            user=self.request.user, listing__deleted_at__isnull=True
+        )
 
     def list(self, request):
         serializer = SavedListingReadSerializer(
@@ -191,3 +339,62 @@ class SavedListingsView(ViewSet):
         return Envelope.error_response(
             error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
         )
+
+
+class SavedSearchView(ViewSet):
+    """A user's saved searches; new listings matching them are emailed."""
+
+    permission_classes = [permissions.IsAuthenticated, IsEmailVerified]
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user).order_by(
+            "-created_at"
+        )
+
+    def get_object(self):
+        return get_object_or_404(self.get_queryset(), pk=self.kwargs.get("pk"))
+
+    def list(self, request):
+        serializer = SavedSearchSerializer(self.get_queryset(), many=True)
+        return Envelope.success_response(data={"saved_searches": serializer.data})
+
+    def create(self, request):
+        if self.get_queryset().count() >= settings.SAVED_SEARCH_MAX_PER_USER:
+            return Envelope.error_response(
+                error={
+                    "detail": f"You can save at most "
+                    f"{settings.SAVED_SEARCH_MAX_PER_USER} searches."
+                },
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = SavedSearchSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(user=request.user)
+            return Envelope.success_response(
+                data=serializer.data, status_code=status.HTTP_201_CREATED
+            )
+        return Envelope.error_response(
+            error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    def retrieve(self, request, pk):
+        return Envelope.success_response(
+            data=SavedSearchSerializer(self.get_object()).data
+        )
+
+    def update(self, request, pk):
+        serializer = SavedSearchSerializer(
+            self.get_object(), data=request.data, partial=True
+        )
+        if serializer.is_valid():
+            serializer.save()
+            return Envelope.success_response(data=serializer.data)
+        return Envelope.error_response(
+            error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    def destroy(self, request, pk):
+        self.get_object().delete()
+        return Envelope.success_response(
+            data=None, status_code=status.HTTP_204_NO_CONTENT
+        )
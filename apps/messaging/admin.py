@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from apps.messaging.models import Conversation, Message
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ["listing", "buyer", "seller", "created_at"]
+    raw_id_fields = ["listing", "buyer", "seller"]
+
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_display = ["conversation", "sender", "created_at"]
+    raw_id_fields = ["conversation", "sender"]
+
+    def has_change_permission(self, request, obj=None):
+        # Messages are append-only.
+        return False
@@ -0,0 +1,142 @@
+"""
+Buyer-seller conversations.
+
+Sending a message is one INSERT into the append-only message table and one
+UPDATE of the conversation's two participant rows, which carry each side's
+inbox state: the last message, and for the recipient an unread count bumped
+in place, so the inbox never counts messages. Reading a page of messages is a
+range scan of the (conversation, id) index from a keyset cursor.
+
+New messages are pushed to the recipient's event stream once committed; see
+utils.events.
+"""
+
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveBigIntegerField, Q, Value, When
+from django.utils import timezone
+
+from apps.messaging.models import Conversation, Message, Participant
+from utils.events import publish
+
+MESSAGE_NEW = "message.new"
+_PREVIEW_LENGTH = Participant._meta.get_field("last_message_preview").max_length
+
+
+def preview(body):
+    body = " ".join(body.split())
+    if len(body) <= _PREVIEW_LENGTH:
+        return body
+    return body[: _PREVIEW_LENGTH - 1] + "…"
+
+
+def message_data(message):
+    return {
+        "id": message.id,
+        "conversation": message.conversation_id,
+        "sender": message.sender_id,
+        "body": message.body,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def get_or_start_conversation(listing, buyer):
+    """Return the conversation of `buyer` with the seller of `listing`."""
+    conversation = Conversation.objects.filter(listing=listing, buyer=buyer).first()
+    if conversation is not None:
+        return conversation
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(
+                listing=listing, buyer=buyer, seller_id=listing.seller_id
+            )
+            now = timezone.now()
+            Participant.objects.bulk_create(
+                Participant(
+                    conversation=conversation, user_id=user_id, last_message_at=now
+                )
+                for user_id in (buyer.pk, listing.seller_id)
+            )
+    except IntegrityError:
+        # Started by a concurrent request.
+        return Conversation.objects.get(listing=listing, buyer=buyer)
+    return conversation
+
+
+def recipient_id(conversation, sender_id):
+    if sender_id == conversation.buyer_id:
+        return conversation.seller_id
+    return conversation.buyer_id
+
+
+def send_message(conversation, sender, body):
+    """Append a message to `conversation` and update both inboxes."""
+    with transaction.atomic():
+        message = Message.objects.create(
+            conversation=conversation, sender=sender, body=body
+        )
+        # Sending a message reads the conversation up to it.
+        Participant.objects.filter(conversation=conversation).update(
+            last_message_id=message.id,
+            last_message_preview=preview(body),
+            last_message_at=message.created_at,
+            unread_count=Case(When(user=sender, then=0), default=F("unread_count") + 1),
+            last_read_message_id=Case(
+                When(user=sender, then=Value(message.id)),
+                default=F("last_read_message_id"),
+                output_field=PositiveBigIntegerField(),
+            ),
+        )
+        transaction.on_commit(
+            partial(
+                publish,
+                [recipient_id(conversation, sender.pk)],
+                MESSAGE_NEW,
+                message_data(message),
+            )
+        )
+    return message
+
+
+def mark_read(participant):
+    """Mark the whole conversation read for `participant`."""
+    # F() reads the row as locked by the UPDATE, so a message sent meanwhile
+    # is either counted as read or left unread, never lost.
+    Participant.objects.filter(pk=participant.pk).update(
+        unread_count=0, last_read_message_id=F("last_message_id")
+    )
+
+
+def inbox(user, before=None):
+    """
+    Return the participant rows of `user`, latest conversation first, after
+    the keyset cursor `before`, a (last_message_at, id) pair.
+    """
+    queryset = (
+        Participant.objects.filter(user=user)
+        .select_related(
+            "conversation__listing", "conversation__buyer", "conversation__seller"
+        )
+        .order_by("-last_message_at", "-id")
+    )
+    if before is not None:
+        last_message_at, participant_id = before
+        queryset = queryset.filter(
+            Q(last_message_at__lt=last_message_at)
+            | Q(last_message_at=last_message_at, id__lt=participant_id)
+        )
+    return queryset
+
+
+def messages(conversation_id, before=None, after=None):
+    """
+    Return the messages of a conversation: newest first, or oldest first
+    after `after` for clients catching up from the last message they have.
+    """
+    queryset = Message.objects.filter(conversation_id=conversation_id)
+    if after is not None:
+        return queryset.filter(id__gt=after).order_by("id")
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    return queryset.order_by("-id")
@@ -0,0 +1,162 @@
+"""
+Django management command to benchmark sending messages and reading inboxes.
+
+Seeds one seller with a listing and a conversation with each of many buyers,
+then sends messages from concurrent threads, each message its own committed
+transaction as in a request, and reports the messages sent per second and
+the latency of each send. Then it times the first and a deep page of the
+seller's inbox, which holds every conversation. Everything it created is
+deleted afterwards.
+
+Run it against Postgres, the database the target is set for. New messages are
+published to REDIS_URL once committed, as they are by the API.
+
+Usage:
+    python manage.py benchmark_messaging
+    python manage.py benchmark_messaging --conversations 5000 --messages 50000 \
+        --threads 16
+"""
+
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from apps.listings.models import Category, Listing, User
+from apps.messaging.conversations import inbox, send_message
+from apps.messaging.models import Conversation, Participant
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def _time_per_call(func, iterations):
+    """Return the wall times of `func` in milliseconds."""
+    func()  # warm up
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+class Command(BaseCommand):
+    help = "Benchmark sending messages and reading inboxes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=1000)
+        parser.add_argument("--messages", type=int, default=10_000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--iterations", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        try:
+            seller, conversations = self.seed(suffix, options["conversations"])
+            self.stdout.write(f"{len(conversations)} conversations")
+            self.benchmark_send(conversations, options)
+            self.benchmark_inbox(seller, options["iterations"])
+        finally:
+            # Conversations, participants and messages go with their users.
+            User.objects.filter(email__startswith=f"benchmark-{suffix}-").delete()
+            Category.objects.filter(name=f"Benchmark {suffix}").delete()
+
+    def seed(self, suffix, count):
+        category = Category.objects.create(
+            name=f"Benchmark {suffix}", description="benchmark"
+        )
+        users = User.objects.bulk_create(
+            User(
+                email=f"benchmark-{suffix}-{index}@example.com",
+                first_name="Bench",
+                last_name="Mark",
+            )
+            for index in range(count + 1)
+        )
+        seller, buyers = users[0], users[1:]
+        listing = Listing.objects.create(
+            title=f"Benchmark listing {suffix}",
+            description="benchmark",
+            price=1000,
+            category=category,
+            seller=seller,
+        )
+        conversations = Conversation.objects.bulk_create(
+            Conversation(listing=listing, buyer=buyer, seller=seller)
+            for buyer in buyers
+        )
+        now = timezone.now()
+        Participant.objects.bulk_create(
+            (
+                Participant(
+                    conversation=conversation, user_id=user_id, last_message_at=now
+                )
+                for conversation in conversations
+                for user_id in (conversation.buyer_id, conversation.seller_id)
+            ),
+            batch_size=5000,
+        )
+        return seller, conversations
+
+    def benchmark_send(self, conversations, options):
+        threads = options["threads"]
+        per_thread = options["messages"] // threads
+
+        def send(index):
+            rng = random.Random(options["seed"] + index)
+            latencies = []
+            try:
+                for number in range(per_thread):
+                    conversation = rng.choice(conversations)
+                    sender = rng.choice((conversation.buyer, conversation.seller))
+                    start = time.perf_counter()
+                    send_message(conversation, sender, f"Benchmark message {number}")
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                # Each thread has its own connection.
+                connection.close()
+            return latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = [
+                latency
+                for thread_latencies in executor.map(send, range(threads))
+                for latency in thread_latencies
+            ]
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"sent {len(latencies)} messages from {threads} threads "
+                f"in {elapsed:.1f} s, {len(latencies) / elapsed:.0f} messages/s"
+            )
+        )
+        self.stdout.write(
+            f"  send p50 {_percentile(latencies, 50):.2f} ms, "
+            f"p99 {_percentile(latencies, 99):.2f} ms"
+        )
+
+    def benchmark_inbox(self, seller, iterations):
+        limit = settings.CONVERSATIONS_PAGE_SIZE
+        middle = inbox(seller)[Participant.objects.filter(user=seller).count() // 2]
+        before = (middle.last_message_at, middle.id)
+        for name, page in (
+            ("first page", lambda: list(inbox(seller)[:limit])),
+            ("deep page", lambda: list(inbox(seller, before)[:limit])),
+        ):
+            times = _time_per_call(page, iterations)
+            self.stdout.write(
+                f"  inbox {name:<10} p50 {_percentile(times, 50):.2f} ms, "
+                f"p99 {_percentile(times, 99):.2f} ms"
+            )
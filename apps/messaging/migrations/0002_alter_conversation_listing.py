@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_alter_listingpricechange_listing_and_more'),
+        ('messaging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='listing',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='conversations', to='listings.listing'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from apps.listings.models import Listing
+
+User = get_user_model()
+
+
+class Conversation(models.Model):
+    """A buyer's conversation with the seller about a listing."""
+
+    # Null once the listing is archived; the conversation is kept.
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="conversations",
+    )
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["listing", "buyer"], name="unique_conversation_buyer"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.buyer} about {self.listing}"
+
+
+class Participant(models.Model):
+    """
+    A user's side of a conversation, with the inbox state denormalized so the
+    inbox is a scan of one index: the last message and how many messages the
+    user hasn't read.
+    """
+
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="participants"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="conversation_participants"
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    last_message_id = models.PositiveBigIntegerField(default=0)
+    last_message_preview = models.CharField(max_length=140, blank=True, default="")
+    last_message_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conversation", "user"], name="unique_participant"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-last_message_at", "-id"],
+                name="participant_inbox_idx",
+            )
+        ]
+
+
+class Message(models.Model):
+    """A message in a conversation. Messages are only ever appended."""
+
+    # Covered by the (conversation, id) index.
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="messages", db_index=False
+    )
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["conversation", "id"], name="message_conversation_id_idx"
+            )
+        ]
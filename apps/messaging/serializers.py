@@ -0,0 +1,69 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from apps.listings.models import Listing
+from apps.messaging.models import Message, Participant
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ["id", "conversation", "sender", "body", "created_at"]
+        read_only_fields = ["conversation", "sender", "created_at"]
+
+    def validate_body(self, value):
+        if len(value) > settings.MESSAGE_MAX_LENGTH:
+            raise serializers.ValidationError(
+                f"Messages can be at most {settings.MESSAGE_MAX_LENGTH} characters."
+            )
+        return value
+
+
+class ConversationStartSerializer(MessageSerializer):
+    """The first message of a buyer about a listing."""
+
+    listing = serializers.PrimaryKeyRelatedField(
+        queryset=Listing.objects.filter(is_active=True, is_sold=False)
+    )
+
+    class Meta(MessageSerializer.Meta):
+        fields = ["listing", "body"]
+
+    def validate_listing(self, value):
+        if value.seller_id == self.context["request"].user.pk:
+            raise serializers.ValidationError("You can't message yourself.")
+        return value
+
+
+class InboxSerializer(serializers.ModelSerializer):
+    """A conversation as listed in the user's inbox."""
+
+    id = serializers.IntegerField(source="conversation_id")
+    listing = serializers.SerializerMethodField()
+    other_user = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Participant
+        fields = [
+            "id",
+            "listing",
+            "other_user",
+            "unread_count",
+            "last_message_id",
+            "last_message_preview",
+            "last_message_at",
+        ]
+
+    def get_listing(self, participant):
+        listing = participant.conversation.listing
+        if listing is None:
+            return None
+        return {"id": listing.id, "slug": listing.slug, "title": listing.title}
+
+    def get_other_user(self, participant):
+        conversation = participant.conversation
+        if participant.user_id == conversation.buyer_id:
+            other = conversation.seller
+        else:
+            other = conversation.buyer
+        return {"id": other.id, "name": f"{other.first_name} {other.last_name}"}
@@ -0,0 +1,190 @@
+import fakeredis
+import orjson
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.authentication.models import User
+from apps.listings.models import Category, Listing
+from apps.messaging.models import Conversation, Message, Participant
+from utils.events import user_channel
+from utils.testing import use_fake_redis
+
+
+class ConversationTest(APITestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        use_fake_redis(self, server)
+        self.pubsub = fakeredis.FakeRedis(server=server).pubsub()
+
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            email_verified=True,
+        )
+        self.buyer = User.objects.create_user(
+            email="buyer@swsc.edu.np",
+            first_name="Jane",
+            last_name="Doe",
+            email_verified=True,
+        )
+        category = Category.objects.create(name="Books", description="Books")
+        self.listing = Listing.objects.create(
+            title="Calculus",
+            description="Barely used",
+            price=1500,
+            category=category,
+            seller=self.seller,
+        )
+
+    def start(self, body="Is this still available?", listing=None):
+        self.client.force_authenticate(self.buyer)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("conversations"),
+                {"listing": (listing or self.listing).id, "body": body},
+                format="json",
+            )
+
+    def send(self, user, conversation, body):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("conversation-messages", args=[conversation.id]),
+                {"body": body},
+                format="json",
+            )
+
+    def participant(self, user):
+        return Participant.objects.get(user=user)
+
+    def test_messaging_a_seller_starts_one_conversation(self):
+        """Test a buyer's messages about a listing share a conversation"""
+        self.pubsub.subscribe(user_channel(self.seller.pk))
+        self.pubsub.get_message(timeout=0.01)
+
+        response = self.start()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.start("Can you do 1200?")
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.seller, self.seller)
+        self.assertEqual(conversation.messages.count(), 2)
+        self.assertEqual(self.participant(self.seller).unread_count, 2)
+        self.assertEqual(self.participant(self.buyer).unread_count, 0)
+        message = self.pubsub.get_message(timeout=0.01)
+        payload = orjson.loads(message["data"])
+        self.assertEqual(payload["event"], "message.new")
+        self.assertEqual(payload["data"]["body"], "Is this still available?")
+
+    def test_cannot_message_yourself(self):
+        self.client.force_authenticate(self.seller)
+        response = self.client.post(
+            reverse("conversations"),
+            {"listing": self.listing.id, "body": "Hello"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_replies_update_both_inboxes(self):
+        self.start()
+        conversation = Conversation.objects.get()
+        self.send(self.seller, conversation, "Yes, it is.")
+
+        seller, buyer = self.participant(self.seller), self.participant(self.buyer)
+        self.assertEqual((seller.unread_count, buyer.unread_count), (0, 1))
+        self.assertEqual(seller.last_read_message_id, seller.last_message_id)
+        self.assertEqual(buyer.last_message_preview, "Yes, it is.")
+
+        self.client.force_authenticate(self.buyer)
+        self.client.post(reverse("conversation-read", args=[conversation.id]))
+        buyer.refresh_from_db()
+        self.assertEqual(buyer.unread_count, 0)
+        self.assertEqual(buyer.last_read_message_id, buyer.last_message_id)
+
+    def test_inbox_is_one_query_latest_first(self):
+        """Test the inbox lists conversations by their last message"""
+        other = Listing.objects.create(
+            title="Physics",
+            description="Barely used",
+            price=900,
+            category=self.listing.category,
+            seller=self.seller,
+        )
+        self.start()
+        self.start(listing=other)
+        first = Conversation.objects.get(listing=self.listing)
+        self.send(self.buyer, first, "Hello again")
+
+        self.client.force_authenticate(self.seller)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("conversations"))
+
+        conversations = response.data["data"]["conversations"]
+        self.assertEqual(
+            [c["listing"]["slug"] for c in conversations],
+            [
+                self.listing.slug,
+                other.slug,
+            ],
+        )
+        self.assertEqual(conversations[0]["unread_count"], 2)
+        self.assertEqual(conversations[0]["other_user"]["id"], self.buyer.id)
+
+    @override_settings(CONVERSATIONS_PAGE_SIZE=1)
+    def test_inbox_pages_with_a_cursor(self):
+        other = Listing.objects.create(
+            title="Physics",
+            description="Barely used",
+            price=900,
+            category=self.listing.category,
+            seller=self.seller,
+        )
+        self.start()
+        self.start(listing=other)
+        self.client.force_authenticate(self.seller)
+
+        first = self.client.get(reverse("conversations")).data["data"]
+        second = self.client.get(
+            reverse("conversations"), {"before": first["next"]}
+        ).data["data"]
+        self.assertEqual(
+            second["conversations"][0]["listing"]["slug"], self.listing.slug
+        )
+        for cursor in ("x", "99999999999999999999_1", "1_99999999999999999999"):
+            response = self.client.get(reverse("conversations"), {"before": cursor})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(MESSAGES_PAGE_SIZE=2)
+    def test_messages_page_by_keyset(self):
+        self.start("one")
+        conversation = Conversation.objects.get()
+        for body in ("two", "three"):
+            self.send(self.buyer, conversation, body)
+        url = reverse("conversation-messages", args=[conversation.id])
+
+        page = self.client.get(url).data["data"]
+        self.assertEqual([m["body"] for m in page["messages"]], ["three", "two"])
+        older = self.client.get(url, {"before": page["next"]}).data["data"]
+        self.assertEqual([m["body"] for m in older["messages"]], ["one"])
+        self.assertIsNone(older["next"])
+        first_id = Message.objects.get(body="one").id
+        newer = self.client.get(url, {"after": first_id}).data["data"]
+        self.assertEqual([m["body"] for m in newer["messages"]], ["two", "three"])
+        for name in ("before", "after"):
+            response = self.client.get(url, {name: 2**63})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_participants_see_a_conversation(self):
+        self.start()
+        conversation = Conversation.objects.get()
+        stranger = User.objects.create_user(
+            email="stranger@swsc.edu.np",
+            first_name="Jim",
+            last_name="Doe",
+            email_verified=True,
+        )
+        response = self.send(stranger, conversation, "Hi")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
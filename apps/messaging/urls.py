@@ -0,0 +1,21 @@
+from django.urls import path
+
+from apps.messaging.views import ConversationView
+
+urlpatterns = [
+    path(
+        "",
+        ConversationView.as_view({"get": "list", "post": "create"}),
+        name="conversations",
+    ),
+    path(
+        "<int:pk>/messages/",
+        ConversationView.as_view({"get": "messages", "post": "send"}),
+        name="conversation-messages",
+    ),
+    path(
+        "<int:pk>/read/",
+        ConversationView.as_view({"post": "read"}),
+        name="conversation-read",
+    ),
+]
@@ -0,0 +1,151 @@
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, status
+from rest_framework.viewsets import ViewSet
+
+from apps.messaging.conversations import (
+    get_or_start_conversation,
+    inbox,
+    mark_read,
+    messages,
+    send_message,
+)
+from apps.messaging.models import Participant
+from apps.messaging.serializers import (
+    ConversationStartSerializer,
+    InboxSerializer,
+    MessageSerializer,
+)
+from apps.permissions import IsEmailVerified
+from utils.envelope import Envelope
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_MICROSECOND = timedelta(microseconds=1)
+# Ids are bigints; larger cursors would be sent to the database as is.
+_MAX_ID = 2**63 - 1
+
+
+def _inbox_cursor(participant):
+    """Encode the keyset position of `participant` so it's safe in a URL."""
+    microseconds = (participant.last_message_at - _EPOCH) // _MICROSECOND
+    return f"{microseconds}_{participant.id}"
+
+
+def _parse_id(value):
+    value = int(value)
+    if not 0 <= value <= _MAX_ID:
+        raise ValueError(f"id out of range: {value}")
+    return value
+
+
+def _parse_inbox_cursor(value):
+    microseconds, participant_id = value.split("_")
+    try:
+        last_message_at = _EPOCH + int(microseconds) * _MICROSECOND
+    except OverflowError:
+        raise ValueError(f"timestamp out of range: {microseconds}")
+    return last_message_at, _parse_id(participant_id)
+
+
+def _invalid_cursor():
+    return Envelope.error_response(
+        error={"detail": "Invalid cursor."}, status_code=status.HTTP_400_BAD_REQUEST
+    )
+
+
+class ConversationView(ViewSet):
+    """The user's conversations, newest activity first, and their messages."""
+
+    permission_classes = [permissions.IsAuthenticated, IsEmailVerified]
+
+    def get_participant(self):
+        return get_object_or_404(
+            Participant.objects.select_related("conversation"),
+            conversation_id=self.kwargs.get("pk"),
+            user=self.request.user,
+        )
+
+    def list(self, request):
+        before = request.query_params.get("before")
+        try:
+            before = _parse_inbox_cursor(before) if before else None
+        except ValueError:
+            return _invalid_cursor()
+        limit = settings.CONVERSATIONS_PAGE_SIZE
+        participants = list(inbox(request.user, before)[:limit])
+        next_cursor = None
+        if len(participants) == limit:
+            next_cursor = _inbox_cursor(participants[-1])
+        return Envelope.success_response(
+            data={
+                "conversations": InboxSerializer(participants, many=True).data,
+                "next": next_cursor,
+            }
+        )
+
+    def create(self, request):
+        """Message the seller of a listing, starting the conversation if new."""
+        serializer = ConversationStartSerializer(
+            data=request.data, context={"request": request}
+        )
+        if not serializer.is_valid():
+            return Envelope.error_response(
+                error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
+            )
+        conversation = get_or_start_conversation(
+            serializer.validated_data["listing"], request.user
+        )
+        message = send_message(
+            conversation, request.user, serializer.validated_data["body"]
+        )
+        return Envelope.success_response(
+            data=MessageSerializer(message).data, status_code=status.HTTP_201_CREATED
+        )
+
+    def messages(self, request, pk):
+        """
+        Messages newest first, older pages with `before`, or the messages
+        after `after` oldest first.
+        """
+        try:
+            before, after = (
+                _parse_id(request.query_params[name])
+                if name in request.query_params
+                else None
+                for name in ("before", "after")
+            )
+        except ValueError:
+            return _invalid_cursor()
+        participant = self.get_participant()
+        limit = settings.MESSAGES_PAGE_SIZE
+        page = list(messages(participant.conversation_id, before, after)[:limit])
+        next_cursor = None
+        if after is None and len(page) == limit:
+            next_cursor = page[-1].id
+        return Envelope.success_response(
+            data={
+                "messages": MessageSerializer(page, many=True).data,
+                "next": next_cursor,
+            }
+        )
+
+    def send(self, request, pk):
+        participant = self.get_participant()
+        serializer = MessageSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Envelope.error_response(
+                error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
+            )
+        message = send_message(
+            participant.conversation, request.user, serializer.validated_data["body"]
+        )
+        return Envelope.success_response(
+            data=MessageSerializer(message).data, status_code=status.HTTP_201_CREATED
+        )
+
+    def read(self, request, pk):
+        mark_read(self.get_participant())
+        return Envelope.success_response(data={"detail": "conversation read"})
@@ -0,0 +1,149 @@
+"""
+In-app notifications and their digest emails.
+
+Notifications are fanned out on write: every recipient gets their own row, so
+reading an inbox is a scan of the (user, -id) index however many users an
+event reached. `notify()` inserts the rows with `bulk_create` in batches of
+NOTIFICATION_BATCH_SIZE and pushes each batch to the users' event streams in
+one pipeline, so notifying the thousands of users who saved a listing takes a
+few queries rather than a few thousand.
+
+Each notification names its source, the id of what it is about, and a user
+gets one notification per kind and source. Batches are committed as they go,
+so a task redelivered after a worker died partway skips the users already
+notified instead of notifying and pushing to them twice.
+
+Emails aren't sent per notification. `send_digests()` runs every
+NOTIFICATION_DIGEST_INTERVAL_MINUTES and emails each user one digest of what
+they haven't read yet, so a burst of events becomes one email.
+"""
+
+import logging
+from collections import defaultdict
+from itertools import batched
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.listings.models import SavedListing
+from apps.notifications.models import Notification
+from utils.events import publish
+from utils.mail import TransientEmailError, send_templated_email
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_NEW = "notification.new"
+
+
+def notify(user_ids, kind, source, text, data=None, email=True):
+    """
+    Notify every user in `user_ids`, which may be any iterable, of `source`
+    unless they were already; returns how many were notified. With `email`,
+    the notifications go in the digests.
+    """
+    data = data or {}
+    created_at = timezone.now()
+    count = 0
+    for batch in batched(user_ids, settings.NOTIFICATION_BATCH_SIZE):
+        notified = set(
+            Notification.objects.filter(
+                user_id__in=batch, kind=kind, source=source
+            ).values_list("user_id", flat=True)
+        )
+        batch = [user_id for user_id in batch if user_id not in notified]
+        if not batch:
+            continue
+        # Conflicts are a concurrent run of the same task.
+        Notification.objects.bulk_create(
+            (
+                Notification(
+                    user_id=user_id,
+                    kind=kind,
+                    source=source,
+                    text=text,
+                    data=data,
+                    email_pending=email,
+                    created_at=created_at,
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+        publish(
+            batch,
+            NOTIFICATION_NEW,
+            {
+                "kind": kind,
+                "text": text,
+                "data": data,
+                "created_at": created_at.isoformat(),
+            },
+        )
+        count += len(batch)
+    return count
+
+
+def notify_listing_savers(listing_id, kind, source, text, data=None):
+    """Notify the users who saved `listing_id` of `source`."""
+    user_ids = (
+        SavedListing.objects.filter(listing_id=listing_id)
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=settings.NOTIFICATION_BATCH_SIZE)
+    )
+    return notify(user_ids, kind, source, text, data)
+
+
+def unread(user):
+    return Notification.objects.filter(user=user, read_at__isnull=True)
+
+
+def inbox(user, before=None):
+    """Return the notifications of `user`, newest first, older than `before`."""
+    queryset = Notification.objects.filter(user=user).order_by("-id")
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    return queryset
+
+
+def mark_read(user, ids=None):
+    """Mark the notifications `ids` of `user` read, or all of them."""
+    queryset = unread(user)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    # Read before the digest went out, no need to email them.
+    return queryset.update(read_at=timezone.now(), email_pending=False)
+
+
+def send_digests():
+    """Email every user with pending notifications one digest of them."""
+    pending = (
+        Notification.objects.filter(email_pending=True)
+        .select_related("user")
+        .order_by("user_id", "id")[: settings.NOTIFICATION_DIGEST_BATCH_SIZE]
+    )
+    by_user = defaultdict(list)
+    for notification in pending:
+        by_user[notification.user].append(notification)
+
+    sent = 0
+    for user, notifications in by_user.items():
+        try:
+            send_templated_email(
+                subject=f"You have {len(notifications)} new notifications",
+                template_name="notifications/email/digest.txt",
+                context={
+                    "first_name": user.first_name,
+                    "notifications": notifications,
+                },
+                recipient=user.email,
+                idempotency_key=f"notification-digest:{user.pk}:{notifications[-1].pk}",
+            )
+        except TransientEmailError:
+            # Left pending for the next run.
+            logger.warning(f"could not send notification digest to {user.email}")
+            continue
+        Notification.objects.filter(
+            id__in=[notification.id for notification in notifications]
+        ).update(email_pending=False)
+        sent += 1
+    return sent
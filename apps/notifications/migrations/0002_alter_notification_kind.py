@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('review_received', 'Review Received'), ('listing_sold', 'Saved Listing Sold'), ('saved_search_match', 'Saved Search Match'), ('price_drop', 'Saved Listing Price Drop')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models import Q
+
+User = get_user_model()
+
+
+class NOTIFICATION_KIND(models.TextChoices):
+    REVIEW_RECEIVED = "review_received", "Review Received"
+    LISTING_SOLD = "listing_sold", "Saved Listing Sold"
+    SAVED_SEARCH_MATCH = "saved_search_match", "Saved Search Match"
+    PRICE_DROP = "price_drop", "Saved Listing Price Drop"
+
+
+class Notification(models.Model):
+    """An entry in a user's notification inbox, written once per recipient."""
+
+    # Covered by the inbox index.
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="notifications", db_index=False
+    )
+    kind = models.CharField(max_length=50, choices=NOTIFICATION_KIND.choices)
+    # Id of what the notification is about, e.g. the review or the listing,
+    # so a user is notified of it once however often the task runs.
+    source = models.PositiveBigIntegerField(null=True)
+    text = models.CharField(max_length=255)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    # Still to go out in the user's next digest email.
+    email_pending = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "kind", "source"], name="unique_notification"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "-id"], name="notification_inbox_idx"),
+            models.Index(
+                fields=["user"],
+                condition=Q(read_at__isnull=True),
+                name="notification_unread_idx",
+            ),
+            models.Index(
+                fields=["user", "id"],
+                condition=Q(email_pending=True),
+                name="notification_email_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.user}"
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+from apps.notifications.models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ["id", "kind", "text", "data", "created_at", "read_at"]
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """Which notifications to mark read; all of them when `ids` is left out."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=100
+    )
@@ -0,0 +1,79 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.listings.events import LISTING_SOLD, status_event
+from apps.listings.models import Listing
+from apps.listings.prices import price_changed
+from apps.listings.saved_searches import listing_matched
+from apps.notifications.delivery import notify
+from apps.notifications.models import NOTIFICATION_KIND
+from apps.notifications.tasks import notify_savers, notify_users
+from apps.reviews.models import Review
+
+
+@receiver(post_save, sender=Review)
+def notify_review(instance, created, *args, **kwargs):
+    if not created:
+        return
+    transaction.on_commit(
+        partial(
+            notify_users.delay,
+            [instance.reviewed_user_id],
+            NOTIFICATION_KIND.REVIEW_RECEIVED,
+            instance.pk,
+            f"{instance.reviewer.first_name} left you a {instance.rating}-star review.",
+            {"review": instance.pk},
+        )
+    )
+
+
+@receiver(post_save, sender=Listing)
+def notify_sold(instance, update_fields=None, *args, **kwargs):
+    if status_event(instance, update_fields) != LISTING_SOLD:
+        return
+    transaction.on_commit(
+        partial(
+            notify_savers.delay,
+            instance.pk,
+            NOTIFICATION_KIND.LISTING_SOLD,
+            instance.pk,
+            f'"{instance.title}", which you saved, has been sold.',
+            {"listing": instance.pk, "slug": instance.slug},
+        )
+    )
+
+
+@receiver(listing_matched)
+def notify_match(listing, user_ids, *args, **kwargs):
+    # Sent from a task already; saved search alerts are emailed separately.
+    notify(
+        user_ids,
+        NOTIFICATION_KIND.SAVED_SEARCH_MATCH,
+        listing.pk,
+        f'"{listing.title}" matches your saved search.',
+        {"listing": listing.pk, "slug": listing.slug},
+        email=False,
+    )
+
+
+@receiver(price_changed)
+def notify_price_drop(listing, old_price, change, *args, **kwargs):
+    # Sent once the change is committed.
+    if listing.price >= old_price:
+        return
+    notify_savers.delay(
+        listing.pk,
+        NOTIFICATION_KIND.PRICE_DROP,
+        change.pk,
+        f'"{listing.title}", which you saved, dropped from Rs. {old_price} '
+        f"to Rs. {listing.price}.",
+        {
+            "listing": listing.pk,
+            "slug": listing.slug,
+            "old_price": old_price,
+            "new_price": listing.price,
+        },
+    )
@@ -0,0 +1,29 @@
+import logging
+
+from celery import shared_task
+
+from apps.notifications.delivery import notify, notify_listing_savers, send_digests
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def notify_users(user_ids, kind, source, text, data=None):
+    """Add a notification to the inbox of each of `user_ids`."""
+    return notify(user_ids, kind, source, text, data)
+
+
+@shared_task
+def notify_savers(listing_id, kind, source, text, data=None):
+    """Add a notification to the inbox of every user who saved a listing."""
+    count = notify_listing_savers(listing_id, kind, source, text, data)
+    logger.info(f"notified {count} users who saved listing {listing_id} of {kind}")
+    return count
+
+
+@shared_task
+def send_notification_digests():
+    """Email users a digest of their notifications since the last one."""
+    sent = send_digests()
+    logger.info(f"sent {sent} notification digests")
+    return sent
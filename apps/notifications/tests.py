@@ -0,0 +1,194 @@
+from unittest import mock
+
+from django.core import mail
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.authentication.models import User
+from apps.listings.models import Category, Listing, SavedListing, SavedSearch
+from apps.listings.saved_searches import index_saved_search
+from apps.notifications.delivery import notify, notify_listing_savers, send_digests
+from apps.notifications.models import NOTIFICATION_KIND, Notification
+from utils.testing import use_fake_redis
+
+
+class NotificationTest(APITestCase):
+    def setUp(self):
+        use_fake_redis(self)
+        self.seller = User.objects.create_user(
+            email="seller@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            email_verified=True,
+        )
+        self.buyer = User.objects.create_user(
+            email="buyer@swsc.edu.np",
+            first_name="Jane",
+            last_name="Doe",
+            email_verified=True,
+        )
+        self.category = Category.objects.create(name="Books", description="Books")
+
+    def create_listing(self, title="Calculus"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Listing.objects.create(
+                title=title,
+                description="Barely used",
+                price=1500,
+                category=self.category,
+                seller=self.seller,
+            )
+
+    def test_new_review_notifies_the_reviewed_user(self):
+        self.client.force_authenticate(self.buyer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("reviews"),
+                {"reviewed_user": self.seller.id, "rating": 5, "comment": "Great"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        notification = Notification.objects.get(user=self.seller)
+        self.assertEqual(notification.kind, NOTIFICATION_KIND.REVIEW_RECEIVED)
+        self.assertTrue(notification.email_pending)
+
+    @override_settings(NOTIFICATION_BATCH_SIZE=2)
+    def test_sold_listing_notifies_savers_in_batches(self):
+        """Test savers of a sold listing are notified with a query per batch"""
+        listing = self.create_listing()
+        savers = [
+            User.objects.create_user(
+                email=f"saver{index}@swsc.edu.np", first_name="Saver", last_name="Doe"
+            )
+            for index in range(5)
+        ]
+        SavedListing.objects.bulk_create(
+            SavedListing(user=user, listing=listing) for user in savers
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.mark_sold()
+
+        self.assertCountEqual(
+            Notification.objects.filter(
+                kind=NOTIFICATION_KIND.LISTING_SOLD
+            ).values_list("user_id", flat=True),
+            [user.id for user in savers],
+        )
+        # The SELECT of savers, and a SELECT of who was notified already
+        # and an INSERT per batch.
+        with self.assertNumQueries(1 + 3 * 2):
+            notify_listing_savers(listing.id, NOTIFICATION_KIND.LISTING_SOLD, 0, "Sold")
+
+    @override_settings(NOTIFICATION_BATCH_SIZE=2)
+    def test_redelivered_task_skips_users_already_notified(self):
+        """Test a fan-out run again after dying partway notifies each user once"""
+        listing = self.create_listing()
+        savers = [
+            User.objects.create_user(
+                email=f"saver{index}@swsc.edu.np", first_name="Saver", last_name="Doe"
+            )
+            for index in range(5)
+        ]
+        SavedListing.objects.bulk_create(
+            SavedListing(user=user, listing=listing) for user in savers
+        )
+        # The first batch was written before the worker died.
+        notify(
+            [user.id for user in savers[:2]],
+            NOTIFICATION_KIND.LISTING_SOLD,
+            listing.id,
+            "Sold",
+        )
+
+        with mock.patch("apps.notifications.delivery.publish") as publish:
+            count = notify_listing_savers(
+                listing.id, NOTIFICATION_KIND.LISTING_SOLD, listing.id, "Sold"
+            )
+
+        self.assertEqual(count, 3)
+        self.assertCountEqual(
+            [user_id for call in publish.call_args_list for user_id in call.args[0]],
+            [user.id for user in savers[2:]],
+        )
+        self.assertCountEqual(
+            Notification.objects.values_list("user_id", flat=True),
+            [user.id for user in savers],
+        )
+
+    def test_matching_listing_notifies_once(self):
+        search = SavedSearch.objects.create(user=self.buyer, keywords="calculus")
+        index_saved_search(search)
+
+        listing = self.create_listing("Thomas' Calculus")
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.mark_inactive()
+            listing.mark_active()
+
+        notification = Notification.objects.get(user=self.buyer)
+        self.assertEqual(notification.kind, NOTIFICATION_KIND.SAVED_SEARCH_MATCH)
+        # Saved search alerts have their own email.
+        self.assertFalse(notification.email_pending)
+
+    def test_price_drop_notifies_savers(self):
+        listing = self.create_listing()
+        SavedListing.objects.create(user=self.buyer, listing=listing)
+        self.client.force_authenticate(self.seller)
+        url = reverse("listings-detail", kwargs={"slug": listing.slug})
+
+        for price in (1800, 1200):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(url, {"price": price}, format="json")
+
+        notification = Notification.objects.get(user=self.buyer)
+        self.assertEqual(notification.kind, NOTIFICATION_KIND.PRICE_DROP)
+        self.assertEqual(
+            (notification.data["old_price"], notification.data["new_price"]),
+            (1800, 1200),
+        )
+
+    def test_digest_batches_a_burst_into_one_email(self):
+        for rating in range(3):
+            notify(
+                [self.seller.id],
+                NOTIFICATION_KIND.REVIEW_RECEIVED,
+                rating,
+                f"Review {rating}",
+            )
+        notify([self.buyer.id], NOTIFICATION_KIND.REVIEW_RECEIVED, 0, "Read already")
+        self.client.force_authenticate(self.buyer)
+        self.client.post(reverse("notifications-read"), {}, format="json")
+
+        self.assertEqual(send_digests(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.seller.email])
+        self.assertIn("Review 2", mail.outbox[0].body)
+        self.assertEqual(send_digests(), 0)
+
+    @override_settings(NOTIFICATIONS_PAGE_SIZE=2)
+    def test_inbox_pages_newest_first(self):
+        for index in range(3):
+            notify(
+                [self.buyer.id], NOTIFICATION_KIND.REVIEW_RECEIVED, index, f"n{index}"
+            )
+        self.client.force_authenticate(self.buyer)
+
+        page = self.client.get(reverse("notifications")).data["data"]
+        self.assertEqual(page["unread"], 3)
+        self.assertEqual([n["text"] for n in page["notifications"]], ["n2", "n1"])
+        older = self.client.get(
+            reverse("notifications"), {"before": page["next"]}
+        ).data["data"]
+        self.assertEqual([n["text"] for n in older["notifications"]], ["n0"])
+
+        response = self.client.post(
+            reverse("notifications-read"),
+            {"ids": [page["notifications"][0]["id"]]},
+            format="json",
+        )
+        self.assertEqual(response.data["data"]["read"], 1)
+        page = self.client.get(reverse("notifications")).data["data"]
+        self.assertEqual(page["unread"], 2)
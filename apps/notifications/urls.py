@@ -0,0 +1,10 @@
+from django.urls import path
+
+from apps.notifications.views import NotificationView
+
+urlpatterns = [
+    path("", NotificationView.as_view({"get": "list"}), name="notifications"),
+    path(
+        "read/", NotificationView.as_view({"post": "read"}), name="notifications-read"
+    ),
+]
@@ -0,0 +1,43 @@
+from django.conf import settings
+from rest_framework import permissions, status
+from rest_framework.viewsets import ViewSet
+
+from apps.notifications.delivery import inbox, mark_read, unread
+from apps.notifications.serializers import MarkReadSerializer, NotificationSerializer
+from utils.envelope import Envelope
+
+
+class NotificationView(ViewSet):
+    """The user's notifications, newest first."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        try:
+            before = int(request.query_params.get("before") or 0) or None
+        except ValueError:
+            return Envelope.error_response(
+                error={"detail": "Invalid cursor."},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = settings.NOTIFICATIONS_PAGE_SIZE
+        notifications = list(inbox(request.user, before)[:limit])
+        next_cursor = None
+        if len(notifications) == limit:
+            next_cursor = notifications[-1].id
+        return Envelope.success_response(
+            data={
+                "unread": unread(request.user).count(),
+                "notifications": NotificationSerializer(notifications, many=True).data,
+                "next": next_cursor,
+            }
+        )
+
+    def read(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Envelope.error_response(
+                error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST
+            )
+        count = mark_read(request.user, serializer.validated_data.get("ids"))
+        return Envelope.success_response(data={"read": count})
@@ -1 +1,34 @@
-# Create your tests here.
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.authentication.models import User
+
+
+class UserProfileConditionalRequestTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@swsc.edu.np",
+            first_name="John",
+            last_name="Doe",
+            password="password123",
+        )
+        self.url = reverse("user_profiles", kwargs={"user_id": self.user.id})
+
+    def test_profile_not_modified(self):
+        """Test a matching If-None-Match returns 304"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_profile_changes_with_phone_number(self):
+        """Test the ETag changes when the profile changes"""
+        etag = self.client.get(self.url)["ETag"]
+        self.user.profile.phone_number = "+9779841234567"
+        self.user.profile.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["phone_number"], "+977 984-1234567")
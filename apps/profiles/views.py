@@ -1,14 +1,16 @@
 import logging
 
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Max
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions, status
 from rest_framework.viewsets import ViewSet
 
 from apps.listings.models import Listing
-from apps.listings.serializers import ListingReadSerializer
+from apps.listings.serializers import ListingFeedSerializer
 from apps.profiles.serializers import UserProfileWithRecentListingsReadSerializer
+from utils.conditional import conditional, make_etag
 from utils.constants import USER_ERRORS
 from utils.envelope import Envelope
 
@@ -16,6 +18,36 @@ logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
+def profile_etag(request, user_id):
+    """A profile changes with the user, their phone number or any of their listings."""
+    row = (
+        User.objects.filter(id=user_id)
+        .annotate(
+            listings_count=Count("listings"),
+            listings_updated_at=Max("listings__updated_at"),
+            categories_updated_at=Max("listings__category__updated_at"),
+        )
+        .values_list(
+            "first_name",
+            "last_name",
+            "email",
+            "date_joined",
+            "profile__phone_number",
+            "listings_count",
+            "listings_updated_at",
+            "categories_updated_at",
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return make_etag(request.get_host(), row)
+
+
+def current_user_profile_etag(request):
+    return profile_etag(request, request.user.id)
+
+
 class UserProfileViewSet(ViewSet):
     """ViewSet for handling user profile operations."""
 
@@ -24,6 +56,7 @@ class UserProfileViewSet(ViewSet):
             return [permissions.AllowAny()]
         return [permissions.IsAuthenticated()]
 
+    @conditional(etag_func=profile_etag)
     def retrieve(self, request, user_id):
         """Get public profile of a specific user by ID."""
         try:
@@ -42,6 +75,7 @@ class UserProfileViewSet(ViewSet):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @conditional(etag_func=current_user_profile_etag)
     def me(self, request):
         """Get current authenticated user's own profile."""
         serializer = UserProfileWithRecentListingsReadSerializer(request.user)
@@ -64,20 +98,20 @@ class UserListingsViewSet(ViewSet):
             return Envelope.error_response(
                 error=USER_ERRORS.USER_NOT_FOUND, status_code=status.HTTP_404_NOT_FOUND
             )
-        listings = Listing.objects.filter(seller=user, is_active=True)
-        serializer = ListingReadSerializer(
-            listings, many=True, context={"request": request}
+        listings = ListingFeedSerializer.get_values_queryset(
+            Listing.objects.filter(seller=user, is_active=True)
         )
+        serializer = ListingFeedSerializer(listings, context={"request": request})
         return Envelope.success_response(
             data={"count": len(listings), "listings": serializer.data}
         )
 
     def current_user_listings(self, request):
         """Get all listings (active and inactive) for the current authenticated user."""
-        listings = Listing.objects.filter(seller=request.user)
-        serializer = ListingReadSerializer(
-            listings, many=True, context={"request": request}
+        listings = ListingFeedSerializer.get_values_queryset(
+            Listing.objects.filter(seller=request.user)
         )
+        serializer = ListingFeedSerializer(listings, context={"request": request})
         return Envelope.success_response(
             data={"count": len(listings), "listings": serializer.data}
         )
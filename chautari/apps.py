@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ChautariConfig(AppConfig):
+    name = "chautari"
+
+    def ready(self):
+        from utils import task_metrics  # noqa
+
+        from . import checks  # noqa
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "chautari.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs the settings configured above.
+from utils.events import EventStreamApplication  # noqa: E402
+
+application = EventStreamApplication(django_application, path="/api/v1/events")
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.db import connections
+
+
+def _pool_max_size(alias):
+    pool_options = connections[alias].settings_dict.get("OPTIONS", {}).get("pool")
+    if not pool_options:
+        return None
+    if pool_options is True:
+        # psycopg_pool's default max_size falls back to min_size, which is 4.
+        return 4
+    return pool_options.get("max_size", pool_options.get("min_size", 4))
+
+
+def _server_max_connections(alias):
+    """Return the number of connections available to non-superusers."""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT current_setting('max_connections')::int"
+            " - current_setting('superuser_reserved_connections')::int"
+        )
+        return cursor.fetchone()[0]
+
+
+def _connection_budget_warnings(alias, max_connections):
+    pool_max_size = _pool_max_size(alias)
+    if pool_max_size is None or max_connections is None:
+        return []
+
+    workers = getattr(settings, "WEB_CONCURRENCY", 1)
+    required = workers * pool_max_size
+    if required <= max_connections:
+        return []
+    return [
+        Warning(
+            f"Database '{alias}' may need {required} connections "
+            f"({workers} workers x pool max_size {pool_max_size}) but the "
+            f"server allows {max_connections}.",
+            hint=(
+                "Lower DATABASE_POOL_MAX_SIZE or WEB_CONCURRENCY, or raise "
+                "max_connections on the server. Celery workers and other "
+                "clients need connections too."
+            ),
+            id="chautari.W001",
+        )
+    ]
+
+
+@register(Tags.database)
+def check_connection_pool_budget(app_configs, databases=None, **kwargs):
+    """Compare the pool budget against max_connections reported by the server."""
+    if not databases or getattr(settings, "DATABASE_MAX_CONNECTIONS", None):
+        return []
+    errors = []
+    for alias in databases:
+        if _pool_max_size(alias) is None:
+            continue
+        errors.extend(
+            _connection_budget_warnings(alias, _server_max_connections(alias))
+        )
+    return errors
+
+
+@register()
+def check_declared_connection_budget(app_configs, **kwargs):
+    """Compare the pool budget against DATABASE_MAX_CONNECTIONS, if declared."""
+    max_connections = getattr(settings, "DATABASE_MAX_CONNECTIONS", None)
+    if max_connections is None:
+        return []
+    errors = []
+    for alias in connections:
+        errors.extend(_connection_budget_warnings(alias, max_connections))
+    return errors
@@ -0,0 +1,79 @@
+"""
+Django management command to aggregate sampled CPU profiles of requests.
+
+Merges the collapsed stack files CPUProfilingMiddleware wrote to
+CPU_PROFILING_DIR, optionally only those of some routes, and writes the
+merged stacks in collapsed format, ready for flamegraph.pl or speedscope. It
+also prints the functions with the most samples, both on their own (self) and
+including what they called (total).
+
+Usage:
+    python manage.py aggregate_cpu_profiles --output feed.collapsed
+    python manage.py aggregate_cpu_profiles --route listings --top 30
+    flamegraph.pl feed.collapsed > feed.svg
+"""
+
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.cpu_profiling import FILE_SUFFIX, profile_path
+
+
+class Command(BaseCommand):
+    help = "Merge sampled request CPU profiles into a flamegraph-ready report"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--route", nargs="+", default=[], help="Only include these routes"
+        )
+        parser.add_argument("--output", help="Write merged collapsed stacks here")
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--directory", default=settings.CPU_PROFILING_DIR)
+
+    def handle(self, *args, **options):
+        directory = Path(options["directory"])
+        stacks = Counter()
+        for path in self.profile_files(directory, options["route"]):
+            with open(path) as file:
+                for line in file:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack and count.isdigit():
+                        stacks[stack] += int(count)
+        if not stacks:
+            raise CommandError(f"no profiles found in {directory}")
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+            self.stdout.write(f"Wrote {len(stacks)} stacks to {options['output']}")
+
+        total = stacks.total()
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            # Count recursive functions once per stack.
+            for frame in set(frames):
+                total_samples[frame] += count
+
+        self.stdout.write(f"{total} samples\n")
+        for title, counter in (("self", self_samples), ("total", total_samples)):
+            self.stdout.write(f"{title:>6} {'%':>6}  function")
+            for frame, count in counter.most_common(options["top"]):
+                self.stdout.write(f"{count:>6} {count * 100 / total:>5.1f}%  {frame}")
+            self.stdout.write("")
+
+    def profile_files(self, directory, routes):
+        if not routes:
+            return sorted(directory.glob(f"*{FILE_SUFFIX}"))
+        files = []
+        for route in routes:
+            # Files are named "<route>.<pid>.collapsed".
+            prefix = profile_path(route).name.split(".")[0]
+            files.extend(sorted(directory.glob(f"{prefix}.*{FILE_SUFFIX}")))
+        return files
@@ -0,0 +1,72 @@
+"""
+Django management command to benchmark the overhead of RequestMetricsMiddleware.
+
+Sends the same requests through the full middleware stack with and without
+RequestMetricsMiddleware and prints the mean time per request of both and the
+difference. Rounds alternate between the two stacks and the fastest round of
+each is reported, to keep noise from other processes out of the comparison.
+The default paths cover a view without database access and one that queries
+the database.
+
+Usage:
+    python manage.py benchmark_request_metrics
+    python manage.py benchmark_request_metrics --paths /api/v1/ping --iterations 2000
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+METRICS_MIDDLEWARE = "utils.request_metrics.RequestMetricsMiddleware"
+
+
+def _time_per_request(path, iterations):
+    """Return the mean time of a GET to `path` in microseconds."""
+    client = Client()
+    client.get(path)  # warm up and load the middleware chain
+    start = time.perf_counter()
+    for _ in range(iterations):
+        client.get(path)
+    return (time.perf_counter() - start) * 1_000_000 / iterations
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-request overhead of the request metrics middleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--paths",
+            nargs="+",
+            default=["/api/v1/ping", "/api/v1/listings/categories/"],
+        )
+        parser.add_argument("--iterations", type=int, default=1000)
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with_metrics = list(settings.MIDDLEWARE)
+        if METRICS_MIDDLEWARE not in with_metrics:
+            with_metrics.insert(0, METRICS_MIDDLEWARE)
+        without_metrics = [m for m in with_metrics if m != METRICS_MIDDLEWARE]
+
+        self.stdout.write(f"{'path':<40} {'without':>10} {'with':>10} {'overhead':>10}")
+        for path in options["paths"]:
+            results = {False: [], True: []}
+            for _ in range(options["rounds"]):
+                for metrics, middleware in (
+                    (False, without_metrics),
+                    (True, with_metrics),
+                ):
+                    with override_settings(
+                        MIDDLEWARE=middleware,
+                        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                    ):
+                        results[metrics].append(
+                            _time_per_request(path, options["iterations"])
+                        )
+            without, with_ = min(results[False]), min(results[True])
+            self.stdout.write(
+                f"{path:<40} {without:>8.1f}us {with_:>8.1f}us "
+                f"{with_ - without:>8.1f}us"
+            )
@@ -0,0 +1,121 @@
+"""
+Django management command to summarize Celery task metrics.
+
+Scrapes the metrics endpoints of one or more workers (see CELERY_METRICS_PORT)
+and prints, per task, how many runs finished and failed, how long messages
+waited in the queue and how long the task ran. Percentiles are estimated from
+the histogram buckets, so they are only as precise as the bucket bounds.
+
+Usage:
+    python manage.py task_metrics
+    python manage.py task_metrics --url http://worker-1:9101/metrics http://worker-2:9102/metrics
+"""
+
+from collections import defaultdict
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from prometheus_client.parser import text_string_to_metric_families
+
+
+def _percentile(buckets, quantile):
+    """Estimate a quantile from cumulative `(upper_bound, count)` buckets."""
+    buckets = sorted(buckets)
+    total = buckets[-1][1] if buckets else 0
+    if not total:
+        return None
+    rank = quantile * total
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if upper_bound == float("inf"):
+                return lower_bound
+            # Assume samples are spread evenly within the bucket.
+            fraction = (rank - lower_count) / ((count - lower_count) or 1)
+            return lower_bound + (upper_bound - lower_bound) * fraction
+        lower_bound, lower_count = upper_bound, count
+    return lower_bound
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0.0
+        self.sum = 0.0
+        self.buckets = defaultdict(float)
+
+    def add(self, sample):
+        if sample.name.endswith("_bucket"):
+            self.buckets[float(sample.labels["le"])] += sample.value
+        elif sample.name.endswith("_count"):
+            self.count += sample.value
+        elif sample.name.endswith("_sum"):
+            self.sum += sample.value
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, quantile):
+        return _percentile(self.buckets.items(), quantile)
+
+
+class Command(BaseCommand):
+    help = "Summarize per-task queue wait, run time and failures from workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            nargs="+",
+            default=[
+                f"http://localhost:{settings.CELERY_METRICS_PORT or 9100}/metrics"
+            ],
+            help="Worker metrics endpoints to scrape",
+        )
+        parser.add_argument("--timeout", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        waits = defaultdict(Histogram)
+        runtimes = defaultdict(Histogram)
+        outcomes = defaultdict(lambda: defaultdict(float))
+
+        for url in options["url"]:
+            for family in self.scrape(url, options["timeout"]):
+                for sample in family.samples:
+                    task = sample.labels.get("task")
+                    if family.name == "celery_task_queue_wait_seconds":
+                        waits[task].add(sample)
+                    elif family.name == "celery_task_runtime_seconds":
+                        runtimes[task].add(sample)
+                    elif family.name == "celery_task_outcomes":
+                        outcomes[task][sample.labels["state"]] += sample.value
+
+        tasks = sorted(set(waits) | set(runtimes) | set(outcomes))
+        if not tasks:
+            self.stdout.write("No task metrics recorded yet.")
+            return
+
+        self.stdout.write(
+            f"{'task':<60} {'runs':>6} {'failed':>6} {'retried':>7} "
+            f"{'wait avg':>9} {'wait p95':>9} {'run avg':>9} {'run p95':>9}"
+        )
+        for task in tasks:
+            states = outcomes[task]
+            self.stdout.write(
+                f"{task:<60} {int(sum(states.values())):>6} "
+                f"{int(states.get('FAILURE', 0)):>6} {int(states.get('RETRY', 0)):>7} "
+                f"{self.ms(waits[task].mean()):>9} "
+                f"{self.ms(waits[task].percentile(0.95)):>9} "
+                f"{self.ms(runtimes[task].mean()):>9} "
+                f"{self.ms(runtimes[task].percentile(0.95)):>9}"
+            )
+
+    def scrape(self, url, timeout):
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                text = response.read().decode()
+        except OSError as exc:
+            raise CommandError(f"could not scrape {url}: {exc}")
+        return text_string_to_metric_families(text)
+
+    def ms(self, seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.1f}ms"
@@ -3,6 +3,7 @@ from pathlib import Path
 
 import environ
 from celery.beat import crontab
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,14 +31,19 @@ INSTALLED_APPS = [
     "rest_framework",
     "phonenumber_field",
     "django_filters",
+    "chautari",
     "apps.authentication",
     "apps.listings",
+    "apps.messaging",
+    "apps.notifications",
     "apps.profiles",
     "apps.reviews",
 ]
 
 
 MIDDLEWARE = [
+    "utils.request_metrics.RequestMetricsMiddleware",
+    "utils.cpu_profiling.CPUProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -45,6 +51,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "utils.db_router.ReplicaRoutingMiddleware",
+    "utils.sql_profiling.SQLProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "chautari.urls"
@@ -66,20 +74,73 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "chautari.wsgi.application"
 
+# Runs Celery tasks inline during tests.
+TEST_RUNNER = "chautari.test_runner.TestRunner"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Connections are reused across requests either through psycopg's native pool
+# (DATABASE_POOL_ENABLED) or through persistent connections (CONN_MAX_AGE).
+# Django does not allow both at once. Every worker process owns its own pool,
+# so size DATABASE_POOL_MAX_SIZE to the number of threads serving requests in
+# one process and keep WEB_CONCURRENCY * DATABASE_POOL_MAX_SIZE below the
+# server's max_connections (see chautari/checks.py).
+DATABASE_POOL_ENABLED = env.bool("DATABASE_POOL_ENABLED", default=False)
 
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": env("DATABASE_NAME"),
         "HOST": env("DATABASE_HOST"),
+        "PORT": env("DATABASE_PORT", default="5432"),
         "USER": env("DATABASE_USER"),
         "PASSWORD": env("DATABASE_PASSWORD"),
+        "CONN_MAX_AGE": (
+            0 if DATABASE_POOL_ENABLED else env.int("DATABASE_CONN_MAX_AGE", default=60)
+        ),
+        "CONN_HEALTH_CHECKS": env.bool("DATABASE_CONN_HEALTH_CHECKS", default=True),
+        "OPTIONS": {},
     }
 }
 
+if DATABASE_POOL_ENABLED:
+    # With CONN_HEALTH_CHECKS on, Django passes ConnectionPool.check_connection
+    # to the pool so broken connections are discarded before being handed out.
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DATABASE_POOL_MAX_SIZE", default=4),
+        "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10.0),
+        "max_idle": env.float("DATABASE_POOL_MAX_IDLE", default=300.0),
+        "max_lifetime": env.float("DATABASE_POOL_MAX_LIFETIME", default=3600.0),
+    }
+
+# Read replicas. Each host in DATABASE_REPLICA_HOSTS becomes a "replica_<n>"
+# alias that shares the primary's credentials and pool settings. Safe requests
+# read from them through utils.db_router; everything else uses "default".
+DATABASE_REPLICAS = []
+for index, host in enumerate(env.list("DATABASE_REPLICA_HOSTS", default=[])):
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "OPTIONS": {**DATABASES["default"]["OPTIONS"]},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["utils.db_router.PrimaryReplicaRouter"]
+# Seconds a client keeps reading from the primary after a successful write.
+DATABASE_REPLICA_PIN_SECONDS = env.int("DATABASE_REPLICA_PIN_SECONDS", default=5)
+# Path prefixes that always read from the primary.
+DATABASE_REPLICA_EXEMPT_PATHS = ["/admin/"]
+
+# Number of web worker processes, used to budget database connections.
+WEB_CONCURRENCY = env.int("WEB_CONCURRENCY", default=1)
+# Usable connections on the server. When unset, the check queries the server.
+DATABASE_MAX_CONNECTIONS = env.int("DATABASE_MAX_CONNECTIONS", default=None)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -112,6 +173,19 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Use a shared backend (e.g. redis://localhost:6379/1) when running more than
+# one process; the in-memory default is per process.
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# Redis for counters and rankings, see utils.redis. A short socket timeout
+# keeps a slow Redis from holding up requests that only record stats.
+REDIS_URL = env("REDIS_URL", default="redis://localhost:6379/2")
+REDIS_SOCKET_TIMEOUT = env.float("REDIS_SOCKET_TIMEOUT", default=0.5)
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -134,6 +208,15 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "utils.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "EXCEPTION_HANDLER": "utils.exception_handler.custom_exception_handler",
 }
 
@@ -153,6 +236,17 @@ EMAIL_PORT = env("EMAIL_PORT")
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL")
+EMAIL_TIMEOUT = env.int("EMAIL_TIMEOUT", default=10)
+# Each worker process keeps its SMTP connection open between messages and
+# closes it after EMAIL_CONNECTION_IDLE_TIMEOUT seconds without use. Messages
+# sent by concurrent threads within EMAIL_BATCH_WINDOW_SECONDS share a batch.
+EMAIL_CONNECTION_IDLE_TIMEOUT = env.float("EMAIL_CONNECTION_IDLE_TIMEOUT", default=60.0)
+EMAIL_BATCH_WINDOW_SECONDS = env.float("EMAIL_BATCH_WINDOW_SECONDS", default=0.0)
+EMAIL_MAX_BATCH_SIZE = env.int("EMAIL_MAX_BATCH_SIZE", default=50)
+# How long an email task's idempotency key is remembered, so that retried or
+# redelivered tasks don't send the same email twice. Relies on a cache shared
+# by all workers (CACHE_URL).
+EMAIL_IDEMPOTENCY_TIMEOUT = env.int("EMAIL_IDEMPOTENCY_TIMEOUT", default=60 * 60 * 24)
 
 EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES = env.int(
     "EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES", default=20
@@ -160,11 +254,224 @@ EMAIL_VERIFICATION_TOKEN_EXPIRES_IN_MINUTES = env.int(
 PASSWORD_RESET_TOKEN_EXPIRES_IN_MINUTES = env.int(
     "PASSWORD_RESET_TOKEN_EXPIRES_IN_MINUTES", default=5
 )
+# Wrong codes a user may submit, across every code they request, before no
+# code works until VERIFICATION_TOKEN_LOCKOUT_MINUTES after their last failure.
+VERIFICATION_TOKEN_MAX_ATTEMPTS = env.int("VERIFICATION_TOKEN_MAX_ATTEMPTS", default=5)
+VERIFICATION_TOKEN_LOCKOUT_MINUTES = env.int(
+    "VERIFICATION_TOKEN_LOCKOUT_MINUTES", default=15
+)
+# Expired and used tokens are purged in batches of this many rows, sleeping
+# VERIFICATION_TOKEN_PURGE_PAUSE_SECONDS between batches.
+VERIFICATION_TOKEN_PURGE_BATCH_SIZE = env.int(
+    "VERIFICATION_TOKEN_PURGE_BATCH_SIZE", default=1000
+)
+VERIFICATION_TOKEN_PURGE_PAUSE_SECONDS = env.float(
+    "VERIFICATION_TOKEN_PURGE_PAUSE_SECONDS", default=0.1
+)
 
 CELERY_BROKER_URL = env("CELERY_BROKER_URL", default="redis://localhost:6379/0")
+# Work is split over queues so a backlog of one kind of task can't delay
+# another, e.g. image processing can't hold up password reset emails. Each
+# queue gets its own worker profile, see the worker-* targets in the Makefile:
+#   mail         I/O bound and latency sensitive, thread pool
+#   media        CPU bound image work, prefork pool, prefetch of 1
+#   maintenance  periodic bulk jobs like token purges, small prefork pool
+#   default      anything not routed elsewhere
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_QUEUES = (
+    Queue("default", routing_key="default"),
+    Queue("mail", routing_key="mail"),
+    Queue("media", routing_key="media"),
+    Queue("maintenance", routing_key="maintenance"),
+)
+# Priorities order messages within a queue, 0 being the highest.
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_TASK_ROUTES = {
+    "apps.authentication.tasks.send_password_reset_email": {
+        "queue": "mail",
+        "priority": 0,
+    },
+    "apps.authentication.tasks.send_*": {"queue": "mail", "priority": 3},
+    "apps.authentication.tasks.delete_verification_tokens": {
+        "queue": "maintenance",
+        "priority": 9,
+    },
+    "apps.listings.tasks.compute_listing_recommendations": {
+        "queue": "maintenance",
+        "priority": 9,
+    },
+    "apps.listings.tasks.send_saved_search_alerts": {"queue": "mail", "priority": 5},
+    "apps.notifications.tasks.send_notification_digests": {
+        "queue": "mail",
+        "priority": 5,
+    },
+    "apps.listings.tasks.flush_listing_views": {
+        "queue": "maintenance",
+        "priority": 6,
+    },
+    "apps.listings.tasks.archive_deleted_listings": {
+        "queue": "maintenance",
+        "priority": 9,
+    },
+}
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    # Redis emulates priorities with one list per priority step.
+    "queue_order_strategy": "priority",
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    # Unacknowledged messages are redelivered after this long, so it has to
+    # be longer than any task runs, including retry countdowns.
+    "visibility_timeout": 60 * 60,
+}
+# Acknowledge tasks after they ran so a killed worker's tasks are redelivered;
+# the tasks are idempotent. Workers prefetch one message per process by default.
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Port each worker serves task metrics on in Prometheus text format; 0 turns
+# it off. Prefork workers also need PROMETHEUS_MULTIPROC_DIR set in their
+# environment, so the pool processes' samples are aggregated.
+CELERY_METRICS_PORT = env.int("CELERY_METRICS_PORT", default=0)
+CELERY_METRICS_ADDR = env("CELERY_METRICS_ADDR", default="0.0.0.0")
+# Bearer token required to scrape /metrics; leave empty to serve it openly,
+# e.g. when only reachable from the internal network. Run several web worker
+# processes with PROMETHEUS_MULTIPROC_DIR set so /metrics covers all of them.
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# /api/v1/health/ready gives up on dependencies that take longer than this in
+# total, and reuses its result for HEALTH_CHECK_CACHE_SECONDS.
+HEALTH_CHECK_TIMEOUT = env.float("HEALTH_CHECK_TIMEOUT", default=2.0)
+HEALTH_CHECK_CACHE_SECONDS = env.float("HEALTH_CHECK_CACHE_SECONDS", default=5.0)
+
+# Queries slower than this are logged to "chautari.sql.slow". Profiling
+# records every query of a request and reports repeated query shapes; turn
+# it on for all requests, or allow asking for it with an X-Profile-SQL: 1
+# request header.
+SLOW_QUERY_THRESHOLD_MS = env.float("SLOW_QUERY_THRESHOLD_MS", default=200.0)
+SQL_PROFILING_ENABLED = env.bool("SQL_PROFILING_ENABLED", default=False)
+SQL_PROFILING_ALLOW_HEADER = env.bool("SQL_PROFILING_ALLOW_HEADER", default=DEBUG)
+SQL_PROFILING_REPEAT_THRESHOLD = env.int("SQL_PROFILING_REPEAT_THRESHOLD", default=3)
+
+# Fraction of requests whose Python stacks are sampled every
+# CPU_PROFILING_INTERVAL_MS; an X-Profile-CPU: 1 header profiles a request
+# when allowed. Profiles are written to CPU_PROFILING_DIR, see the
+# aggregate_cpu_profiles command.
+CPU_PROFILING_SAMPLE_RATE = env.float("CPU_PROFILING_SAMPLE_RATE", default=0.0)
+CPU_PROFILING_ALLOW_HEADER = env.bool("CPU_PROFILING_ALLOW_HEADER", default=DEBUG)
+CPU_PROFILING_INTERVAL_MS = env.float("CPU_PROFILING_INTERVAL_MS", default=5.0)
+CPU_PROFILING_DIR = env("CPU_PROFILING_DIR", default="/tmp/chautari-profiles")
+
+# Recommendations are recomputed hourly and kept in Redis (REDIS_URL) for
+# RECOMMENDATIONS_CACHE_TIMEOUT seconds, so they survive a few failed runs.
+RECOMMENDATIONS_PER_USER = env.int("RECOMMENDATIONS_PER_USER", default=50)
+RECOMMENDATIONS_SIMILAR_PER_LISTING = env.int(
+    "RECOMMENDATIONS_SIMILAR_PER_LISTING", default=20
+)
+RECOMMENDATIONS_BATCH_SIZE = env.int("RECOMMENDATIONS_BATCH_SIZE", default=5000)
+RECOMMENDATIONS_CACHE_TIMEOUT = env.int(
+    "RECOMMENDATIONS_CACHE_TIMEOUT", default=60 * 60 * 24
+)
+
+# Radius of the listing `near` filter when radius_km is not given, and its
+# upper bound.
+LISTING_NEAR_DEFAULT_RADIUS_KM = env.float(
+    "LISTING_NEAR_DEFAULT_RADIUS_KM", default=2.0
+)
+LISTING_NEAR_MAX_RADIUS_KM = env.float("LISTING_NEAR_MAX_RADIUS_KM", default=50.0)
+
+# How many of a listing's latest price changes its price history shows.
+LISTING_PRICE_HISTORY_SIZE = env.int("LISTING_PRICE_HISTORY_SIZE", default=50)
+
+# Deleted listings are archived, with their images, once they've been deleted
+# LISTING_ARCHIVE_AFTER_DAYS, in batches of LISTING_ARCHIVE_BATCH_SIZE with
+# LISTING_ARCHIVE_PAUSE_SECONDS between batches; see apps.listings.archive.
+LISTING_ARCHIVE_AFTER_DAYS = env.int("LISTING_ARCHIVE_AFTER_DAYS", default=30)
+LISTING_ARCHIVE_BATCH_SIZE = env.int("LISTING_ARCHIVE_BATCH_SIZE", default=500)
+LISTING_ARCHIVE_PAUSE_SECONDS = env.float("LISTING_ARCHIVE_PAUSE_SECONDS", default=0.1)
+
+# Saved searches are matched against listings as they are created, and the
+# matches are emailed as one digest per user every
+# SAVED_SEARCH_ALERT_INTERVAL_MINUTES, at most SAVED_SEARCH_ALERT_BATCH_SIZE
+# matches per run.
+SAVED_SEARCH_MAX_PER_USER = env.int("SAVED_SEARCH_MAX_PER_USER", default=20)
+SAVED_SEARCH_ALERT_INTERVAL_MINUTES = env.int(
+    "SAVED_SEARCH_ALERT_INTERVAL_MINUTES", default=15
+)
+SAVED_SEARCH_ALERT_BATCH_SIZE = env.int("SAVED_SEARCH_ALERT_BATCH_SIZE", default=5000)
+
+# "More like this" neighbours, see apps.listings.similarity.
+SIMILAR_LISTINGS_COUNT = env.int("SIMILAR_LISTINGS_COUNT", default=12)
+SIMILAR_LISTINGS_PRICE_WEIGHT = env.float("SIMILAR_LISTINGS_PRICE_WEIGHT", default=0.3)
+SIMILAR_LISTINGS_BATCH_SIZE = env.int("SIMILAR_LISTINGS_BATCH_SIZE", default=1000)
+
+# View counts are buffered in Redis and flushed every minute. The trending
+# score of a listing adds up its views, each halving in weight every
+# TRENDING_HALF_LIFE_HOURS; repeat views by the same viewer count for
+# TRENDING_REPEAT_VIEW_WEIGHT of a unique one.
+TRENDING_HALF_LIFE_HOURS = env.float("TRENDING_HALF_LIFE_HOURS", default=24.0)
+TRENDING_REPEAT_VIEW_WEIGHT = env.float("TRENDING_REPEAT_VIEW_WEIGHT", default=0.1)
+TRENDING_SIZE = env.int("TRENDING_SIZE", default=100)
+
+# Server-sent event streams, see utils.events. Idle streams get a keepalive
+# comment every EVENT_STREAM_KEEPALIVE_SECONDS, below common proxy read
+# timeouts; clients reconnect after EVENT_STREAM_RETRY_MS. A client more than
+# EVENT_STREAM_QUEUE_SIZE events behind misses the newer ones.
+EVENT_STREAM_KEEPALIVE_SECONDS = env.float(
+    "EVENT_STREAM_KEEPALIVE_SECONDS", default=20.0
+)
+EVENT_STREAM_RETRY_MS = env.int("EVENT_STREAM_RETRY_MS", default=5000)
+EVENT_STREAM_QUEUE_SIZE = env.int("EVENT_STREAM_QUEUE_SIZE", default=100)
+
+# Buyer-seller messages, see apps.messaging.conversations.
+MESSAGE_MAX_LENGTH = env.int("MESSAGE_MAX_LENGTH", default=2000)
+MESSAGES_PAGE_SIZE = env.int("MESSAGES_PAGE_SIZE", default=50)
+CONVERSATIONS_PAGE_SIZE = env.int("CONVERSATIONS_PAGE_SIZE", default=20)
+
+# In-app notifications, see apps.notifications.delivery. Unread ones are
+# emailed in one digest per user every NOTIFICATION_DIGEST_INTERVAL_MINUTES.
+NOTIFICATIONS_PAGE_SIZE = env.int("NOTIFICATIONS_PAGE_SIZE", default=20)
+NOTIFICATION_BATCH_SIZE = env.int("NOTIFICATION_BATCH_SIZE", default=1000)
+NOTIFICATION_DIGEST_INTERVAL_MINUTES = env.int(
+    "NOTIFICATION_DIGEST_INTERVAL_MINUTES", default=15
+)
+NOTIFICATION_DIGEST_BATCH_SIZE = env.int("NOTIFICATION_DIGEST_BATCH_SIZE", default=5000)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "utils.log_formatters.JSONFormatter"},
+    },
+    "handlers": {
+        "json": {"class": "logging.StreamHandler", "formatter": "json"},
+    },
+    "loggers": {
+        "chautari.sql": {"handlers": ["json"], "level": "INFO", "propagate": False},
+    },
+}
 CELERY_BEAT_SCHEDULE = {
     "delete_verification_tokens": {
         "task": "apps.authentication.tasks.delete_verification_tokens",
         "schedule": crontab(minute="*/15"),
-    }
+    },
+    "compute_listing_recommendations": {
+        "task": "apps.listings.tasks.compute_listing_recommendations",
+        "schedule": crontab(minute=0),
+    },
+    "flush_listing_views": {
+        "task": "apps.listings.tasks.flush_listing_views",
+        "schedule": crontab(minute="*"),
+    },
+    "send_saved_search_alerts": {
+        "task": "apps.listings.tasks.send_saved_search_alerts",
+        "schedule": crontab(minute=f"*/{SAVED_SEARCH_ALERT_INTERVAL_MINUTES}"),
+    },
+    "send_notification_digests": {
+        "task": "apps.notifications.tasks.send_notification_digests",
+        "schedule": crontab(minute=f"*/{NOTIFICATION_DIGEST_INTERVAL_MINUTES}"),
+    },
+    "archive_deleted_listings": {
+        "task": "apps.listings.tasks.archive_deleted_listings",
+        "schedule": crontab(minute=30, hour=3),
+    },
 }
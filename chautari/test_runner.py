@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs Celery tasks inline, as they're called, so tests see what the tasks
+    a request or signal enqueues did, and nothing is left on a broker for
+    other tests to find. Tests publishing on purpose use `send_task`, which
+    publishes anyway.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.CELERY_TASK_ALWAYS_EAGER = True
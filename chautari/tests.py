@@ -0,0 +1,713 @@
+import datetime
+import decimal
+import io
+import math
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+import orjson
+from asgiref.testing import ApplicationCommunicator
+from celery.app.task import Context
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from django.urls import reverse
+from phonenumber_field.phonenumber import PhoneNumber
+from prometheus_client import REGISTRY, generate_latest
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from apps.authentication.tasks import (
+    delete_verification_tokens,
+    send_password_reset_email,
+    send_verification_email,
+)
+from apps.authentication.models import User
+from apps.listings.models import Category, Listing
+from chautari.celery import app as celery_app
+from chautari.checks import check_declared_connection_budget
+from utils import health
+from utils.cpu_profiling import CPUProfilingMiddleware
+from utils.db_router import (
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    read_from_replica,
+    use_primary,
+)
+from utils.events import EventStreamApplication, get_hub, publish
+from utils.geo import bounding_box, covering_cells, encode_geohash, haversine_km
+from utils.parsers import ORJSONParser
+from utils.renderers import ORJSONRenderer
+from utils.sql_profiling import SQLProfilingMiddleware, query_shape
+from utils.task_metrics import (
+    PUBLISHED_AT_HEADER,
+    record_task_failure,
+    record_task_finish,
+    record_task_start,
+)
+
+
+class ConnectionPoolBudgetCheckTest(SimpleTestCase):
+    def setUp(self):
+        self.options = connections["default"].settings_dict.setdefault("OPTIONS", {})
+
+    @override_settings(WEB_CONCURRENCY=4, DATABASE_MAX_CONNECTIONS=20)
+    def test_warns_when_budget_exceeds_max_connections(self):
+        """Test workers x pool max_size above max_connections warns"""
+        with mock.patch.dict(self.options, {"pool": {"max_size": 10}}):
+            warnings = check_declared_connection_budget(None)
+
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0].id, "chautari.W001")
+
+    @override_settings(WEB_CONCURRENCY=4, DATABASE_MAX_CONNECTIONS=40)
+    def test_no_warning_within_budget(self):
+        """Test no warning when the pool fits in max_connections"""
+        with mock.patch.dict(self.options, {"pool": {"max_size": 10}}):
+            self.assertEqual(check_declared_connection_budget(None), [])
+
+    @override_settings(WEB_CONCURRENCY=100, DATABASE_MAX_CONNECTIONS=1)
+    def test_no_warning_without_pool(self):
+        """Test the check is skipped when pooling is disabled"""
+        with mock.patch.dict(self.options, {"pool": None}):
+            self.assertEqual(check_declared_connection_budget(None), [])
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads outside a replica context go to the primary"""
+        self.assertEqual(self.router.db_for_read(Listing), "default")
+
+    def test_reads_use_replica_when_enabled(self):
+        """Test reads inside read_from_replica go to a replica"""
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Listing), "replica_0")
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Listing), "default")
+
+    def test_writes_and_migrations_use_primary(self):
+        """Test writes and migrations never target a replica"""
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_write(Listing), "default")
+        self.assertFalse(self.router.allow_migrate("replica_0", "listings"))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        """Test reads fall back to the primary without replicas"""
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Listing), "default")
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+        self.middleware = ReplicaRoutingMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.read_alias = self.router.db_for_read(Listing)
+        return HttpResponse(status=getattr(request, "response_status", 200))
+
+    def test_safe_request_reads_from_replica(self):
+        """Test GET requests are served from a replica"""
+        self.middleware(self.factory.get("/api/v1/listings/"))
+        self.assertEqual(self.read_alias, "replica_0")
+
+    def test_unsafe_request_reads_from_primary(self):
+        """Test POST requests read from the primary"""
+        self.middleware(self.factory.post("/api/v1/listings/"))
+        self.assertEqual(self.read_alias, "default")
+
+    def test_writer_is_pinned_to_primary(self):
+        """Test a client reads from the primary right after writing"""
+        auth = {"HTTP_AUTHORIZATION": "Bearer writer"}
+        self.middleware(self.factory.post("/api/v1/reviews/", **auth))
+
+        self.middleware(self.factory.get("/api/v1/reviews/", **auth))
+        self.assertEqual(self.read_alias, "default")
+
+        other = {"HTTP_AUTHORIZATION": "Bearer someone-else"}
+        self.middleware(self.factory.get("/api/v1/reviews/", **other))
+        self.assertEqual(self.read_alias, "replica_0")
+
+    def test_failed_write_does_not_pin(self):
+        """Test a rejected write does not pin the client"""
+        auth = {"HTTP_AUTHORIZATION": "Bearer writer"}
+        request = self.factory.post("/api/v1/reviews/", **auth)
+        request.response_status = 400
+        self.middleware(request)
+
+        self.middleware(self.factory.get("/api/v1/reviews/", **auth))
+        self.assertEqual(self.read_alias, "replica_0")
+
+    def test_admin_reads_from_primary(self):
+        """Test exempt paths always read from the primary"""
+        self.middleware(self.factory.get("/admin/listings/listing/"))
+        self.assertEqual(self.read_alias, "default")
+
+
+class GeoTest(SimpleTestCase):
+    def test_encode_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(encode_geohash(-33.8688, 151.2093, 5), "r3gx2")
+
+    def test_haversine(self):
+        """Test Kathmandu to Pokhara is about 142 km"""
+        self.assertAlmostEqual(
+            haversine_km(27.7172, 85.324, 28.2096, 83.9856), 142.4, delta=0.1
+        )
+
+    def test_covering_cells_contain_the_circle(self):
+        """Test every point within the radius falls in one of the cells"""
+        center = (27.7172, 85.324)
+        for radius_km in (0.1, 2, 25, 400):
+            cells = covering_cells(bounding_box(*center, radius_km))
+            self.assertTrue(0 < len(cells) <= 9)
+            for step in range(36):
+                bearing = math.radians(step * 10)
+                latitude = center[0] + math.degrees(
+                    radius_km / 6371.0088 * math.cos(bearing)
+                )
+                longitude = (
+                    center[1]
+                    + math.degrees(
+                        radius_km
+                        / 6371.0088
+                        * math.sin(bearing)
+                        / math.cos(math.radians(center[0]))
+                    )
+                    * 0.999
+                )
+                geohash = encode_geohash(latitude, longitude)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells))
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    def test_output_matches_json_renderer(self):
+        """Test orjson output is byte-identical to DRF's JSONRenderer"""
+        data = {
+            "created_at": datetime.datetime(2025, 1, 1, 6, 30, tzinfo=datetime.UTC),
+            "date": datetime.date(2025, 1, 1),
+            "price": decimal.Decimal("10.50"),
+            "title": "Calculus\u2028textbook",
+            "images": [{"id": 1, "image": None}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renders_phone_numbers(self):
+        """Test phone numbers are rendered in their string form"""
+        data = {"phone_number": PhoneNumber.from_string("+9779841234567")}
+        self.assertEqual(
+            ORJSONRenderer().render(data), b'{"phone_number":"+9779841234567"}'
+        )
+
+    def test_parser_rejects_invalid_json(self):
+        """Test malformed JSON raises a ParseError"""
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"price": 10}')), {"price": 10})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"price": NaN}'))
+
+
+class CeleryRoutingTest(SimpleTestCase):
+    """Publish tasks to an in-memory broker and check where they land."""
+
+    def setUp(self):
+        self.connection = celery_app.connection_for_write("memory://")
+        self.addCleanup(self.connection.release)
+
+    def publish(self, task, **kwargs):
+        # send_task routes by name like apply_async, but always publishes
+        # instead of running the task when CELERY_TASK_ALWAYS_EAGER is set.
+        celery_app.send_task(task.name, kwargs=kwargs, connection=self.connection)
+
+    def receive(self, queue_name):
+        queue = celery_app.amqp.queues[queue_name](self.connection.default_channel)
+        queue.declare()
+        return queue.get(no_ack=True)
+
+    def test_tasks_are_routed_to_their_queues(self):
+        email = {"first_name": "John", "email": "a@b.c", "token": "123456"}
+        self.publish(send_password_reset_email, **email)
+        self.publish(send_verification_email, **email)
+        self.publish(delete_verification_tokens)
+
+        mail = [self.receive("mail"), self.receive("mail")]
+        self.assertEqual(
+            [(m.headers["task"], m.properties["priority"]) for m in mail],
+            [
+                (send_password_reset_email.name, 0),
+                (send_verification_email.name, 3),
+            ],
+        )
+        self.assertIsNone(self.receive("mail"))
+
+        maintenance = self.receive("maintenance")
+        self.assertEqual(maintenance.headers["task"], delete_verification_tokens.name)
+        self.assertEqual(maintenance.properties["priority"], 9)
+        self.assertIsNone(self.receive("default"))
+
+    def test_unrouted_tasks_use_default_queue(self):
+        @celery_app.task(name="chautari.tests.unrouted")
+        def unrouted():
+            pass
+
+        self.publish(unrouted)
+
+        self.assertEqual(
+            self.receive("default").headers["task"], "chautari.tests.unrouted"
+        )
+
+
+class TaskMetricsTest(SimpleTestCase):
+    task_name = "chautari.tests.instrumented"
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, {"task": self.task_name, **labels})
+
+    def run_task(self, wait, state="SUCCESS", **request):
+        task = SimpleNamespace(
+            name=self.task_name,
+            request=Context(
+                published_at=time.time() - wait,
+                delivery_info={"routing_key": "mail"},
+                is_eager=False,
+                **request,
+            ),
+        )
+        record_task_start(task_id="task-id", task=task)
+        record_task_finish(task_id="task-id", task=task, state=state)
+        return task
+
+    def test_publish_records_timestamp(self):
+        connection = celery_app.connection_for_write("memory://")
+        self.addCleanup(connection.release)
+        celery_app.send_task(self.task_name, connection=connection)
+
+        message = celery_app.amqp.queues["default"](connection.default_channel).get()
+
+        self.assertAlmostEqual(
+            message.headers[PUBLISHED_AT_HEADER], time.time(), delta=5
+        )
+
+    def test_records_queue_wait_runtime_and_outcome(self):
+        before = self.sample("celery_task_outcomes_total", state="SUCCESS") or 0
+
+        self.run_task(wait=2)
+
+        wait_sum = self.sample("celery_task_queue_wait_seconds_sum", queue="mail")
+        self.assertGreaterEqual(wait_sum, 2)
+        self.assertEqual(
+            self.sample("celery_task_outcomes_total", state="SUCCESS"), before + 1
+        )
+        self.assertGreaterEqual(self.sample("celery_task_runtime_seconds_count"), 1)
+
+    def test_queue_wait_starts_at_eta(self):
+        before = (
+            self.sample("celery_task_queue_wait_seconds_bucket", queue="mail", le="0.5")
+            or 0
+        )
+        eta = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=0.1)
+
+        self.run_task(wait=60, eta=eta.isoformat())
+
+        self.assertEqual(
+            self.sample(
+                "celery_task_queue_wait_seconds_bucket", queue="mail", le="0.5"
+            ),
+            before + 1,
+        )
+
+    def test_records_failures_by_exception(self):
+        task = self.run_task(wait=0, state="FAILURE")
+        record_task_failure(sender=task, exception=ValueError())
+
+        self.assertGreaterEqual(
+            self.sample("celery_task_failures_total", exception="ValueError"), 1
+        )
+
+    def test_summary_command(self):
+        self.run_task(wait=1)
+        response = mock.MagicMock()
+        response.__enter__.return_value.read.return_value = generate_latest(REGISTRY)
+        output = io.StringIO()
+
+        with mock.patch(
+            "chautari.management.commands.task_metrics.urlopen", return_value=response
+        ):
+            call_command("task_metrics", url=["http://worker/metrics"], stdout=output)
+
+        self.assertIn(self.task_name, output.getvalue())
+
+
+class RequestMetricsTest(TestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_records_request_metrics_per_route(self):
+        labels = {"route": "categories"}
+        requests = self.sample(
+            "http_request_duration_seconds_count", method="GET", **labels
+        )
+        responses = self.sample(
+            "http_responses_total", method="GET", status="200", **labels
+        )
+        queries = self.sample("http_request_db_queries_sum", **labels)
+
+        response = self.client.get(reverse("categories"))
+
+        self.assertEqual(
+            self.sample("http_request_duration_seconds_count", method="GET", **labels),
+            requests + 1,
+        )
+        self.assertEqual(
+            self.sample("http_responses_total", method="GET", status="200", **labels),
+            responses + 1,
+        )
+        self.assertGreater(
+            self.sample("http_request_db_queries_sum", **labels), queries
+        )
+        self.assertGreaterEqual(
+            self.sample("http_response_size_bytes_sum", **labels), len(response.content)
+        )
+
+    def test_unresolved_paths_share_a_route(self):
+        self.client.get("/no-such-page/")
+
+        self.assertGreaterEqual(
+            self.sample(
+                "http_responses_total", route="<unresolved>", method="GET", status="404"
+            ),
+            1,
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("ping"))
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b'http_request_duration_seconds_count{method="GET",route="ping"}',
+            response.content,
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_endpoint_requires_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(
+            reverse("metrics"), headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(HEALTH_CHECK_TIMEOUT=0.5, HEALTH_CHECK_CACHE_SECONDS=60)
+class HealthCheckTest(SimpleTestCase):
+    def setUp(self):
+        health._cached_until = 0.0
+        self.addCleanup(setattr, health, "_cached_until", 0.0)
+
+    def refuse(self):
+        raise ConnectionError("connection refused")
+
+    def hang(self):
+        time.sleep(2)
+
+    def test_reports_status_and_latency_per_check(self):
+        healthy, results = health.run_checks({"ok": lambda: None, "down": self.refuse})
+
+        self.assertFalse(healthy)
+        self.assertEqual(results["ok"]["status"], health.HEALTHY)
+        self.assertIn("latency_ms", results["ok"])
+        self.assertEqual(results["down"]["status"], health.UNHEALTHY)
+        self.assertIn("connection refused", results["down"]["error"])
+
+    def test_checks_run_in_parallel_within_timeout(self):
+        start = time.perf_counter()
+        healthy, results = health.run_checks(
+            {"slow": self.hang, "also slow": self.hang, "ok": lambda: None}
+        )
+
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertFalse(healthy)
+        self.assertEqual(results["slow"]["status"], health.TIMEOUT)
+        self.assertEqual(results["ok"]["status"], health.HEALTHY)
+
+    def test_ready(self):
+        with mock.patch.dict(health.CHECKS, {"database": lambda: None}, clear=True):
+            response = self.client.get(reverse("health-ready"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["status"], "ready")
+        self.assertEqual(
+            response.data["data"]["checks"]["database"]["status"], health.HEALTHY
+        )
+
+    def test_not_ready(self):
+        with mock.patch.dict(health.CHECKS, {"database": self.refuse}, clear=True):
+            response = self.client.get(reverse("health-ready"))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.data["error"]["checks"]["database"]["status"], health.UNHEALTHY
+        )
+
+    def test_results_are_cached(self):
+        check = mock.Mock()
+        with mock.patch.dict(health.CHECKS, {"database": check}, clear=True):
+            self.client.get(reverse("health-ready"))
+            self.client.get(reverse("health-ready"))
+
+        check.assert_called_once()
+
+    def test_live(self):
+        with mock.patch.object(health, "run_checks") as run_checks:
+            response = self.client.get(reverse("health-live"))
+
+        self.assertEqual(response.status_code, 200)
+        run_checks.assert_not_called()
+
+
+@override_settings(
+    SQL_PROFILING_ENABLED=False,
+    SQL_PROFILING_ALLOW_HEADER=True,
+    SQL_PROFILING_REPEAT_THRESHOLD=3,
+    SLOW_QUERY_THRESHOLD_MS=10_000,
+)
+class SQLProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.categories = [
+            Category.objects.create(name=f"Category {index}", description="")
+            for index in range(3)
+        ]
+
+    def n_plus_one(self, request):
+        for category in self.categories:
+            Category.objects.get(pk=category.pk)
+        return HttpResponse("ok")
+
+    def get(self, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        return SQLProfilingMiddleware(self.n_plus_one)(request)
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id IN (%s, %s,%s) AND  n = 10"),
+            "SELECT * FROM t WHERE id IN (...) AND n = %s",
+        )
+
+    def test_not_profiled_without_header(self):
+        self.assertNotIn("Server-Timing", self.get())
+
+    def test_reports_repeated_query_shapes(self):
+        with self.assertLogs("chautari.sql.profile", "INFO") as logs:
+            response = self.get(**{"X-Profile-SQL": "1"})
+
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertIn("db-repeated-1", response["Server-Timing"])
+        (repeated,) = logs.records[0].repeated
+        self.assertEqual(repeated["count"], 3)
+        self.assertTrue(repeated["origins"][0].startswith("chautari/tests.py:"))
+        self.assertIn("n_plus_one", repeated["origins"][0])
+
+    @override_settings(SQL_PROFILING_ALLOW_HEADER=False)
+    def test_header_ignored_unless_allowed(self):
+        self.assertNotIn("Server-Timing", self.get(**{"X-Profile-SQL": "1"}))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_logs_slow_queries(self):
+        with self.assertLogs("chautari.sql.slow", "WARNING") as logs:
+            self.get()
+
+        self.assertEqual(len(logs.records), 3)
+        self.assertIn("chautari/tests.py", logs.records[0].origin)
+        self.assertIn("listings_category", logs.records[0].sql)
+
+
+class CPUProfilingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        profiling = override_settings(
+            CPU_PROFILING_DIR=self.directory,
+            CPU_PROFILING_INTERVAL_MS=1,
+            CPU_PROFILING_SAMPLE_RATE=0,
+            CPU_PROFILING_ALLOW_HEADER=True,
+        )
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+
+    def busy_view(self, request):
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return HttpResponse("ok")
+
+    def get(self, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        request.resolver_match = SimpleNamespace(view_name="listings")
+        return CPUProfilingMiddleware(self.busy_view)(request)
+
+    def test_not_profiled_by_default(self):
+        response = self.get()
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profiles_requests_with_header(self):
+        response = self.get(**{"X-Profile-CPU": "1"})
+
+        self.assertIn("cpu-profile;dur=", response["Server-Timing"])
+        (filename,) = os.listdir(self.directory)
+        self.assertEqual(filename, f"listings.{os.getpid()}.collapsed")
+        with open(os.path.join(self.directory, filename)) as file:
+            stacks = file.read()
+        self.assertIn("busy_view (chautari/tests.py:", stacks)
+
+    @override_settings(CPU_PROFILING_SAMPLE_RATE=1.0)
+    def test_profiles_sampled_requests(self):
+        self.get()
+
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_aggregate_command(self):
+        self.get(**{"X-Profile-CPU": "1"})
+        self.get(**{"X-Profile-CPU": "1"})
+        output_path = os.path.join(self.directory, "merged.txt")
+        output = io.StringIO()
+
+        call_command(
+            "aggregate_cpu_profiles",
+            route=["listings"],
+            output=output_path,
+            stdout=output,
+        )
+
+        self.assertIn("busy_view (chautari/tests.py:", output.getvalue())
+        with open(output_path) as file:
+            line = file.readline()
+        stack, count = line.rsplit(" ", 1)
+        self.assertTrue(count.strip().isdigit())
+
+
+@override_settings(EVENT_STREAM_KEEPALIVE_SECONDS=0.05)
+class EventStreamTest(TestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        for patcher in (
+            mock.patch("utils.redis._client", fakeredis.FakeRedis(server=server)),
+            mock.patch(
+                "utils.redis.create_async_redis",
+                lambda: fakeredis.FakeAsyncRedis(server=server),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Like the test client, keep the test's database connection open.
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        self.user = User.objects.create_user(
+            email="streamer@swsc.edu.np", first_name="Stream", last_name="Er"
+        )
+        self.token = str(AccessToken.for_user(self.user))
+        self.django_application = mock.AsyncMock()
+        self.application = EventStreamApplication(
+            self.django_application, path="/api/v1/events"
+        )
+
+    def connect(self, path="/api/v1/events", query="", headers=(), method="GET"):
+        return ApplicationCommunicator(
+            self.application,
+            {
+                "type": "http",
+                "method": method,
+                "path": path,
+                "query_string": query.encode(),
+                "headers": list(headers),
+            },
+        )
+
+    async def open_stream(self, **kwargs):
+        stream = self.connect(query=f"token={self.token}", **kwargs)
+        await stream.send_input({"type": "http.request"})
+        start = await stream.receive_output(timeout=2)
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"Content-Type", b"text/event-stream"), start["headers"])
+        self.assertEqual(await self.next_event(stream), b"retry: 5000\n\n")
+        return stream
+
+    async def next_event(self, stream):
+        return (await stream.receive_output(timeout=2))["body"]
+
+    async def disconnect(self, stream):
+        await stream.send_input({"type": "http.disconnect"})
+        await stream.wait(timeout=2)
+
+    async def test_streams_events_published_to_the_user(self):
+        stream = await self.open_stream()
+
+        publish([self.user.pk], "listing.sold", {"id": 7})
+
+        self.assertEqual(
+            await self.next_event(stream),
+            b'event: listing.sold\ndata: {"id":7}\n\n',
+        )
+        await self.disconnect(stream)
+        self.assertEqual(get_hub().channels, 0)
+
+    async def test_other_users_events_are_not_streamed(self):
+        stream = await self.open_stream()
+
+        publish([self.user.pk + 1], "listing.sold", {"id": 7})
+
+        self.assertEqual(await self.next_event(stream), b": keepalive\n\n")
+        await self.disconnect(stream)
+
+    async def test_streams_share_a_subscription(self):
+        streams = [await self.open_stream() for _ in range(2)]
+        self.assertEqual(get_hub().channels, 1)
+
+        publish([self.user.pk], "listing.sold", {"id": 7})
+
+        for stream in streams:
+            self.assertIn(b"listing.sold", await self.next_event(stream))
+            await self.disconnect(stream)
+        self.assertEqual(get_hub().channels, 0)
+
+    async def test_authenticates_with_the_authorization_header(self):
+        stream = self.connect(
+            headers=[(b"authorization", f"Bearer {self.token}".encode())]
+        )
+        await stream.send_input({"type": "http.request"})
+        self.assertEqual((await stream.receive_output(timeout=2))["status"], 200)
+        await self.disconnect(stream)
+
+    async def test_requires_a_valid_token(self):
+        for query in ("", "token=not-a-token"):
+            stream = self.connect(query=query)
+            await stream.send_input({"type": "http.request"})
+            self.assertEqual((await stream.receive_output(timeout=2))["status"], 401)
+            body = orjson.loads((await stream.receive_output(timeout=2))["body"])
+            self.assertFalse(body["success"])
+
+    async def test_passes_other_requests_to_django(self):
+        stream = self.connect(path="/api/v1/ping")
+        await stream.wait(timeout=2)
+        self.django_application.assert_awaited_once()
@@ -3,13 +3,18 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from chautari.views import PingView
+from chautari.views import LivenessView, PingView, ReadinessView, metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/ping", PingView.as_view(), name="ping"),
+    path("api/v1/health/live", LivenessView.as_view(), name="health-live"),
+    path("api/v1/health/ready", ReadinessView.as_view(), name="health-ready"),
+    path("metrics", metrics_view, name="metrics"),
     path("api/v1/auth/", include("apps.authentication.urls")),
     path("api/v1/listings/", include("apps.listings.urls")),
+    path("api/v1/conversations/", include("apps.messaging.urls")),
+    path("api/v1/notifications/", include("apps.notifications.urls")),
     path("api/v1/profiles/", include("apps.profiles.urls")),
     path("api/v1/reviews/", include("apps.reviews.urls")),
 ]
@@ -1,25 +1,71 @@
-import time
 from datetime import datetime
 
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from rest_framework import status
 from rest_framework.views import APIView
 
 from utils.envelope import Envelope
+from utils.health import get_health
+from utils.metrics import get_registry
 
 
 class PingView(APIView):
     def get(self, request):
-        start_time = time.time()
-
         ping_data = {
             "ping": "pong",
             "timestamp": datetime.now().isoformat(),
             "version": getattr(settings, "API_VERSION", "1.0.0"),
             "environment": getattr(settings, "ENVIRONMENT", "development"),
-            "response_time_ms": round((time.time() - start_time) * 1000, 2),
             "status": "healthy",
             "uptime": "Available",
         }
 
         return Envelope.success_response(ping_data, status_code=status.HTTP_200_OK)
+
+
+class LivenessView(APIView):
+    """The process is up and serving requests; checks no dependencies."""
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        return Envelope.success_response({"status": "alive"})
+
+
+class ReadinessView(APIView):
+    """
+    Whether the dependencies needed to serve requests are reachable, with the
+    latency of each check. Responds with 503 when any of them isn't.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        healthy, checks = get_health()
+        if healthy:
+            return Envelope.success_response({"status": "ready", "checks": checks})
+        return Envelope.error_response(
+            error={"checks": checks},
+            data={"status": "not ready"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+
+def metrics_view(request):
+    """
+    Serve request metrics in Prometheus text format. With METRICS_TOKEN set,
+    scrapers must send it as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,40 @@
+import hashlib
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the values that determine a representation."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def memoize_on_request(func):
+    """
+    Cache a validator's result on the request.
+
+    `condition` calls the ETag and Last-Modified functions separately; both
+    usually come from the same query, which should run only once.
+    """
+    attr = f"_validators_{func.__name__}"
+
+    def wrapper(request, *args, **kwargs):
+        if not hasattr(request, attr):
+            setattr(request, attr, func(request, *args, **kwargs))
+        return getattr(request, attr)
+
+    return wrapper
+
+
+def conditional(etag_func=None, last_modified_func=None):
+    """
+    `django.views.decorators.http.condition` for APIView and ViewSet methods.
+
+    The validators receive the DRF request and the view's URL kwargs and run
+    after authentication, so they may use `request.user`. GET requests with a
+    matching If-None-Match or If-Modified-Since get a 304 without the view
+    being called.
+    """
+    return method_decorator(
+        condition(etag_func=etag_func, last_modified_func=last_modified_func)
+    )
@@ -4,6 +4,7 @@ class TOKEN_ERRORS:
     TOKEN_EXPIRED = "token has expired"
     TOKEN_ALREADY_USED = "token has already been used"
     TOKEN_REQUIRED = "token is required"
+    TOO_MANY_ATTEMPTS = "too many attempts, try again later"
 
 
 class USER_ERRORS:
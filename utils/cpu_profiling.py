@@ -0,0 +1,124 @@
+"""
+Sampling CPU profiler for production requests.
+
+CPUProfilingMiddleware profiles a CPU_PROFILING_SAMPLE_RATE fraction of
+requests, plus requests sent with an X-Profile-CPU: 1 header when
+CPU_PROFILING_ALLOW_HEADER is set. While a profiled request runs, a sampler
+thread records the request thread's Python stack every
+CPU_PROFILING_INTERVAL_MS milliseconds. The samples are appended in collapsed
+stack format ("frame;frame;frame count", outermost frame first) to a file per
+route and process in CPU_PROFILING_DIR. The aggregate_cpu_profiles command
+merges them into input for flamegraph.pl or speedscope.
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+from utils.request_metrics import get_route
+
+PROFILE_HEADER = "X-Profile-CPU"
+FILE_SUFFIX = ".collapsed"
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_-]+")
+_write_lock = threading.Lock()
+
+
+def _short_filename(filename):
+    base_dir = f"{settings.BASE_DIR}/"
+    if filename.startswith(base_dir):
+        return filename[len(base_dir) :]
+    _, found, rest = filename.rpartition("/site-packages/")
+    return rest if found else os.path.basename(filename)
+
+
+def frame_label(code):
+    return f"{code.co_name} ({_short_filename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """Return the stack ending at `frame` as "outer;...;inner"."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler(threading.Thread):
+    """Sample the stack of thread `thread_id` every `interval` seconds."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="cpu-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+def profile_path(route):
+    name = _UNSAFE_FILENAME.sub("_", route).strip("_") or "root"
+    return Path(settings.CPU_PROFILING_DIR) / f"{name}.{os.getpid()}{FILE_SUFFIX}"
+
+
+def write_samples(route, samples):
+    path = profile_path(route)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = "".join(f"{stack} {count}\n" for stack, count in samples.items())
+    with _write_lock, open(path, "a") as file:
+        file.write(lines)
+
+
+class CPUProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(
+            threading.get_ident(), settings.CPU_PROFILING_INTERVAL_MS / 1000
+        )
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            samples = sampler.stop()
+        duration = time.perf_counter() - start
+
+        if samples:
+            write_samples(get_route(request), samples)
+        timing = (
+            f'cpu-profile;dur={duration * 1000:.2f};desc="{samples.total()} samples"'
+        )
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+        return response
+
+    def should_profile(self, request):
+        if settings.CPU_PROFILING_ALLOW_HEADER and request.headers.get(
+            PROFILE_HEADER
+        ) in ("1", "true"):
+            return True
+        rate = settings.CPU_PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
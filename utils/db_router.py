@@ -0,0 +1,99 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """Route reads inside the block to a replica, or to the primary if disabled."""
+    token = _read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def use_primary():
+    """Force reads inside the block to the primary."""
+    return read_from_replica(False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to a replica when the current context allows it.
+
+    Reads go to the primary by default. ReplicaRoutingMiddleware turns replicas
+    on for safe requests, so Celery tasks, management commands and the admin
+    stay on the primary unless they opt in with `read_from_replica()`. Reads
+    inside a transaction always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if not replicas or not _read_from_replica.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(request):
+    """Identify the client by its credentials so it can read its own writes."""
+    credential = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credential:
+        return None
+    digest = hashlib.sha256(credential.encode()).hexdigest()
+    return f"db:primary-pin:{digest}"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve safe requests from replicas and pin writers to the primary.
+
+    After a successful unsafe request the client is pinned to the primary for
+    DATABASE_REPLICA_PIN_SECONDS, so it reads its own writes despite lag.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "DATABASE_REPLICAS", []):
+            return self.get_response(request)
+
+        pin_key = _pin_key(request)
+        safe = request.method in SAFE_METHODS
+        use_replica = (
+            safe
+            and not request.path.startswith(
+                tuple(settings.DATABASE_REPLICA_EXEMPT_PATHS)
+            )
+            and not (pin_key and cache.get(pin_key))
+        )
+
+        with read_from_replica(use_replica):
+            response = self.get_response(request)
+
+        if not safe and pin_key and response.status_code < 400:
+            cache.set(pin_key, True, settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
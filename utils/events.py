@@ -0,0 +1,267 @@
+"""
+Server-sent events pushed to signed-in users.
+
+Events are published to a Redis pub/sub channel per user, so any process can
+push to a user whichever web process holds their stream. Each web process
+keeps a single pub/sub connection, shared by all of its streams through an
+`EventHub`: it subscribes to a user's channel while that user has a stream
+open and hands the channel's messages to the streams' queues. An idle stream
+costs a queue and a suspended coroutine, not a Redis connection or a thread,
+so streams need an ASGI server.
+
+Streams are served by `EventStreamApplication` in front of Django's ASGI
+handler rather than by a view: the handler runs a request's sync code, such
+as middleware and signal receivers, on a thread of its own that is kept until
+the response ends, which for a stream would be a thread per open connection.
+"""
+
+import asyncio
+import io
+import logging
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import orjson
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.signals import request_finished, request_started
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from utils import redis as redis_clients
+from utils.envelope import Envelope
+
+logger = logging.getLogger(__name__)
+
+USER_CHANNEL = "users:{}:events"
+
+# How long the hub's reader waits for a message before checking it still has
+# streams to serve.
+_READ_TIMEOUT = 1.0
+_RECONNECT_DELAY = 1.0
+
+
+def user_channel(user_id):
+    return USER_CHANNEL.format(user_id)
+
+
+def publish(user_ids, event, data):
+    """
+    Push `event` to the open streams of `user_ids`. Users without an open
+    stream miss it, so clients refetch what they show when they reconnect.
+    Never raises on Redis errors.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    message = orjson.dumps({"event": event, "data": data})
+    try:
+        pipe = redis_clients.get_redis().pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.publish(user_channel(user_id), message)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning(f"could not publish {event} to {len(user_ids)} users")
+
+
+def format_event(message):
+    """Return a published message as a server-sent event."""
+    payload = orjson.loads(message)
+    data = orjson.dumps(payload["data"]).decode()
+    return f"event: {payload['event']}\ndata: {data}\n\n"
+
+
+class EventHub:
+    """Fans the messages of one pub/sub connection out to a process's streams."""
+
+    def __init__(self):
+        self._client = None
+        self._pubsub = None
+        self._queues = defaultdict(set)
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def channels(self):
+        return len(self._queues)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        """Yield a queue receiving the messages published to `user_id`."""
+        channel = user_channel(user_id)
+        queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+        async with self._lock:
+            if self._pubsub is None:
+                self._client = redis_clients.create_async_redis()
+                self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            if not self._queues[channel]:
+                await self._pubsub.subscribe(channel)
+            self._queues[channel].add(queue)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                self._queues[channel].discard(queue)
+                if not self._queues[channel]:
+                    del self._queues[channel]
+                    try:
+                        await self._pubsub.unsubscribe(channel)
+                    except redis.RedisError:
+                        # Resubscribed to what's left after reconnecting.
+                        logger.warning(f"could not unsubscribe from {channel}")
+
+    async def _read(self):
+        while self._queues:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=_READ_TIMEOUT
+                )
+            except redis.RedisError:
+                # The next read reconnects and resubscribes to every channel.
+                logger.warning("lost the event stream connection", exc_info=True)
+                await asyncio.sleep(_RECONNECT_DELAY)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"].decode()
+            for queue in self._queues.get(channel, ()):
+                try:
+                    queue.put_nowait(message["data"])
+                except asyncio.QueueFull:
+                    logger.warning(f"dropped an event for a slow client on {channel}")
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """Return the hub of the running event loop."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = EventHub()
+    return hub
+
+
+async def event_stream(user_id):
+    """Yield the server-sent events for `user_id`, with keepalive comments."""
+    async with get_hub().subscribe(user_id) as queue:
+        yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=settings.EVENT_STREAM_KEEPALIVE_SECONDS
+                )
+            except TimeoutError:
+                # Keeps proxies from closing an idle connection.
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(message)
+
+
+_jwt_authentication = JWTAuthentication()
+
+
+def authenticate_stream(request):
+    """
+    Return the user of the access token in the Authorization header or, since
+    browsers' EventSource can't set headers, the `token` query parameter.
+    """
+    try:
+        header = _jwt_authentication.get_header(request)
+        raw_token = header and _jwt_authentication.get_raw_token(header)
+        raw_token = raw_token or request.GET.get("token")
+        if not raw_token:
+            return None
+        return _jwt_authentication.get_user(
+            _jwt_authentication.get_validated_token(raw_token)
+        )
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+
+
+def _authenticate(request):
+    # What Django's handler does around a request, e.g. closing stale
+    # database connections.
+    request_started.send(sender=EventStreamApplication, scope=request.scope)
+    try:
+        return authenticate_stream(request)
+    finally:
+        request_finished.send(sender=EventStreamApplication)
+
+
+class EventStreamApplication:
+    """
+    ASGI application streaming the signed-in user's events at `path` and
+    passing any other request on to `application`.
+    """
+
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.application(scope, receive, send)
+        if scope["method"] != "GET":
+            return await self.send_error(send, "Method not allowed.", 405)
+        request = ASGIRequest(scope, io.BytesIO())
+        # Runs on the single thread shared by sync code outside requests.
+        user = await sync_to_async(_authenticate)(request)
+        if user is None:
+            return await self.send_error(
+                send,
+                "Authentication credentials were not provided or are invalid.",
+                401,
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"Content-Type", b"text/event-stream"),
+                    (b"Cache-Control", b"no-cache"),
+                    (b"X-Accel-Buffering", b"no"),
+                ],
+            }
+        )
+        tasks = [
+            asyncio.create_task(self.stream(user.pk, send)),
+            asyncio.create_task(self.wait_for_disconnect(receive)),
+        ]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+        # A send to a client that went away raises; either way we're done.
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stream(self, user_id, send):
+        async for part in event_stream(user_id):
+            await send(
+                {"type": "http.response.body", "body": part.encode(), "more_body": True}
+            )
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def send_error(self, send, message, status_code):
+        envelope = Envelope(
+            success=False, data=None, error={"detail": message}, status_code=status_code
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [(b"Content-Type", b"application/json")],
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": orjson.dumps(envelope.to_dict())}
+        )
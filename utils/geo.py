@@ -0,0 +1,178 @@
+"""
+Geohash encoding and radius search helpers for plain Postgres.
+
+Locations are stored as latitude/longitude plus their geohash, whose prefixes
+name ever larger cells, so "within a cell" is a `LIKE 'prefix%'` served by a
+B-tree index. A radius search covers the circle's bounding box with a few
+cells, filters on the bounding box, and then refines with the great-circle
+distance computed in SQL.
+
+Bounding boxes are clamped at the poles and the antimeridian rather than
+wrapped around them.
+"""
+
+import math
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework import serializers
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point, `precision` characters long."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Return the (latitude, longitude) size in degrees of a geohash cell."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, min_lon, max_lat, max_lon) around a circle."""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        return min_lat, -180.0, max_lat, 180.0
+    # Widest at the latitude closest to a pole.
+    widest = max(abs(min_lat), abs(max_lat))
+    lon_delta = math.degrees(
+        radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(widest)))
+    )
+    return (
+        min_lat,
+        max(longitude - lon_delta, -180.0),
+        max_lat,
+        min(longitude + lon_delta, 180.0),
+    )
+
+
+def covering_cells(box, max_cells=9):
+    """
+    Return the geohash cells of the finest precision that cover `box` with at
+    most `max_cells` cells, or [] when even a single character would need more.
+    """
+    min_lat, min_lon, max_lat, max_lon = box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lon_size = cell_size(precision)
+        rows = (
+            math.floor((max_lat + 90) / lat_size)
+            - math.floor((min_lat + 90) / lat_size)
+            + 1
+        )
+        columns = (
+            math.floor((max_lon + 180) / lon_size)
+            - math.floor((min_lon + 180) / lon_size)
+            + 1
+        )
+        if rows * columns > max_cells:
+            continue
+        cells = set()
+        for row in range(rows):
+            latitude = min(min_lat + row * lat_size, max_lat)
+            for column in range(columns):
+                longitude = min(min_lon + column * lon_size, max_lon)
+                cells.add(encode_geohash(latitude, longitude, precision))
+        # The box's far corners may fall in cells the stepping skipped.
+        for latitude in (min_lat, max_lat):
+            for longitude in (min_lon, max_lon):
+                cells.add(encode_geohash(latitude, longitude, precision))
+        if len(cells) <= max_cells:
+            return sorted(cells)
+    return []
+
+
+def distance_km_expression(
+    latitude, longitude, lat_field="latitude", lon_field="longitude"
+):
+    """
+    Return a database expression for the haversine distance in kilometres
+    from a point to the location in `lat_field` and `lon_field`.
+    """
+    lat, lon = Radians(F(lat_field)), Radians(F(lon_field))
+    point_lat = Value(math.radians(latitude), output_field=FloatField())
+    point_lon = Value(math.radians(longitude), output_field=FloatField())
+    a = Power(Sin((lat - point_lat) / 2), 2) + Cos(point_lat) * Cos(lat) * Power(
+        Sin((lon - point_lon) / 2), 2
+    )
+    # Rounding can leave `a` just above 1 for antipodal points.
+    return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(
+        Sqrt(Least(a, Value(1.0)))
+    )
+
+
+class LocatedModel(models.Model):
+    """Abstract model with an optional location, indexed by its geohash."""
+
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def has_location(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def save(self, *args, **kwargs):
+        self.geohash = (
+            encode_geohash(self.latitude, self.longitude) if self.has_location else ""
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geohash"}
+        super().save(*args, **kwargs)
+
+
+def validate_location(attrs, instance=None):
+    """Check a serializer's `attrs` set latitude and longitude together."""
+    latitude = attrs.get("latitude", getattr(instance, "latitude", None))
+    longitude = attrs.get("longitude", getattr(instance, "longitude", None))
+    if (latitude is None) != (longitude is None):
+        raise serializers.ValidationError(
+            {"location": "latitude and longitude must be set together."}
+        )
+    return attrs
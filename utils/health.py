@@ -0,0 +1,122 @@
+"""
+Readiness probes for the services the API depends on.
+
+Each probe is timed and run in parallel with the others, and the whole check
+gives up after HEALTH_CHECK_TIMEOUT seconds. Results are reused for
+HEALTH_CHECK_CACHE_SECONDS so frequent probes from load balancers can't add
+load to the dependencies they check.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+
+HEALTHY = "healthy"
+UNHEALTHY = "unhealthy"
+TIMEOUT = "timeout"
+
+
+def check_database():
+    connection = connections["default"]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    finally:
+        # Probes run on executor threads; don't keep a connection open there.
+        connection.close()
+
+
+def check_cache():
+    client = getattr(cache, "_cache", None)
+    if hasattr(client, "get_client"):
+        # Redis cache: PING the server the cache writes to.
+        client.get_client(write=True).ping()
+        return
+    key = f"health:{uuid.uuid4().hex}"
+    cache.set(key, 1, 5)
+    if cache.get(key) != 1:
+        raise RuntimeError("cache did not return the value written")
+    cache.delete(key)
+
+
+def check_storage():
+    name = default_storage.save(f"health/{uuid.uuid4().hex}", ContentFile(b"ok"))
+    default_storage.delete(name)
+
+
+def check_broker():
+    from chautari.celery import app
+
+    with app.connection_for_write() as connection:
+        connection.ensure_connection(max_retries=1)
+
+
+CHECKS = {
+    "database": check_database,
+    "cache": check_cache,
+    "storage": check_storage,
+    "broker": check_broker,
+}
+
+# Room for a second round while a hung probe still holds a thread.
+_executor = ThreadPoolExecutor(max_workers=2 * len(CHECKS), thread_name_prefix="health")
+_lock = threading.Lock()
+_cached = None
+_cached_until = 0.0
+
+
+def _timed(check):
+    start = time.perf_counter()
+    try:
+        check()
+    except Exception as exc:
+        status, error = UNHEALTHY, f"{type(exc).__name__}: {exc}"
+    else:
+        status, error = HEALTHY, None
+    result = {
+        "status": status,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    if error:
+        result["error"] = error
+    return result
+
+
+def run_checks(checks=None, timeout=None):
+    """
+    Run `checks` in parallel and return `(healthy, results)`, where results
+    maps each check to its status, latency and error, if any.
+    """
+    checks = checks or CHECKS
+    timeout = settings.HEALTH_CHECK_TIMEOUT if timeout is None else timeout
+    futures = {name: _executor.submit(_timed, check) for name, check in checks.items()}
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            future.cancel()
+            results[name] = {"status": TIMEOUT, "latency_ms": timeout * 1000}
+    healthy = all(result["status"] == HEALTHY for result in results.values())
+    return healthy, results
+
+
+def get_health():
+    """Return `run_checks()`, reusing a recent result when there is one."""
+    global _cached, _cached_until
+    with _lock:
+        # Concurrent probes wait for one run instead of starting their own.
+        if time.monotonic() >= _cached_until:
+            _cached = run_checks()
+            _cached_until = time.monotonic() + settings.HEALTH_CHECK_CACHE_SECONDS
+        return _cached
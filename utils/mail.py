@@ -0,0 +1,183 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+logger = logging.getLogger(__name__)
+
+
+class TransientEmailError(Exception):
+    """Delivery failed for a reason that is worth retrying."""
+
+
+def is_transient_error(exc):
+    """Return True for connection problems and 4xx SMTP replies."""
+    if isinstance(
+        exc,
+        (
+            smtplib.SMTPServerDisconnected,
+            smtplib.SMTPConnectError,
+            ConnectionError,
+            TimeoutError,
+        ),
+    ):
+        return True
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    return False
+
+
+class EmailDispatcher:
+    """
+    Deliver email over one reusable connection per process.
+
+    Messages passed to `send()` within `batch_window` seconds of each other,
+    e.g. by the threads of a threads-pool Celery worker, are delivered together
+    over the same connection. The first sender of a batch waits for the window
+    and flushes it; the others block until their message has been delivered.
+    The connection stays open between batches and is reopened after
+    `idle_timeout` seconds without use, or when the server drops it.
+    """
+
+    def __init__(self, batch_window=0.0, max_batch_size=50, idle_timeout=60.0):
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending = []
+        self._connection = None
+        self._last_used = 0.0
+
+    def send(self, message):
+        """Deliver `message`, raising the delivery error if it failed."""
+        future = Future()
+        with self._lock:
+            self._pending.append((message, future))
+            leader = len(self._pending) == 1
+            full = len(self._pending) >= self.max_batch_size
+
+        if full or (leader and self.batch_window <= 0):
+            self.flush()
+        elif leader:
+            time.sleep(self.batch_window)
+            self.flush()
+        future.result()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        with self._send_lock:
+            # Messages go out one at a time over the shared connection so a
+            # failure is reported to its own sender instead of the whole batch.
+            for message, future in batch:
+                try:
+                    self._deliver(message)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(None)
+            self._last_used = time.monotonic()
+        logger.debug(f"delivered a batch of {len(batch)} emails")
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def _get_connection(self):
+        idle = time.monotonic() - self._last_used
+        if self._connection is not None and idle > self.idle_timeout:
+            self.close()
+        if self._connection is None:
+            self._connection = get_connection(fail_silently=False)
+            self._connection.open()
+        return self._connection
+
+    def _deliver(self, message):
+        try:
+            self._get_connection().send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped the idle connection; reconnect once.
+            self.close()
+            self._get_connection().send_messages([message])
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server rejected this message; the connection is still usable.
+            raise
+        except Exception:
+            self.close()
+            raise
+
+
+_dispatcher = None
+_dispatcher_pid = None
+
+
+def get_dispatcher():
+    """Return this process's dispatcher, creating a new one after a fork."""
+    global _dispatcher, _dispatcher_pid
+    if _dispatcher is None or _dispatcher_pid != os.getpid():
+        _dispatcher = EmailDispatcher(
+            batch_window=settings.EMAIL_BATCH_WINDOW_SECONDS,
+            max_batch_size=settings.EMAIL_MAX_BATCH_SIZE,
+            idle_timeout=settings.EMAIL_CONNECTION_IDLE_TIMEOUT,
+        )
+        _dispatcher_pid = os.getpid()
+    return _dispatcher
+
+
+def send_templated_email(
+    subject, template_name, context, recipient, idempotency_key=None
+):
+    """
+    Render `template_name` with `context` and deliver it to `recipient`.
+
+    When `idempotency_key` is given, the email is sent at most once per key
+    within EMAIL_IDEMPOTENCY_TIMEOUT seconds; later calls return False without
+    sending. A failed delivery releases the key so a retry can send it. The
+    key is claimed for a few EMAIL_TIMEOUTs only until the email is sent, so
+    a worker killed mid-send doesn't keep the email from ever being sent.
+
+    Raises TransientEmailError for failures worth retrying, including while
+    another call is sending the email with the same key.
+    """
+    cache_key = f"email:sent:{idempotency_key}" if idempotency_key else None
+    if cache_key and not cache.add(cache_key, "pending", 3 * settings.EMAIL_TIMEOUT):
+        if cache.get(cache_key) != "sent":
+            raise TransientEmailError(f"email {idempotency_key} is being sent")
+        logger.info(f"skipped duplicate email {idempotency_key}")
+        return False
+
+    message = EmailMessage(
+        subject=subject,
+        body=render_to_string(template_name, context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+    try:
+        get_dispatcher().send(message)
+    except Exception as exc:
+        if cache_key:
+            cache.delete(cache_key)
+        if is_transient_error(exc):
+            raise TransientEmailError(str(exc)) from exc
+        raise
+
+    if cache_key:
+        cache.set(cache_key, "sent", settings.EMAIL_IDEMPOTENCY_TIMEOUT)
+    return True
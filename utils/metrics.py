@@ -0,0 +1,61 @@
+import os
+import shutil
+
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+# Histogram buckets, in seconds, for request and task latencies.
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    float("inf"),
+)
+
+
+def is_multiprocess():
+    """Return True if metrics are shared between processes through files."""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def get_registry():
+    """
+    Return the registry to expose.
+
+    With PROMETHEUS_MULTIPROC_DIR set, e.g. under prefork Celery workers or
+    several gunicorn workers, every process writes its samples to that
+    directory and a fresh registry aggregates them on each scrape.
+    """
+    if not is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def reset_multiprocess_dir():
+    """
+    Empty PROMETHEUS_MULTIPROC_DIR so samples of a previous run aren't
+    aggregated. Call it once in the parent before any worker process starts.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of an exited process in multiprocess mode."""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,38 @@
+"""
+Shared Redis client for data structures the Django cache API can't express,
+such as counters, HyperLogLogs and sorted sets.
+
+The client is created on first use and reuses its connection pool for the
+life of the process. Callers should go through `get_redis()` each time rather
+than keeping a reference, so tests can swap the client.
+"""
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+    return _client
+
+
+def create_async_redis():
+    """
+    Return a new asyncio client. Its connections belong to the event loop
+    that first uses them, so each loop needs its own client.
+    """
+    return redis.asyncio.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+    )
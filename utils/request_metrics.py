@@ -0,0 +1,124 @@
+"""
+Request metrics for the API, recorded by RequestMetricsMiddleware.
+
+For each route (URL name) this records latency, responses by status, the
+number of database queries and the time spent in them, and the response size.
+They are served in Prometheus text format by the /metrics view.
+"""
+
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from prometheus_client import Counter, Histogram
+
+from utils.metrics import LATENCY_BUCKETS
+
+# Label for requests that didn't resolve to a view, e.g. 404s, so arbitrary
+# paths can't create new series.
+UNRESOLVED_ROUTE = "<unresolved>"
+KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to handle a request.",
+    ["route", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSES = Counter(
+    "http_responses",
+    "Responses by status code.",
+    ["route", "method", "status"],
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run while handling a request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Time spent in database queries while handling a request.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies.",
+    ["route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float("inf")),
+)
+
+
+# Labelled metric children by (route, method, status); looking them up through
+# labels() on every request costs more than the observations themselves.
+_children = {}
+
+
+def _get_children(route, method, status):
+    key = (route, method, status)
+    children = _children.get(key)
+    if children is None:
+        children = _children[key] = (
+            REQUEST_LATENCY.labels(route=route, method=method),
+            RESPONSES.labels(route=route, method=method, status=status),
+            DB_QUERIES.labels(route=route),
+            DB_TIME.labels(route=route),
+            RESPONSE_SIZE.labels(route=route),
+        )
+    return children
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and their duration."""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def get_route(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else UNRESOLVED_ROUTE
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, status, database usage and response size per route.
+
+    Place it first in MIDDLEWARE so the latency covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        method = request.method if request.method in KNOWN_METHODS else "other"
+        latency, responses, db_queries, db_time, response_size = _get_children(
+            get_route(request), method, response.status_code
+        )
+        latency.observe(duration)
+        responses.inc()
+        db_queries.observe(queries.count)
+        db_time.observe(queries.duration)
+        if not response.streaming:
+            response_size.observe(len(response.content))
+        return response
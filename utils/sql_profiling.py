@@ -0,0 +1,192 @@
+"""
+Per-request SQL profiling and slow query logging.
+
+SQLProfilingMiddleware logs every query slower than SLOW_QUERY_THRESHOLD_MS
+to the "chautari.sql.slow" logger, with its duration, route and the line of
+project code that ran it.
+
+Profiling is opt-in, either for every request with SQL_PROFILING_ENABLED or
+per request with the X-Profile-SQL header when SQL_PROFILING_ALLOW_HEADER is
+set. A profiled request records every query with its duration and origin and
+groups queries by shape, i.e. the SQL with its parameters and IN lists
+collapsed. Shapes that ran SQL_PROFILING_REPEAT_THRESHOLD times or more are
+reported as likely N+1s. The summary goes to the "chautari.sql.profile"
+logger and into a Server-Timing header, so it shows up in browser devtools.
+"""
+
+import logging
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+from utils.request_metrics import get_route
+
+slow_query_logger = logging.getLogger("chautari.sql.slow")
+profile_logger = logging.getLogger("chautari.sql.profile")
+
+PROFILE_HEADER = "X-Profile-SQL"
+
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r"\s+")
+
+_SKIPPED_PATHS = (str(Path(__file__).resolve()), "/site-packages/", "/lib/python")
+
+
+def query_shape(sql):
+    """Return `sql` with values and IN lists collapsed into placeholders."""
+    sql = _STRING.sub("%s", sql)
+    sql = _NUMBER.sub("%s", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def query_origin():
+    """Return the innermost frame of project code as "path:line in function"."""
+    base_dir = f"{settings.BASE_DIR}/"
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and not any(
+            path in filename for path in _SKIPPED_PATHS
+        ):
+            relative = filename[len(base_dir) :]
+            return f"{relative}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper logging slow queries and, when `profile` is set,
+    recording every query.
+    """
+
+    def __init__(self, request, profile=False):
+        self.request = request
+        self.profile = profile
+        self.slow_threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.queries = []
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.duration += duration
+            origin = None
+            if duration >= self.slow_threshold:
+                origin = query_origin()
+                self.log_slow_query(sql, duration, origin, context["connection"])
+            if self.profile:
+                self.queries.append((sql, duration, origin or query_origin()))
+
+    def log_slow_query(self, sql, duration, origin, connection):
+        slow_query_logger.warning(
+            f"slow query ({duration * 1000:.1f}ms) at {origin}",
+            extra={
+                "duration_ms": round(duration * 1000, 2),
+                "database": connection.alias,
+                "route": get_route(self.request),
+                "method": self.request.method,
+                "origin": origin,
+                "sql": sql,
+            },
+        )
+
+    def repeated_shapes(self):
+        """Return `(shape, count, duration, origins)` of repeated query shapes."""
+        shapes = defaultdict(lambda: [0, 0.0, set()])
+        for sql, duration, origin in self.queries:
+            shape = shapes[query_shape(sql)]
+            shape[0] += 1
+            shape[1] += duration
+            shape[2].add(origin)
+        repeated = [
+            (shape, count, duration, sorted(origins))
+            for shape, (count, duration, origins) in shapes.items()
+            if count >= settings.SQL_PROFILING_REPEAT_THRESHOLD
+        ]
+        return sorted(repeated, key=lambda item: item[2], reverse=True)
+
+
+def _server_timing_description(text):
+    return text.replace("\\", "\\\\").replace('"', '\\"')[:200]
+
+
+class SQLProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(request, profile=self.should_profile(request))
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        if recorder.profile:
+            self.report(request, response, recorder)
+        return response
+
+    def should_profile(self, request):
+        if settings.SQL_PROFILING_ENABLED:
+            return True
+        return settings.SQL_PROFILING_ALLOW_HEADER and request.headers.get(
+            PROFILE_HEADER
+        ) in ("1", "true")
+
+    def report(self, request, response, recorder):
+        repeated = recorder.repeated_shapes()
+        route = get_route(request)
+        profile_logger.info(
+            f"{len(recorder.queries)} queries in {recorder.duration * 1000:.1f}ms "
+            f"for {request.method} {route}, {len(repeated)} repeated shapes",
+            extra={
+                "route": route,
+                "method": request.method,
+                "query_count": len(recorder.queries),
+                "duration_ms": round(recorder.duration * 1000, 2),
+                "queries": [
+                    {
+                        "sql": sql,
+                        "duration_ms": round(duration * 1000, 2),
+                        "origin": origin,
+                    }
+                    for sql, duration, origin in recorder.queries
+                ],
+                "repeated": [
+                    {
+                        "shape": shape,
+                        "count": count,
+                        "duration_ms": round(duration * 1000, 2),
+                        "origins": origins,
+                    }
+                    for shape, count, duration, origins in repeated
+                ],
+            },
+        )
+
+        timings = [
+            f'db;dur={recorder.duration * 1000:.2f};desc="{len(recorder.queries)} queries"'
+        ]
+        for index, (shape, count, duration, origins) in enumerate(repeated[:5], 1):
+            description = _server_timing_description(
+                f"{count}x at {origins[0]}: {shape}"
+            )
+            timings.append(
+                f'db-repeated-{index};dur={duration * 1000:.2f};desc="{description}"'
+            )
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = ", ".join(
+            [existing, *timings] if existing else timings
+        )
@@ -0,0 +1,130 @@
+"""
+Celery task metrics, recorded from Celery signals.
+
+For each task name this records how long messages waited between being
+published and starting to run (for delayed tasks, measured from their ETA),
+how long they ran, and how they ended. The worker exposes them in Prometheus
+text format on CELERY_METRICS_PORT.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_shutdown,
+    worker_ready,
+)
+from django.conf import settings
+from prometheus_client import Counter, Histogram, start_http_server
+
+from utils.metrics import (
+    LATENCY_BUCKETS,
+    get_registry,
+    mark_process_dead,
+    reset_multiprocess_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the wall-clock time a message was published at.
+PUBLISHED_AT_HEADER = "published_at"
+
+TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between publishing a task and a worker starting it.",
+    ["task", "queue"],
+    buckets=LATENCY_BUCKETS,
+)
+TASK_RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Time a task took to run.",
+    ["task"],
+    buckets=LATENCY_BUCKETS,
+)
+TASK_OUTCOMES = Counter(
+    "celery_task_outcomes",
+    "Finished task runs by final state.",
+    ["task", "state"],
+)
+TASK_FAILURES = Counter(
+    "celery_task_failures",
+    "Task runs that raised, by exception type.",
+    ["task", "exception"],
+)
+
+# Start times of the tasks running in this process, by task id.
+_started = {}
+
+
+def _queue_wait(request, now):
+    published_at = getattr(request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:
+        return None
+    start = published_at
+    if request.eta:
+        # A delayed task is only due at its ETA; waiting for it isn't queueing.
+        eta = request.eta
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        start = max(start, eta.timestamp())
+    return max(now - start, 0.0)
+
+
+@before_task_publish.connect
+def record_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    request = task.request
+    if request.is_eager:
+        return
+    wait = _queue_wait(request, time.time())
+    if wait is not None:
+        queue = (request.delivery_info or {}).get("routing_key") or "unknown"
+        TASK_QUEUE_WAIT.labels(task=task.name, queue=queue).observe(wait)
+    _started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_finish(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    TASK_RUNTIME.labels(task=task.name).observe(time.perf_counter() - started)
+    TASK_OUTCOMES.labels(task=task.name, state=state or "UNKNOWN").inc()
+
+
+@task_failure.connect
+def record_task_failure(sender=None, exception=None, **kwargs):
+    if sender.request.is_eager:
+        return
+    TASK_FAILURES.labels(task=sender.name, exception=type(exception).__name__).inc()
+
+
+@worker_init.connect
+def prepare_metrics(**kwargs):
+    reset_multiprocess_dir()
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    port = settings.CELERY_METRICS_PORT
+    if not port:
+        return
+    start_http_server(port, addr=settings.CELERY_METRICS_ADDR, registry=get_registry())
+    logger.info(f"serving task metrics on {settings.CELERY_METRICS_ADDR}:{port}")
+
+
+@worker_process_shutdown.connect
+def remove_process_metrics(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
@@ -0,0 +1,14 @@
+"""Helpers shared by the apps' tests."""
+
+from unittest import mock
+
+import fakeredis
+
+
+def use_fake_redis(test, server=None):
+    """Point utils.redis at an in-memory Redis for the duration of `test`."""
+    client = fakeredis.FakeRedis(server=server)
+    patcher = mock.patch("utils.redis._client", client)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return client
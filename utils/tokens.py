@@ -3,9 +3,14 @@ import string
 from datetime import timedelta
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
-from apps.authentication.models import TOKEN_TYPES, VerificationToken
+from apps.authentication.models import (
+    TOKEN_TYPES,
+    VerificationToken,
+    make_token_hash,
+)
 
 
 def _generate_secure_token(length=12):
@@ -20,13 +25,34 @@ def _generate_numeric_code(length=6):
 
 
 def create_verification_token(user, token_type, expires_in_minutes, use_numeric=False):
-    """Create a verification token for a user"""
-    token = _generate_numeric_code() if use_numeric else _generate_secure_token()
-    expires_at = timezone.now() + timedelta(minutes=expires_in_minutes)
+    """
+    Create a verification token for a user.
 
-    return VerificationToken.objects.create(
-        user=user, token=token, token_type=token_type, expires_at=expires_at
-    )
+    Only a hash of the code is stored; the plain code is available as `code`
+    on the returned token so it can be sent to the user. The user's earlier
+    active tokens of `token_type` are deleted, so each guess is checked
+    against one code only.
+    """
+    expires_at = timezone.now() + timedelta(minutes=expires_in_minutes)
+    for attempt in range(3):
+        code = _generate_numeric_code() if use_numeric else _generate_secure_token()
+        try:
+            # A savepoint, so a clash with one of the user's earlier codes
+            # doesn't break a surrounding transaction.
+            with transaction.atomic():
+                VerificationToken.objects.active(user, token_type).delete()
+                token = VerificationToken.objects.create(
+                    user=user,
+                    token_hash=make_token_hash(user.pk, token_type, code),
+                    token_type=token_type,
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            if attempt == 2:
+                raise
+        else:
+            token.code = code
+            return token
 
 
 def create_email_verification_token(user, **kwargs):